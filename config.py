@@ -18,9 +18,115 @@ class Config:
     # إعدادات قاعدة البيانات
     DATABASE_PATH = 'bot_database.db'
     
+    # ذاكرة المستخدمين المؤقتة أمام قاعدة البيانات
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '1024'))
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))
+    
+    # حذف سجلات الرفع القديمة دورياً (0 لتعطيله)
+    LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', '30'))
+    LOG_RETENTION_BATCH_SIZE = int(os.getenv('LOG_RETENTION_BATCH_SIZE', '1000'))
+    LOG_RETENTION_PAUSE = float(os.getenv('LOG_RETENTION_PAUSE', '0.2'))
+    LOG_RETENTION_INTERVAL = int(os.getenv('LOG_RETENTION_INTERVAL_HOURS', '6')) * 3600
+    # تقسيم upload_logs حسب الشهر على PostgreSQL (يُطبَّق عبر ترحيل Alembic 0003)
+    UPLOAD_LOGS_PARTITIONED = os.getenv('UPLOAD_LOGS_PARTITIONED', 'false').lower() == 'true'
+    UPLOAD_LOG_PARTITIONS_AHEAD = int(os.getenv('UPLOAD_LOG_PARTITIONS_AHEAD', '2'))
+    # مجلد أرشفة السجلات قبل حذفها (فارغ لعدم الأرشفة)
+    LOG_ARCHIVE_PATH = os.getenv('LOG_ARCHIVE_PATH') or None
+    
+    # عدد التحديثات المعالجة بالتوازي في وضع polling (1 للمعالجة التسلسلية، وهو الافتراضي)،
+    # مع الحفاظ على ترتيب تحديثات كل مستخدم
+    POLLING_CONCURRENCY = int(os.getenv('POLLING_CONCURRENCY', '1'))
+    
+    # وضع webhook: أقصى عدد من التحديثات المستلمة قيد الانتظار أو المعالجة (يُرد بعده
+    # بـ 503 فيعيد تلقرام الإرسال لاحقاً)، وعدد التحديثات المعالجة بالتوازي
+    WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '200'))
+    WEBHOOK_CONCURRENCY = int(os.getenv('WEBHOOK_CONCURRENCY', '4'))
+    # عدد عمليات البوت خلف webhook_router.py، ونبضات مراقبة صحتها بالثواني
+    WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', str(os.cpu_count() or 1)))
+    WORKER_HEARTBEAT_INTERVAL = float(os.getenv('WORKER_HEARTBEAT_INTERVAL', '5'))
+    WORKER_HEARTBEAT_TIMEOUT = float(os.getenv('WORKER_HEARTBEAT_TIMEOUT', '30'))
+    # يُرسل في ترويسة X-Telegram-Bot-Api-Secret-Token مع كل تحديث (اختياري)
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+    
+    # مخزن حالة المحادثة: memory لعملية واحدة، database لتشغيل عدة عمليات webhook
+    # (تُحفظ فيه معرفات ملفات تلقرام فقط، ويُحمّل الفيديو في العملية التي ترفعه)
+    STATE_STORE = os.getenv('STATE_STORE', 'memory').lower()
+    STATE_TTL = int(os.getenv('STATE_TTL_HOURS', '24')) * 3600
+    
+    # تجاهل تحديثات webhook المكررة: آخر UPDATE_DEDUP_WINDOW معرف في الذاكرة،
+    # ومشتركة عبر قاعدة البيانات عند تشغيل عدة عمليات (افتراضياً مع STATE_STORE=database)
+    UPDATE_DEDUP_WINDOW = int(os.getenv('UPDATE_DEDUP_WINDOW', '10000'))
+    UPDATE_DEDUP_SHARED = os.getenv('UPDATE_DEDUP_SHARED', str(STATE_STORE == 'database')).lower() == 'true'
+    
     # إعدادات التحميل
-    DOWNLOAD_PATH = 'downloads'
-    MAX_FILE_SIZE = 2 * 1024 * 1024 * 1024  # 2GB
+    DOWNLOAD_PATH = os.getenv('DOWNLOAD_PATH', 'downloads')
+    MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE_MB', '2048')) * 1024 * 1024  # 2GB
+    
+    # حدود مساحة مجلد التحميل: الإجمالي، لكل مستخدم، والمساحة الحرة الدنيا على القرص
+    SPOOL_BUDGET = int(os.getenv('SPOOL_BUDGET_MB', '10240')) * 1024 * 1024
+    SPOOL_USER_QUOTA = int(os.getenv('SPOOL_USER_QUOTA_MB', '4096')) * 1024 * 1024
+    SPOOL_MIN_FREE = int(os.getenv('SPOOL_MIN_FREE_MB', '1024')) * 1024 * 1024
+    
+    # مهلة الفيديو المنتظر دون رد من المستخدم قبل حذفه وحذف ملفه
+    PENDING_UPLOAD_TTL = int(os.getenv('PENDING_UPLOAD_TTL_MINUTES', '60')) * 60
+    # فحص مجلد التحميل دورياً، مع تجاهل الملفات الأحدث من ORPHAN_FILE_GRACE ثانية
+    ORPHAN_REAPER_INTERVAL = int(os.getenv('ORPHAN_REAPER_INTERVAL', '600'))
+    ORPHAN_FILE_GRACE = int(os.getenv('ORPHAN_FILE_GRACE', '600'))
+    
+    # تحديث توكن الوصول قبل انتهائه بعدد الثواني هذا
+    CREDENTIAL_REFRESH_MARGIN = int(os.getenv('CREDENTIAL_REFRESH_MARGIN', '300'))
+    
+    # إعدادات منفذ الرفع
+    UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '2'))
+    UPLOAD_QUEUE_SIZE = int(os.getenv('UPLOAD_QUEUE_SIZE', '20'))
+    # مهلة إنهاء الرفع الجاري عند الإيقاف قبل إيقافه عند الجزء التالي (أقل من مهلة SIGTERM)
+    UPLOAD_SHUTDOWN_TIMEOUT = float(os.getenv('UPLOAD_SHUTDOWN_TIMEOUT', '15'))
+    
+    # طابور الرفع: local داخل عملية البوت، أو database (جدول upload_jobs) لتنفذه
+    # عمليات upload_worker.py على خادم واحد أو أكثر
+    UPLOAD_QUEUE = os.getenv('UPLOAD_QUEUE', 'local').lower()
+    UPLOAD_JOB_LEASE = int(os.getenv('UPLOAD_JOB_LEASE', '300'))
+    UPLOAD_JOB_MAX_ATTEMPTS = int(os.getenv('UPLOAD_JOB_MAX_ATTEMPTS', '3'))
+    UPLOAD_JOB_POLL_INTERVAL = float(os.getenv('UPLOAD_JOB_POLL_INTERVAL', '2'))
+    
+    # حجم الجزء في الرفع المجزأ (يجب أن يكون من مضاعفات 256KB)
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE_MB', '8')) * 1024 * 1024
+    # حذف جلسات الرفع المتروكة بعد هذه المدة (رابط جلسة YouTube يصلح نحو أسبوع)
+    UPLOAD_SESSION_MAX_AGE = int(os.getenv('UPLOAD_SESSION_MAX_AGE_HOURS', '168')) * 3600
+    
+    # إعادة إرسال الجزء بعد الأخطاء المؤقتة (5xx و 429 وانقطاع الاتصال) بتأخير أسي عشوائي
+    UPLOAD_RETRY_MAX_ATTEMPTS = int(os.getenv('UPLOAD_RETRY_MAX_ATTEMPTS', '5'))
+    UPLOAD_RETRY_BASE_DELAY = float(os.getenv('UPLOAD_RETRY_BASE_DELAY', '1'))
+    UPLOAD_RETRY_MAX_DELAY = float(os.getenv('UPLOAD_RETRY_MAX_DELAY', '60'))
+    
+    # تجميع سجلات الرفع في الذاكرة وكتابتها دفعة واحدة
+    # UPLOAD_LOG_DURABLE=true يعيد الكتابة المتزامنة لكل سجل
+    UPLOAD_LOG_BATCH_SIZE = int(os.getenv('UPLOAD_LOG_BATCH_SIZE', '50'))
+    UPLOAD_LOG_FLUSH_INTERVAL = float(os.getenv('UPLOAD_LOG_FLUSH_INTERVAL', '5'))
+    UPLOAD_LOG_DURABLE = os.getenv('UPLOAD_LOG_DURABLE', 'false').lower() == 'true'
+    
+    # بث الفيديو من تلقرام إلى YouTube مباشرة دون حفظه على القرص
+    UPLOAD_STREAMING = os.getenv('UPLOAD_STREAMING', 'false').lower() == 'true'
+    
+    # مجمع بيانات مصادقة YouTube المشتركة (JSON: قائمة name و client_id و client_secret
+    # و refresh_token) لتوزيع الرفع على أكثر من مشروع Google؛ بديل YOUTUBE_REFRESH_TOKEN
+    # ولا يُستخدم مع حسابات المستخدمين (refresh_token مطلوب لكل عنصر)
+    YOUTUBE_CREDENTIALS = os.getenv('YOUTUBE_CREDENTIALS')
+    YOUTUBE_CREDENTIALS_FILE = os.getenv('YOUTUBE_CREDENTIALS_FILE')
+    # استبعاد بيانات المصادقة مؤقتاً بعد أخطاء متتالية
+    YOUTUBE_CREDENTIAL_ERROR_THRESHOLD = int(os.getenv('YOUTUBE_CREDENTIAL_ERROR_THRESHOLD', '3'))
+    YOUTUBE_CREDENTIAL_COOLDOWN = int(os.getenv('YOUTUBE_CREDENTIAL_COOLDOWN', '300'))
+    
+    # حصة YouTube Data API اليومية لكل عميل OAuth وتكلفة كل طلب بالوحدات
+    YOUTUBE_QUOTA_DAILY_LIMIT = int(os.getenv('YOUTUBE_QUOTA_DAILY_LIMIT', '10000'))
+    YOUTUBE_QUOTA_COSTS = {
+        'videos.insert': int(os.getenv('YOUTUBE_QUOTA_UPLOAD_COST', '1600')),
+        'channels.list': int(os.getenv('YOUTUBE_QUOTA_LIST_COST', '1'))
+    }
+    # أقصى استهلاك متتالٍ قبل توزيع الباقي على اليوم (0: بلا توزيع، يكفي الحد اليومي)
+    YOUTUBE_QUOTA_BURST = int(os.getenv('YOUTUBE_QUOTA_BURST', '0')) or None
+    # أقصى انتظار للحصة داخل معالج الرسالة قبل إبلاغ المستخدم بالتأجيل
+    YOUTUBE_QUOTA_MAX_WAIT = int(os.getenv('YOUTUBE_QUOTA_MAX_WAIT', '60'))
     
     # نطاقات YouTube
     YOUTUBE_SCOPES = [
@@ -0,0 +1,110 @@
+"""
+ذاكرة مؤقتة لبيانات مصادقة YouTube
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Hashable, Optional
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialCache:
+    """ذاكرة مؤقتة لبيانات المصادقة لكل مستخدم (وللتوكن المشترك من البيئة)
+
+    - يُعاد استخدام توكن الوصول ما دام صالحاً.
+    - إذا اقترب انتهاء التوكن يُحدَّث في الخلفية ويُعاد التوكن الحالي فوراً.
+    - إذا انتهى التوكن يُحدَّث مرة واحدة فقط مهما تزامنت الطلبات على نفس المفتاح.
+    """
+
+    def __init__(self, refresh_margin: int = 300,
+                 on_refresh: Optional[Callable[[Hashable, Credentials], None]] = None):
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.on_refresh = on_refresh
+        self._entries: Dict[Hashable, Credentials] = {}
+        self._locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        """قفل خاص بكل مفتاح لتوحيد طلبات التحديث المتزامنة"""
+        with self._lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def get(self, key: Hashable, loader: Callable[[], Optional[Credentials]]) -> Optional[Credentials]:
+        """جلب بيانات المصادقة من الذاكرة أو تحميلها عبر loader عند غيابها"""
+        creds = self._entries.get(key)
+        if creds is None:
+            with self._key_lock(key):
+                creds = self._entries.get(key)
+                if creds is None:
+                    creds = loader()
+                    if creds is None:
+                        return None
+                    self._entries[key] = creds
+
+        if self._is_expired(creds):
+            self._refresh(key, creds)
+        elif self._expires_soon(creds):
+            self._refresh_in_background(key, creds)
+        return creds
+
+    def peek(self, key: Hashable) -> Optional[Credentials]:
+        """إرجاع بيانات المصادقة المخزنة إن كانت صالحة دون أي اتصال بالشبكة"""
+        creds = self._entries.get(key)
+        if creds is None or self._is_expired(creds):
+            return None
+        if self._expires_soon(creds):
+            self._refresh_in_background(key, creds)
+        return creds
+
+    def invalidate(self, key: Hashable):
+        """حذف بيانات المصادقة المخزنة (مثلاً بعد ربط حساب جديد)"""
+        self._entries.pop(key, None)
+
+    @staticmethod
+    def _is_expired(creds: Credentials) -> bool:
+        return not creds.token or creds.expired
+
+    def _expires_soon(self, creds: Credentials) -> bool:
+        return creds.expiry is not None and creds.expiry - self.refresh_margin <= datetime.utcnow()
+
+    def _refresh(self, key: Hashable, creds: Credentials):
+        """تحديث متزامن؛ الطلبات المتزامنة تنتظر نتيجة أول طلب"""
+        with self._key_lock(key):
+            # ربما حدّثه طلب آخر أثناء الانتظار
+            if not self._is_expired(creds):
+                return
+            self._do_refresh(key, creds)
+
+    def _refresh_in_background(self, key: Hashable, creds: Credentials):
+        """تحديث مسبق في خيط منفصل ما لم يكن هناك تحديث جارٍ بالفعل"""
+        lock = self._key_lock(key)
+        if not lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                if self._expires_soon(creds):
+                    self._do_refresh(key, creds)
+            finally:
+                lock.release()
+
+        threading.Thread(target=run, name=f'credential-refresh-{key}', daemon=True).start()
+
+    def _do_refresh(self, key: Hashable, creds: Credentials):
+        """تنفيذ طلب التحديث إلى Google وحفظ النتيجة"""
+        try:
+            creds.refresh(Request())
+        except Exception as e:
+            logger.error(f"خطأ في تحديث التوكن ({key}): {e}")
+            return
+
+        if self.on_refresh:
+            try:
+                self.on_refresh(key, creds)
+            except Exception as e:
+                logger.error(f"خطأ في حفظ التوكن المحدث ({key}): {e}")
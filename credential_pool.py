@@ -0,0 +1,170 @@
+"""
+مجمع بيانات مصادقة YouTube لتوزيع الرفع على أكثر من عميل OAuth
+"""
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from upload_retry import is_quota_error
+
+logger = logging.getLogger(__name__)
+
+
+class PooledCredential:
+    """عميل OAuth (مع توكن تحديث مشترك اختياري) وحالة استخدامه داخل العملية"""
+
+    def __init__(self, name: str, client_id: str, client_secret: str,
+                 refresh_token: Optional[str] = None):
+        self.name = name
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_token = refresh_token
+        self.active = 0
+        self.completed = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.last_error: Optional[str] = None
+        # لا يُختار قبل هذا الوقت (time.time())
+        self.drained_until = 0.0
+
+    def is_drained(self, now: float) -> bool:
+        return self.drained_until > now
+
+    def stats(self) -> Dict:
+        return {
+            "client_id": self.client_id[:12],
+            "active": self.active,
+            "completed": self.completed,
+            "errors": self.errors,
+            "drained_for": max(int(self.drained_until - time.time()), 0),
+            "last_error": self.last_error
+        }
+
+
+def load_credentials(raw: Optional[str], path: Optional[str],
+                     default: PooledCredential) -> List[PooledCredential]:
+    """قراءة المجمع من JSON (نص أو ملف): قائمة من name و client_id و client_secret و refresh_token
+
+    يُستخدم عميل default لأي عنصر بلا client_id، وإذا لم يُضبط المجمع يحتوي default فقط.
+    المجمع خاص ببيانات المصادقة المشتركة، لذلك يجب أن يحمل كل عنصر refresh_token؛
+    حسابات المستخدمين مرتبطة بعميل default وحده فتُحجز حصتها منه.
+    """
+    if path:
+        with open(path, encoding='utf-8') as f:
+            raw = f.read()
+    if not raw:
+        return [default]
+
+    credentials = []
+    for index, entry in enumerate(json.loads(raw)):
+        client_id = entry.get('client_id') or default.client_id
+        credentials.append(PooledCredential(
+            name=entry.get('name') or f"credential-{index + 1}",
+            client_id=client_id,
+            client_secret=entry.get('client_secret') or default.client_secret,
+            refresh_token=entry.get('refresh_token')
+        ))
+    if not credentials:
+        raise ValueError("مجمع بيانات مصادقة YouTube فارغ")
+    missing = [credential.name for credential in credentials if not credential.refresh_token]
+    if missing:
+        raise ValueError(
+            f"عناصر مجمع بيانات مصادقة YouTube بلا refresh_token: {', '.join(missing)}"
+        )
+    return credentials
+
+
+class CredentialPool:
+    """اختيار أقل بيانات مصادقة انشغالاً لكل طلب مع مراعاة حصة كل عميل
+
+    - يُختار العنصر صاحب أقل عمليات جارية (ثم أقل عمليات منجزة) ومن ثم يُحجز من حصة
+      عميله في QuotaScheduler؛ إذا نفدت حصته يُجرب العنصر التالي.
+    - العنصر الذي يرفضه YouTube بسبب الحصة يُستبعد حتى التصفير اليومي وتُسجل حصته
+      مستنفدة لجميع العمليات.
+    - error_threshold أخطاء متتالية تستبعده cooldown ثانية.
+    """
+
+    def __init__(self, credentials: List[PooledCredential], quota,
+                 error_threshold: int = 3, cooldown: int = 300):
+        self.credentials = credentials
+        self.quota = quota
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+
+    @property
+    def shared(self) -> bool:
+        """بيانات مصادقة مشتركة لجميع المستخدمين بدلاً من حساب كل مستخدم"""
+        return any(credential.refresh_token for credential in self.credentials)
+
+    @property
+    def default(self) -> PooledCredential:
+        """أول عنصر غير مستبعد (لطلبات لا تحتاج حجز حصة)"""
+        now = time.time()
+        for credential in self.credentials:
+            if not credential.is_drained(now):
+                return credential
+        return self.credentials[0]
+
+    async def reserve(self, operation: str) -> Tuple[Optional[PooledCredential], float]:
+        """اختيار عنصر وحجز تكلفة الطلب: (العنصر، 0) أو (None، ثواني الانتظار)"""
+        now = time.time()
+        waits = [credential.drained_until - now for credential in self.credentials
+                 if credential.is_drained(now)]
+        eligible = sorted(
+            (credential for credential in self.credentials if not credential.is_drained(now)),
+            key=lambda credential: (credential.active, credential.completed)
+        )
+        for credential in eligible:
+            wait = await self.quota.reserve(credential.client_id, operation)
+            if not wait:
+                credential.active += 1
+                return credential, 0.0
+            waits.append(wait)
+        return None, min(waits)
+
+    async def acquire(self, operation: str, max_wait: float) -> Optional[PooledCredential]:
+        """انتظار عنصر متاح حتى max_wait ثانية"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            credential, wait = await self.reserve(operation)
+            if credential is not None:
+                return credential
+            if time.monotonic() + wait > deadline:
+                return None
+            await asyncio.sleep(wait)
+
+    async def exhausted(self, operation: str) -> bool:
+        """هل نفدت حصة اليوم لجميع العناصر، فلا فائدة من المحاولة قبل التصفير"""
+        for credential in self.credentials:
+            if not await self.quota.exhausted(credential.client_id, operation):
+                return False
+        return True
+
+    async def refund(self, credential: PooledCredential, operation: str):
+        """إعادة تكلفة طلب محجوز لم يُرسل وإنهاء استخدامه"""
+        credential.active -= 1
+        await self.quota.refund(credential.client_id, operation)
+
+    async def release(self, credential: PooledCredential, error: Optional[Exception] = None):
+        """إنهاء استخدام العنصر وتسجيل نتيجته"""
+        credential.active -= 1
+        if error is None:
+            credential.completed += 1
+            credential.consecutive_errors = 0
+            return
+
+        credential.errors += 1
+        credential.consecutive_errors += 1
+        credential.last_error = str(error)[:200]
+        if is_quota_error(error):
+            credential.drained_until = time.time() + self.quota.seconds_until_reset()
+            await self.quota.mark_exhausted(credential.client_id)
+            logger.warning(f"⚠️ نفدت حصة YouTube لبيانات المصادقة {credential.name}، استبعادها حتى التصفير")
+        elif credential.consecutive_errors >= self.error_threshold:
+            credential.drained_until = time.time() + self.cooldown
+            credential.consecutive_errors = 0
+            logger.warning(f"⚠️ استبعاد بيانات المصادقة {credential.name} {self.cooldown} ثانية بعد أخطاء متتالية")
+
+    def stats(self) -> Dict:
+        return {credential.name: credential.stats() for credential in self.credentials}
@@ -2,17 +2,27 @@
 إدارة قاعدة بيانات PostgreSQL
 """
 import os
+import time
 import asyncio
-from datetime import datetime
-from typing import Optional, List, Dict
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean
+import threading
+from collections import namedtuple, OrderedDict
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Optional, List, Dict, Tuple
+from sqlalchemy import create_engine, inspect, select, insert, update, delete, tuple_, func, case, text, and_, or_, make_url, table, column, Column, Index, Integer, BigInteger, String, Date, DateTime, Text, Boolean
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 import logging
 
 logger = logging.getLogger(__name__)
 
+# ترحيلات Alembic التي يجب أن تكون مطبقة قبل تشغيل البوت
+MIGRATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
 # إنشاء قاعدة النماذج
 Base = declarative_base()
 
@@ -51,14 +61,388 @@ class UploadLog(Base):
     channel_id = Column(String(255))
     channel_name = Column(String(255))
     upload_time = Column(DateTime, default=datetime.utcnow)
+    # عدد محاولات الإرسال إلى YouTube (إعادة الأجزاء بعد الأخطاء المؤقتة وإعادة سحب المهمة)
+    attempts = Column(Integer, default=1)
+    
+    # الفهارس تُنشأ على قواعد البيانات الحالية عبر ترحيلات Alembic (migrations/)
+    __table_args__ = (
+        Index('ix_upload_logs_user_id_upload_time', 'user_id', upload_time.desc()),
+        Index('ix_upload_logs_user_id_upload_status', 'user_id', 'upload_status'),
+        Index('ix_upload_logs_upload_time', 'upload_time'),
+    )
+
+class UserUploadStats(Base):
+    """عدادات الرفع لكل مستخدم، تُحدَّث مع كل عملية تسجيل"""
+    __tablename__ = 'user_upload_stats'
+    
+    user_id = Column(Integer, primary_key=True)
+    total_uploads = Column(Integer, default=0, nullable=False)
+    successful_uploads = Column(Integer, default=0, nullable=False)
+    failed_uploads = Column(Integer, default=0, nullable=False)
+    bytes_uploaded = Column(BigInteger, default=0, nullable=False)
+    last_upload_time = Column(DateTime)
+
+class UploadSession(Base):
+    """نموذج جلسات الرفع القابلة للاستئناف"""
+    __tablename__ = 'upload_sessions'
+    
+    session_key = Column(String(255), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    file_path = Column(String(500))
+    resumable_uri = Column(Text, nullable=False)
+    bytes_committed = Column(BigInteger, default=0)
+    total_bytes = Column(BigInteger)
+    request_body = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ConversationState(Base):
+    """حالة محادثة المستخدم (خطوة الإعداد والفيديو المنتظر) مشتركة بين العمليات"""
+    __tablename__ = 'conversation_states'
+    
+    state_key = Column(String(255), primary_key=True)
+    value = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class ProcessedUpdate(Base):
+    """معرفات تحديثات تلقرام المستلمة لتجاهل إعادة إرسالها بين العمليات"""
+    __tablename__ = 'processed_updates'
+    
+    update_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class YouTubeQuotaUsage(Base):
+    """وحدات حصة YouTube Data API المستهلكة لكل عميل OAuth في كل يوم حصة (توقيت المحيط الهادئ)"""
+    __tablename__ = 'youtube_quota_usage'
+    
+    client_id = Column(String(255), primary_key=True)
+    quota_day = Column(Date, primary_key=True)
+    units_used = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UploadJobRecord(Base):
+    """مهمة رفع دائمة تسحبها عمليات upload_worker.py من أي خادم
+
+    الحالات: queued -> downloading -> uploading -> done أو failed. العامل الذي يسحب
+    المهمة يملك عقداً (lease) يجدده دورياً؛ إذا انتهى العقد دون تجديد تعود المهمة
+    متاحة لعامل آخر.
+    """
+    __tablename__ = 'upload_jobs'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    status = Column(String(20), nullable=False, default='queued')
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    lease_owner = Column(String(255))
+    lease_expires_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    video_id = Column(String(255))
+    error_message = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_upload_jobs_status_created_at', 'status', 'created_at'),
+    )
+
+# نسخة ثابتة من صف المستخدم منفصلة عن الجلسة
+UserSnapshot = namedtuple('UserSnapshot', [column.name for column in User.__table__.columns])
+
+def _user_snapshot(user: Optional[User]) -> Optional[UserSnapshot]:
+    """تحويل صف المستخدم إلى نسخة ثابتة آمنة للتخزين المؤقت"""
+    if user is None:
+        return None
+    return UserSnapshot(**{name: getattr(user, name) for name in UserSnapshot._fields})
+
+class UserCache:
+    """ذاكرة مؤقتة محدودة (LRU + TTL) لصفوف المستخدمين
+
+    مشتركة بين المدير المتزامن وغير المتزامن، وتُبطل عند أي كتابة على المستخدم.
+    تُخزن أيضاً نتيجة عدم وجود المستخدم حتى لا يتكرر الاستعلام عنه.
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, user_id: int):
+        """إرجاع (موجود، القيمة) من الذاكرة"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return True, entry[1]
+    
+    def put(self, user_id: int, snapshot: Optional[UserSnapshot]):
+        """تخزين نسخة المستخدم"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, user_id: int):
+        """حذف المستخدم من الذاكرة بعد تعديله"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+    
+    def stats(self) -> Dict:
+        """عدادات الإصابة والإخفاق"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / total * 100) if total > 0 else 0
+        }
+
+# ===== استعلامات مشتركة بين المدير المتزامن وغير المتزامن =====
+
+def _dialect_insert(dialect_name: str):
+    """دالة INSERT الخاصة بقاعدة البيانات والتي تدعم ON CONFLICT"""
+    if dialect_name == 'postgresql':
+        return postgresql.insert
+    if dialect_name == 'sqlite':
+        return sqlite.insert
+    raise NotImplementedError(f"قاعدة البيانات {dialect_name} غير مدعومة")
+
+def _user_upsert(dialect_name: str, user_data: Dict):
+    """إنشاء المستخدم أو تحديثه بعبارة INSERT ... ON CONFLICT DO UPDATE واحدة تُرجع الصف"""
+    columns = User.__table__.columns
+    values = {key: value for key, value in user_data.items() if key in columns}
+    values['updated_at'] = datetime.utcnow()
+    
+    stmt = _dialect_insert(dialect_name)(User).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=[User.user_id],
+        set_={key: stmt.excluded[key] for key in values if key != 'user_id'}
+    ).returning(*columns)
+
+def _row_snapshot(row) -> UserSnapshot:
+    """تحويل صف RETURNING إلى نسخة ثابتة"""
+    return UserSnapshot(**{name: row._mapping[name] for name in UserSnapshot._fields})
+
+def _prepare_upload_data(upload_data: Dict) -> Dict:
+    """تثبيت وقت الرفع ليتطابق السجل مع العدادات"""
+    if upload_data.get('upload_time') is None:
+        upload_data = dict(upload_data, upload_time=datetime.utcnow())
+    return upload_data
+
+def _upload_stats_deltas(records: List[Dict]) -> List[Dict]:
+    """تجميع زيادات العدادات لكل مستخدم من مجموعة سجلات رفع"""
+    deltas: Dict[int, Dict] = {}
+    for upload_data in records:
+        status = upload_data.get('upload_status') or ''
+        succeeded = status == 'success'
+        delta = deltas.setdefault(upload_data['user_id'], {
+            'user_id': upload_data['user_id'],
+            'total_uploads': 0,
+            'successful_uploads': 0,
+            'failed_uploads': 0,
+            'bytes_uploaded': 0,
+            'last_upload_time': upload_data['upload_time']
+        })
+        delta['total_uploads'] += 1
+        delta['successful_uploads'] += 1 if succeeded else 0
+        delta['failed_uploads'] += 1 if status.startswith('error') else 0
+        delta['bytes_uploaded'] += (upload_data.get('file_size') or 0) if succeeded else 0
+        delta['last_upload_time'] = max(delta['last_upload_time'], upload_data['upload_time'])
+    return list(deltas.values())
+
+def _upload_stats_upsert(dialect_name: str, deltas: List[Dict]):
+    """زيادة عدادات المستخدمين ذرياً بعبارة INSERT ... ON CONFLICT DO UPDATE واحدة"""
+    stmt = _dialect_insert(dialect_name)(UserUploadStats).values(deltas)
+    return stmt.on_conflict_do_update(
+        index_elements=[UserUploadStats.user_id],
+        set_={
+            'total_uploads': UserUploadStats.total_uploads + stmt.excluded.total_uploads,
+            'successful_uploads': UserUploadStats.successful_uploads + stmt.excluded.successful_uploads,
+            'failed_uploads': UserUploadStats.failed_uploads + stmt.excluded.failed_uploads,
+            'bytes_uploaded': UserUploadStats.bytes_uploaded + stmt.excluded.bytes_uploaded,
+            'last_upload_time': stmt.excluded.last_upload_time
+        }
+    )
+
+def _conversation_state_upsert(dialect_name: str, state_key: str, value: str, expires_at: datetime):
+    """كتابة حالة المحادثة بعبارة واحدة (إنشاء أو استبدال)"""
+    stmt = _dialect_insert(dialect_name)(ConversationState).values(
+        state_key=state_key, value=value, expires_at=expires_at
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[ConversationState.state_key],
+        set_={'value': stmt.excluded.value, 'expires_at': stmt.excluded.expires_at}
+    )
+
+def _quota_reserve(dialect_name: str, client_id: str, quota_day: date, units: int, daily_limit: int):
+    """إضافة الوحدات إلى رصيد اليوم فقط إذا بقي المجموع ضمن الحد (لا يُرجع صفاً عند الرفض)"""
+    stmt = _dialect_insert(dialect_name)(YouTubeQuotaUsage).values(
+        client_id=client_id, quota_day=quota_day, units_used=units, updated_at=datetime.utcnow()
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[YouTubeQuotaUsage.client_id, YouTubeQuotaUsage.quota_day],
+        set_={
+            'units_used': YouTubeQuotaUsage.units_used + stmt.excluded.units_used,
+            'updated_at': stmt.excluded.updated_at
+        },
+        where=YouTubeQuotaUsage.units_used + stmt.excluded.units_used <= daily_limit
+    ).returning(YouTubeQuotaUsage.units_used)
+
+# حالات المهمة التي يملكها عامل عبر عقد
+UPLOAD_JOB_LEASED = ('downloading', 'uploading')
+
+def _upload_job_claim(worker_id: str, lease_seconds: int, max_attempts: int):
+    """سحب أقدم مهمة متاحة بـ FOR UPDATE SKIP LOCKED حتى لا يتزاحم العمال على نفس الصف"""
+    now = datetime.utcnow()
+    claimable = or_(
+        UploadJobRecord.status == 'queued',
+        and_(UploadJobRecord.status.in_(UPLOAD_JOB_LEASED), UploadJobRecord.lease_expires_at < now)
+    )
+    candidate = select(UploadJobRecord.id)\
+        .where(claimable, UploadJobRecord.attempts < max_attempts)\
+        .order_by(UploadJobRecord.created_at, UploadJobRecord.id)\
+        .limit(1)\
+        .with_for_update(skip_locked=True)\
+        .scalar_subquery()
+    return update(UploadJobRecord)\
+        .where(UploadJobRecord.id == candidate)\
+        .values(
+            status='downloading',
+            lease_owner=worker_id,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            heartbeat_at=now,
+            attempts=UploadJobRecord.attempts + 1,
+            updated_at=now
+        )\
+        .returning(*UploadJobRecord.__table__.columns)
+
+def _upload_logs_insert(records: List[Dict]):
+    """إدراج عدة سجلات رفع بعبارة INSERT واحدة متعددة الصفوف"""
+    columns = [column.name for column in UploadLog.__table__.columns if column.name != 'id']
+    rows = [{name: record.get(name) for name in columns} for record in records]
+    return insert(UploadLog.__table__).values(rows)
+
+def _user_uploads_page(user_id: int, limit: int,
+                       before: Optional[Tuple[datetime, int]] = None,
+                       after: Optional[Tuple[datetime, int]] = None):
+    """صفحة من سجل الرفع بترقيم المفتاح (upload_time, id) بدلاً من OFFSET
+
+    before: الصفوف الأقدم من المؤشر (ترتيب تنازلي)
+    after: الصفوف الأحدث من المؤشر (ترتيب تصاعدي، يعكسه المستدعي)
+    """
+    key = tuple_(UploadLog.upload_time, UploadLog.id)
+    query = select(UploadLog).where(UploadLog.user_id == user_id)
+    
+    if after is not None:
+        return query.where(key > tuple_(*after))\
+            .order_by(UploadLog.upload_time.asc(), UploadLog.id.asc())\
+            .limit(limit)
+    
+    if before is not None:
+        query = query.where(key < tuple_(*before))
+    return query.order_by(UploadLog.upload_time.desc(), UploadLog.id.desc()).limit(limit)
+
+# أعمدة تصدير سجل الرفع
+UPLOAD_EXPORT_COLUMNS = [
+    'upload_time', 'video_title', 'video_url', 'privacy_status', 'upload_status',
+    'channel_name', 'file_size', 'duration', 'attempts', 'error_message'
+]
+
+def _upload_logs_table(partition: Optional[str] = None):
+    """جدول upload_logs أو أحد أقسامه بالأعمدة نفسها"""
+    if partition is None:
+        return UploadLog.__table__
+    return table(partition, *(column(c.name) for c in UploadLog.__table__.columns))
+
+def _expired_logs_batch(cutoff: datetime, after_id: int, limit: int, columns=None,
+                        partition: Optional[str] = None):
+    """دفعة من السجلات الأقدم من cutoff بترتيب المفتاح الأساسي بعد after_id"""
+    logs = _upload_logs_table(partition)
+    return select(*(columns or logs.columns))\
+        .where(logs.c.upload_time < cutoff, logs.c.id > after_id)\
+        .order_by(logs.c.id)\
+        .limit(limit)
+
+def _upload_logs_range_delete(cutoff: datetime, first_id: int, last_id: int,
+                              partition: Optional[str] = None):
+    """حذف نطاق محدود من المفاتيح الأساسية حتى لا تطول الأقفال أو دفعة WAL"""
+    logs = _upload_logs_table(partition)
+    return delete(logs)\
+        .where(logs.c.id.between(first_id, last_id), logs.c.upload_time < cutoff)
+
+# أقسام upload_logs الشهرية عند تفعيل التقسيم على PostgreSQL (ترحيل 0003)
+UPLOAD_LOG_PARTITION_PREFIX = 'upload_logs_p'
+# يلتقط السجلات خارج الأقسام الشهرية (مثلاً قبل إنشاء قسم شهرها)
+UPLOAD_LOG_DEFAULT_PARTITION = 'upload_logs_default'
+
+def _next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def _upload_log_partition_bounds(name: str) -> Optional[Tuple[datetime, datetime]]:
+    """حدود القسم من اسمه upload_logs_pYYYYMM (None للقسم الافتراضي)"""
+    suffix = name[len(UPLOAD_LOG_PARTITION_PREFIX):]
+    if not name.startswith(UPLOAD_LOG_PARTITION_PREFIX) or len(suffix) != 6 or not suffix.isdigit():
+        return None
+    start = datetime(int(suffix[:4]), int(suffix[4:]), 1)
+    return start, _next_month(start)
+
+def _upload_stats_aggregate(user_id: int):
+    """حساب الإحصائيات من سجل الرفع باستعلام تجميعي واحد"""
+    succeeded = UploadLog.upload_status == 'success'
+    return select(
+        func.count().label('total_uploads'),
+        func.coalesce(func.sum(case((succeeded, 1), else_=0)), 0).label('successful_uploads'),
+        func.coalesce(func.sum(case((UploadLog.upload_status.like('error%'), 1), else_=0)), 0).label('failed_uploads'),
+        func.coalesce(func.sum(case((succeeded, UploadLog.file_size), else_=0)), 0).label('bytes_uploaded'),
+        func.max(UploadLog.upload_time).label('last_upload_time')
+    ).where(UploadLog.user_id == user_id)
+
+def _upload_stats_existing(user_ids: List[int]):
+    """المستخدمون الذين لديهم صف عدادات من بين user_ids"""
+    return select(UserUploadStats.user_id).where(UserUploadStats.user_id.in_(user_ids))
+
+def _upload_stats_seed(dialect_name: str, user_id: int, row):
+    """إنشاء صف العدادات لمستخدم لديه سجل رفع أقدم من جدول العدادات"""
+    return _dialect_insert(dialect_name)(UserUploadStats).values(
+        user_id=user_id,
+        total_uploads=row.total_uploads,
+        successful_uploads=row.successful_uploads,
+        failed_uploads=row.failed_uploads,
+        bytes_uploaded=row.bytes_uploaded,
+        last_upload_time=row.last_upload_time
+    ).on_conflict_do_nothing(index_elements=[UserUploadStats.user_id])
+
+def _stats_to_dict(row) -> Dict:
+    """تحويل صف العدادات إلى قاموس الإحصائيات"""
+    total_uploads = row.total_uploads if row else 0
+    successful_uploads = row.successful_uploads if row else 0
+    return {
+        'total': total_uploads,
+        'successful': successful_uploads,
+        'failed': row.failed_uploads if row else 0,
+        'bytes_uploaded': row.bytes_uploaded if row else 0,
+        'last_upload_time': row.last_upload_time if row else None,
+        'success_rate': (successful_uploads / total_uploads * 100) if total_uploads > 0 else 0
+    }
 
 class DatabaseManager:
     """مدير قاعدة البيانات"""
     
-    def __init__(self, database_url: str):
+    def __init__(self, database_url: str, user_cache: Optional[UserCache] = None):
         self.database_url = database_url
         self.engine = None
         self.SessionLocal = None
+        self.user_cache = user_cache or UserCache()
         
     def connect(self):
         """الاتصال بقاعدة البيانات"""
@@ -76,8 +460,8 @@ class DatabaseManager:
                 bind=self.engine
             )
             
-            # إنشاء الجداول
-            Base.metadata.create_all(bind=self.engine)
+            if not self._check_schema_revision():
+                return False
             
             logger.info("✅ تم الاتصال بقاعدة البيانات PostgreSQL بنجاح")
             return True
@@ -86,6 +470,30 @@ class DatabaseManager:
             logger.error(f"❌ خطأ في الاتصال بقاعدة البيانات: {e}")
             return False
     
+    def _check_schema_revision(self) -> bool:
+        """التأكد من أن مخطط قاعدة البيانات على آخر ترحيل قبل استخدام أعمدته
+        
+        قاعدة البيانات الفارغة تُنشأ جداولها مباشرة وتُعلَّم بآخر ترحيل؛ غير ذلك يجب
+        تطبيق الترحيلات أولاً (alembic upgrade head) وإلا فشلت الكتابة في الأعمدة الجديدة.
+        """
+        script = ScriptDirectory(MIGRATIONS_PATH)
+        head = script.get_current_head()
+        with self.engine.begin() as connection:
+            migration = MigrationContext.configure(connection)
+            current = migration.get_current_revision()
+            if current is None and not inspect(connection).get_table_names():
+                Base.metadata.create_all(bind=connection)
+                migration.stamp(script, head)
+                current = head
+        
+        if current != head:
+            logger.error(
+                f"❌ مخطط قاعدة البيانات ليس على آخر ترحيل ({current or 'لا يوجد'} بدلاً من {head})، "
+                f"شغّل alembic upgrade head أولاً"
+            )
+            return False
+        return True
+    
     def get_session(self) -> Session:
         """الحصول على جلسة قاعدة البيانات"""
         return self.SessionLocal()
@@ -102,66 +510,46 @@ class DatabaseManager:
     
     # ===== عمليات المستخدمين =====
     
-    def get_user(self, user_id: int) -> Optional[User]:
+    def get_user(self, user_id: int) -> Optional[UserSnapshot]:
         """جلب بيانات المستخدم"""
+        found, snapshot = self.user_cache.get(user_id)
+        if found:
+            return snapshot
         try:
             with self.get_session() as session:
-                return session.query(User).filter(User.user_id == user_id).first()
+                snapshot = _user_snapshot(
+                    session.query(User).filter(User.user_id == user_id).first()
+                )
+                self.user_cache.put(user_id, snapshot)
+                return snapshot
         except SQLAlchemyError as e:
             logger.error(f"خطأ في جلب المستخدم {user_id}: {e}")
             return None
     
-    def create_or_update_user(self, user_data: Dict) -> bool:
+    def create_or_update_user(self, user_data: Dict) -> Optional[UserSnapshot]:
         """إنشاء أو تحديث المستخدم"""
         try:
             with self.get_session() as session:
-                user = session.query(User).filter(User.user_id == user_data['user_id']).first()
-                
-                if user:
-                    # تحديث المستخدم الموجود
-                    for key, value in user_data.items():
-                        if hasattr(user, key):
-                            setattr(user, key, value)
-                    user.updated_at = datetime.utcnow()
-                else:
-                    # إنشاء مستخدم جديد
-                    user = User(**user_data)
-                    session.add(user)
-                
+                row = session.execute(_user_upsert(self.engine.dialect.name, user_data)).one()
                 session.commit()
-                return True
+                
+                snapshot = _row_snapshot(row)
+                self.user_cache.put(snapshot.user_id, snapshot)
+                return snapshot
                 
         except SQLAlchemyError as e:
             logger.error(f"خطأ في حفظ المستخدم: {e}")
-            return False
+            return None
     
     def save_user_credentials(self, user_id: int, access_token: str, 
-                            refresh_token: str, token_expiry: datetime) -> bool:
+                            refresh_token: str, token_expiry: datetime) -> Optional[UserSnapshot]:
         """حفظ بيانات المصادقة"""
-        try:
-            with self.get_session() as session:
-                user = session.query(User).filter(User.user_id == user_id).first()
-                
-                if user:
-                    user.access_token = access_token
-                    user.refresh_token = refresh_token
-                    user.token_expiry = token_expiry
-                    user.updated_at = datetime.utcnow()
-                else:
-                    user = User(
-                        user_id=user_id,
-                        access_token=access_token,
-                        refresh_token=refresh_token,
-                        token_expiry=token_expiry
-                    )
-                    session.add(user)
-                
-                session.commit()
-                return True
-                
-        except SQLAlchemyError as e:
-            logger.error(f"خطأ في حفظ بيانات المصادقة: {e}")
-            return False
+        return self.create_or_update_user({
+            'user_id': user_id,
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'token_expiry': token_expiry
+        })
     
     def update_user_channel(self, user_id: int, channel_id: str, channel_name: str) -> bool:
         """تحديث قناة المستخدم المختارة"""
@@ -174,6 +562,7 @@ class DatabaseManager:
                     user.selected_channel_name = channel_name
                     user.updated_at = datetime.utcnow()
                     session.commit()
+                    self.user_cache.invalidate(user_id)
                     return True
                 
                 return False
@@ -187,9 +576,16 @@ class DatabaseManager:
     def log_upload(self, upload_data: Dict) -> bool:
         """تسجيل عملية رفع"""
         try:
+            upload_data = _prepare_upload_data(upload_data)
             with self.get_session() as session:
+                # إنشاء العدادات من السجل السابق قبل إضافة السجل الجديد إليها
+                self._seed_upload_stats(session, [upload_data['user_id']])
                 upload_log = UploadLog(**upload_data)
                 session.add(upload_log)
+                # تحديث العدادات في نفس المعاملة
+                session.execute(_upload_stats_upsert(
+                    self.engine.dialect.name, _upload_stats_deltas([upload_data])
+                ))
                 session.commit()
                 return True
                 
@@ -197,15 +593,26 @@ class DatabaseManager:
             logger.error(f"خطأ في تسجيل الرفع: {e}")
             return False
     
-    def get_user_uploads(self, user_id: int, limit: int = 10) -> List[UploadLog]:
-        """جلب سجل رفع المستخدم"""
+    def _seed_upload_stats(self, session: Session, user_ids: List[int]):
+        """إنشاء صفوف العدادات الناقصة من سجل الرفع الحالي داخل معاملة التسجيل
+
+        بدونها ينشئ أول تسجيل بعد إضافة جدول العدادات صفاً من الزيادة وحدها ويضيع
+        سجل المستخدم السابق.
+        """
+        existing = set(session.scalars(_upload_stats_existing(user_ids)))
+        for user_id in set(user_ids) - existing:
+            stats = session.execute(_upload_stats_aggregate(user_id)).one()
+            if stats.total_uploads:
+                session.execute(_upload_stats_seed(self.engine.dialect.name, user_id, stats))
+    
+    def get_user_uploads(self, user_id: int, limit: int = 10,
+                         before: Optional[Tuple[datetime, int]] = None,
+                         after: Optional[Tuple[datetime, int]] = None) -> List[UploadLog]:
+        """جلب صفحة من سجل رفع المستخدم (الأحدث أولاً)"""
         try:
             with self.get_session() as session:
-                return session.query(UploadLog)\
-                    .filter(UploadLog.user_id == user_id)\
-                    .order_by(UploadLog.upload_time.desc())\
-                    .limit(limit)\
-                    .all()
+                uploads = list(session.scalars(_user_uploads_page(user_id, limit, before, after)))
+                return uploads[::-1] if after is not None else uploads
         except SQLAlchemyError as e:
             logger.error(f"خطأ في جلب سجل الرفع: {e}")
             return []
@@ -214,27 +621,65 @@ class DatabaseManager:
         """إحصائيات الرفع للمستخدم"""
         try:
             with self.get_session() as session:
-                total_uploads = session.query(UploadLog)\
-                    .filter(UploadLog.user_id == user_id).count()
+                stats = session.get(UserUploadStats, user_id)
+                if stats is None:
+                    # مستخدم سجله أقدم من جدول العدادات: احسبه مرة واحدة واحفظه
+                    stats = session.execute(_upload_stats_aggregate(user_id)).one()
+                    if stats.total_uploads:
+                        session.execute(_upload_stats_seed(self.engine.dialect.name, user_id, stats))
+                        session.commit()
                 
-                successful_uploads = session.query(UploadLog)\
-                    .filter(UploadLog.user_id == user_id, 
-                           UploadLog.upload_status == 'success').count()
+                return _stats_to_dict(stats)
                 
-                failed_uploads = session.query(UploadLog)\
-                    .filter(UploadLog.user_id == user_id, 
-                           UploadLog.upload_status.like('error%')).count()
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في جلب الإحصائيات: {e}")
+            return _stats_to_dict(None)
+    
+    # ===== عمليات جلسات الرفع =====
+    
+    def get_upload_session(self, session_key: str) -> Optional[UploadSession]:
+        """جلب جلسة رفع قابلة للاستئناف"""
+        try:
+            with self.get_session() as session:
+                return session.query(UploadSession)\
+                    .filter(UploadSession.session_key == session_key).first()
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في جلب جلسة الرفع {session_key}: {e}")
+            return None
+    
+    def save_upload_session(self, session_data: Dict) -> bool:
+        """حفظ رابط جلسة الرفع وآخر بايت مؤكد"""
+        try:
+            with self.get_session() as session:
+                upload_session = session.query(UploadSession)\
+                    .filter(UploadSession.session_key == session_data['session_key']).first()
                 
-                return {
-                    'total': total_uploads,
-                    'successful': successful_uploads,
-                    'failed': failed_uploads,
-                    'success_rate': (successful_uploads / total_uploads * 100) if total_uploads > 0 else 0
-                }
+                if upload_session:
+                    for key, value in session_data.items():
+                        setattr(upload_session, key, value)
+                    upload_session.updated_at = datetime.utcnow()
+                else:
+                    upload_session = UploadSession(**session_data)
+                    session.add(upload_session)
+                
+                session.commit()
+                return True
                 
         except SQLAlchemyError as e:
-            logger.error(f"خطأ في جلب الإحصائيات: {e}")
-            return {'total': 0, 'successful': 0, 'failed': 0, 'success_rate': 0}
+            logger.error(f"خطأ في حفظ جلسة الرفع: {e}")
+            return False
+    
+    def delete_upload_session(self, session_key: str) -> bool:
+        """حذف جلسة رفع مكتملة أو منتهية"""
+        try:
+            with self.get_session() as session:
+                session.query(UploadSession)\
+                    .filter(UploadSession.session_key == session_key).delete()
+                session.commit()
+                return True
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في حذف جلسة الرفع: {e}")
+            return False
     
     # ===== عمليات الإدارة =====
     
@@ -256,35 +701,743 @@ class DatabaseManager:
             logger.error(f"خطأ في عد المستخدمين النشطين: {e}")
             return 0
     
-    def cleanup_old_logs(self, days: int = 30) -> int:
-        """تنظيف السجلات القديمة"""
+    def cleanup_old_logs(self, days: int = 30, batch_size: int = 1000, pause: float = 0.1) -> int:
+        """تنظيف السجلات القديمة على دفعات بنطاقات المفتاح الأساسي
+
+        عدادات user_upload_stats لا تتأثر بالحذف لأنها تُحدَّث عند التسجيل.
+        """
+        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        deleted_count = 0
+        after_id = 0
+        try:
+            while True:
+                with self.get_session() as session:
+                    ids = list(session.scalars(
+                        _expired_logs_batch(cutoff_date, after_id, batch_size, [UploadLog.id])
+                    ))
+                    if not ids:
+                        break
+                    result = session.execute(_upload_logs_range_delete(cutoff_date, ids[0], ids[-1]))
+                    session.commit()
+                deleted_count += result.rowcount
+                after_id = ids[-1]
+                # إفساح المجال لبقية الاستعلامات بين الدفعات
+                time.sleep(pause)
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في تنظيف السجلات: {e}")
+        
+        logger.info(f"تم حذف {deleted_count} سجل قديم")
+        return deleted_count
+
+# إنشاء مثيل مدير قاعدة البيانات
+def create_database_manager(user_cache: Optional[UserCache] = None) -> Optional[DatabaseManager]:
+    """إنشاء مدير قاعدة البيانات"""
+    database_url = os.getenv('DATABASE_URL')
+    
+    if not database_url:
+        logger.error("❌ DATABASE_URL غير موجود في متغيرات البيئة")
+        return None
+    
+    db_manager = DatabaseManager(database_url, user_cache)
+    
+    if db_manager.connect():
+        return db_manager
+    else:
+        return None
+
+class AsyncDatabaseManager:
+    """مدير قاعدة البيانات غير المتزامن لمعالجات البوت
+
+    يستخدم محرك SQLAlchemy غير المتزامن (asyncpg) حتى لا تتوقف حلقة الأحداث أثناء
+    استعلامات PostgreSQL. إنشاء الجداول يبقى مسؤولية DatabaseManager المتزامن.
+    """
+    
+    def __init__(self, database_url: str, user_cache: Optional[UserCache] = None):
+        self.database_url = database_url
+        self.engine = None
+        self.SessionLocal = None
+        self.user_cache = user_cache or UserCache()
+    
+    @staticmethod
+    def _async_url(database_url: str):
+        """تحويل رابط قاعدة البيانات إلى مشغل غير متزامن"""
+        url = make_url(database_url)
+        connect_args = {}
+        
+        if url.drivername in ('postgres', 'postgresql', 'postgresql+psycopg2'):
+            url = url.set(drivername='postgresql+asyncpg')
+            # asyncpg لا يقبل sslmode في الرابط
+            sslmode = url.query.get('sslmode')
+            if sslmode:
+                url = url.difference_update_query(['sslmode'])
+                if sslmode != 'disable':
+                    connect_args['ssl'] = 'require'
+        elif url.drivername == 'sqlite':
+            url = url.set(drivername='sqlite+aiosqlite')
+        
+        return url, connect_args
+    
+    def connect(self) -> bool:
+        """إنشاء محرك الاتصال غير المتزامن"""
         try:
-            from datetime import timedelta
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
+            url, connect_args = self._async_url(self.database_url)
+            self.engine = create_async_engine(
+                url,
+                pool_pre_ping=True,
+                pool_recycle=300,
+                connect_args=connect_args,
+                echo=False
+            )
             
-            with self.get_session() as session:
-                deleted_count = session.query(UploadLog)\
-                    .filter(UploadLog.upload_time < cutoff_date)\
-                    .delete()
-                session.commit()
+            self.SessionLocal = async_sessionmaker(
+                bind=self.engine,
+                autoflush=False,
+                expire_on_commit=False
+            )
+            return True
+            
+        except (SQLAlchemyError, ImportError) as e:
+            logger.error(f"❌ خطأ في إنشاء الاتصال غير المتزامن: {e}")
+            return False
+    
+    def get_session(self) -> AsyncSession:
+        """الحصول على جلسة قاعدة بيانات غير متزامنة"""
+        return self.SessionLocal()
+    
+    async def close(self):
+        """إغلاق جميع الاتصالات"""
+        if self.engine is not None:
+            await self.engine.dispose()
+    
+    async def test_connection(self) -> bool:
+        """اختبار الاتصال بقاعدة البيانات"""
+        try:
+            async with self.get_session() as session:
+                await session.execute(text("SELECT 1"))
+                return True
+        except Exception as e:
+            logger.error(f"❌ فشل اختبار الاتصال: {e}")
+            return False
+    
+    # ===== عمليات المستخدمين =====
+    
+    async def get_user(self, user_id: int) -> Optional[UserSnapshot]:
+        """جلب بيانات المستخدم"""
+        found, snapshot = self.user_cache.get(user_id)
+        if found:
+            return snapshot
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(select(User).where(User.user_id == user_id))
+                snapshot = _user_snapshot(result.scalars().first())
+                self.user_cache.put(user_id, snapshot)
+                return snapshot
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في جلب المستخدم {user_id}: {e}")
+            return None
+    
+    async def create_or_update_user(self, user_data: Dict) -> Optional[UserSnapshot]:
+        """إنشاء أو تحديث المستخدم"""
+        try:
+            async with self.get_session() as session:
+                row = (await session.execute(_user_upsert(self.engine.dialect.name, user_data))).one()
+                await session.commit()
                 
-                logger.info(f"تم حذف {deleted_count} سجل قديم")
-                return deleted_count
+                snapshot = _row_snapshot(row)
+                self.user_cache.put(snapshot.user_id, snapshot)
+                return snapshot
                 
         except SQLAlchemyError as e:
-            logger.error(f"خطأ في تنظيف السجلات: {e}")
+            logger.error(f"خطأ في حفظ المستخدم: {e}")
+            return None
+    
+    async def save_user_credentials(self, user_id: int, access_token: str,
+                                    refresh_token: str, token_expiry: datetime) -> Optional[UserSnapshot]:
+        """حفظ بيانات المصادقة"""
+        return await self.create_or_update_user({
+            'user_id': user_id,
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'token_expiry': token_expiry
+        })
+    
+    async def update_user_channel(self, user_id: int, channel_id: str, channel_name: str) -> bool:
+        """تحديث قناة المستخدم المختارة"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(select(User).where(User.user_id == user_id))
+                user = result.scalars().first()
+                
+                if user:
+                    user.selected_channel_id = channel_id
+                    user.selected_channel_name = channel_name
+                    user.updated_at = datetime.utcnow()
+                    await session.commit()
+                    self.user_cache.invalidate(user_id)
+                    return True
+                
+                return False
+                
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في تحديث القناة: {e}")
+            return False
+    
+    # ===== عمليات سجل الرفع =====
+    
+    async def log_upload(self, upload_data: Dict) -> bool:
+        """تسجيل عملية رفع"""
+        try:
+            upload_data = _prepare_upload_data(upload_data)
+            async with self.get_session() as session:
+                # إنشاء العدادات من السجل السابق قبل إضافة السجل الجديد إليها
+                await self._seed_upload_stats(session, [upload_data['user_id']])
+                session.add(UploadLog(**upload_data))
+                # تحديث العدادات في نفس المعاملة
+                await session.execute(_upload_stats_upsert(
+                    self.engine.dialect.name, _upload_stats_deltas([upload_data])
+                ))
+                await session.commit()
+                return True
+                
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في تسجيل الرفع: {e}")
+            return False
+    
+    async def log_uploads(self, records: List[Dict]) -> bool:
+        """تسجيل دفعة من عمليات الرفع في معاملة واحدة"""
+        if not records:
+            return True
+        try:
+            records = [_prepare_upload_data(record) for record in records]
+            async with self.get_session() as session:
+                await self._seed_upload_stats(session, [record['user_id'] for record in records])
+                await session.execute(_upload_logs_insert(records))
+                await session.execute(_upload_stats_upsert(
+                    self.engine.dialect.name, _upload_stats_deltas(records)
+                ))
+                await session.commit()
+                return True
+                
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في تسجيل دفعة الرفع ({len(records)} سجل): {e}")
+            return False
+    
+    async def _seed_upload_stats(self, session: AsyncSession, user_ids: List[int]):
+        """إنشاء صفوف العدادات الناقصة من سجل الرفع الحالي داخل معاملة التسجيل"""
+        existing = set((await session.execute(_upload_stats_existing(user_ids))).scalars())
+        for user_id in set(user_ids) - existing:
+            stats = (await session.execute(_upload_stats_aggregate(user_id))).one()
+            if stats.total_uploads:
+                await session.execute(_upload_stats_seed(self.engine.dialect.name, user_id, stats))
+    
+    async def get_user_uploads(self, user_id: int, limit: int = 10,
+                               before: Optional[Tuple[datetime, int]] = None,
+                               after: Optional[Tuple[datetime, int]] = None) -> List[UploadLog]:
+        """جلب صفحة من سجل رفع المستخدم (الأحدث أولاً)"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(_user_uploads_page(user_id, limit, before, after))
+                uploads = list(result.scalars().all())
+                return uploads[::-1] if after is not None else uploads
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في جلب سجل الرفع: {e}")
+            return []
+    
+    async def stream_user_uploads(self, user_id: int, batch_size: int = 500) -> AsyncIterator:
+        """بث كامل سجل رفع المستخدم بمؤشر على الخادم دون تحميله في الذاكرة"""
+        columns = [getattr(UploadLog, name) for name in UPLOAD_EXPORT_COLUMNS]
+        query = select(*columns)\
+            .where(UploadLog.user_id == user_id)\
+            .order_by(UploadLog.upload_time.desc(), UploadLog.id.desc())\
+            .execution_options(yield_per=batch_size)
+        
+        async with self.get_session() as session:
+            result = await session.stream(query)
+            async for row in result:
+                yield row
+    
+    async def get_expired_upload_logs(self, cutoff: datetime, after_id: int = 0, limit: int = 1000,
+                                      partition: Optional[str] = None) -> Optional[List[Dict]]:
+        """دفعة من سجلات الرفع الأقدم من cutoff (للأرشفة والحذف)، None عند الخطأ
+
+        partition يحصر البحث في قسم واحد من upload_logs المقسّم.
+        """
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    _expired_logs_batch(cutoff, after_id, limit, partition=partition)
+                )
+                return [dict(row._mapping) for row in result]
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في جلب السجلات القديمة: {e}")
+            return None
+    
+    async def delete_upload_logs_range(self, cutoff: datetime, first_id: int, last_id: int,
+                                       partition: Optional[str] = None) -> int:
+        """حذف السجلات القديمة ضمن نطاق من المفاتيح الأساسية في معاملة قصيرة"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    _upload_logs_range_delete(cutoff, first_id, last_id, partition)
+                )
+                await session.commit()
+                return result.rowcount
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في حذف السجلات القديمة: {e}")
+            return 0
+    
+    # ===== جلسات الرفع =====
+    
+    async def has_upload_session(self, session_key: str) -> bool:
+        """هل توجد جلسة رفع محفوظة يمكن استئنافها"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    select(UploadSession.session_key).where(UploadSession.session_key == session_key)
+                )
+                return result.first() is not None
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في جلب جلسة الرفع {session_key}: {e}")
+            return False
+    
+    async def delete_stale_upload_sessions(self, cutoff: datetime) -> int:
+        """حذف جلسات الرفع التي لم تتقدم منذ cutoff (رفع متروك أو فاشل)"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    delete(UploadSession).where(UploadSession.updated_at < cutoff)
+                )
+                await session.commit()
+                return result.rowcount
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في حذف جلسات الرفع القديمة: {e}")
+            return 0
+    
+    # ===== حالة المحادثة =====
+    
+    async def get_conversation_state(self, state_key: str) -> Optional[str]:
+        """جلب حالة المحادثة المخزنة ما لم تنتهِ صلاحيتها"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    select(ConversationState.value).where(
+                        ConversationState.state_key == state_key,
+                        ConversationState.expires_at > datetime.utcnow()
+                    )
+                )
+                return result.scalar_one_or_none()
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في جلب حالة المحادثة: {e}")
+            return None
+    
+    async def set_conversation_state(self, state_key: str, value: str, expires_at: datetime) -> bool:
+        """حفظ حالة المحادثة مع وقت انتهاء صلاحيتها"""
+        try:
+            async with self.get_session() as session:
+                await session.execute(_conversation_state_upsert(
+                    self.engine.dialect.name, state_key, value, expires_at
+                ))
+                await session.commit()
+                return True
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في حفظ حالة المحادثة: {e}")
+            return False
+    
+    async def delete_conversation_state(self, state_key: str) -> bool:
+        """حذف حالة المحادثة"""
+        try:
+            async with self.get_session() as session:
+                await session.execute(
+                    delete(ConversationState).where(ConversationState.state_key == state_key)
+                )
+                await session.commit()
+                return True
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في حذف حالة المحادثة: {e}")
+            return False
+    
+    async def delete_expired_conversation_states(self) -> int:
+        """حذف حالات المحادثة المنتهية"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    delete(ConversationState).where(ConversationState.expires_at <= datetime.utcnow())
+                )
+                await session.commit()
+                return result.rowcount
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في حذف حالات المحادثة المنتهية: {e}")
+            return 0
+    
+    # ===== طابور الرفع الدائم =====
+    
+    async def enqueue_upload_job(self, user_id: int, payload: str) -> Optional[int]:
+        """إضافة مهمة رفع إلى الطابور وإرجاع معرفها"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    insert(UploadJobRecord)
+                    .values(user_id=user_id, payload=payload, status='queued', attempts=0,
+                            created_at=datetime.utcnow())
+                    .returning(UploadJobRecord.id)
+                )
+                job_id = result.scalar_one()
+                await session.commit()
+                return job_id
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في إضافة مهمة الرفع: {e}")
+            return None
+    
+    async def count_upload_jobs_ahead(self, job_id: int) -> int:
+        """عدد المهام المنتظرة قبل المهمة"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    select(func.count()).select_from(UploadJobRecord)
+                    .where(UploadJobRecord.status == 'queued', UploadJobRecord.id < job_id)
+                )
+                return result.scalar_one()
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في حساب ترتيب مهمة الرفع: {e}")
+            return 0
+    
+    async def claim_upload_job(self, worker_id: str, lease_seconds: int,
+                               max_attempts: int) -> Optional[Dict]:
+        """سحب مهمة متاحة وتسجيل عقد العامل عليها"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(_upload_job_claim(worker_id, lease_seconds, max_attempts))
+                row = result.first()
+                await session.commit()
+                return dict(row._mapping) if row is not None else None
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في سحب مهمة رفع: {e}")
+            return None
+    
+    async def get_upload_job(self, job_id: int) -> Optional[Dict]:
+        """حالة مهمة الرفع، None إذا لم توجد أو عند الخطأ"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    select(*UploadJobRecord.__table__.columns).where(UploadJobRecord.id == job_id)
+                )
+                row = result.first()
+                return dict(row._mapping) if row else None
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في جلب مهمة الرفع {job_id}: {e}")
+            return None
+    
+    async def renew_upload_job_lease(self, job_id: int, worker_id: str, lease_seconds: int,
+                                     status: Optional[str] = None) -> bool:
+        """تجديد عقد المهمة (وتحديث حالتها)، False إذا لم يعد العامل مالكها"""
+        now = datetime.utcnow()
+        values = {
+            'lease_expires_at': now + timedelta(seconds=lease_seconds),
+            'heartbeat_at': now,
+            'updated_at': now
+        }
+        if status is not None:
+            values['status'] = status
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    update(UploadJobRecord)
+                    .where(
+                        UploadJobRecord.id == job_id,
+                        UploadJobRecord.lease_owner == worker_id,
+                        UploadJobRecord.status.in_(UPLOAD_JOB_LEASED)
+                    )
+                    .values(**values)
+                )
+                await session.commit()
+                return result.rowcount == 1
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في تجديد عقد مهمة الرفع {job_id}: {e}")
+            return False
+    
+    async def finish_upload_job(self, job_id: int, worker_id: str, status: str,
+                                video_id: Optional[str] = None,
+                                error_message: Optional[str] = None) -> bool:
+        """إنهاء عقد المهمة: done أو failed، أو queued لإعادة المحاولة لاحقاً"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    update(UploadJobRecord)
+                    .where(UploadJobRecord.id == job_id, UploadJobRecord.lease_owner == worker_id)
+                    .values(
+                        status=status,
+                        video_id=video_id,
+                        error_message=error_message,
+                        lease_owner=None,
+                        lease_expires_at=None,
+                        updated_at=datetime.utcnow()
+                    )
+                )
+                await session.commit()
+                return result.rowcount == 1
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في إنهاء مهمة الرفع {job_id}: {e}")
+            return False
+    
+    async def release_upload_job(self, job_id: int, worker_id: str) -> bool:
+        """إعادة مهمة مسحوبة إلى الطابور دون احتساب محاولة (مثلاً لانتظار الحصة)"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    update(UploadJobRecord)
+                    .where(UploadJobRecord.id == job_id, UploadJobRecord.lease_owner == worker_id)
+                    .values(
+                        status='queued',
+                        attempts=UploadJobRecord.attempts - 1,
+                        lease_owner=None,
+                        lease_expires_at=None,
+                        updated_at=datetime.utcnow()
+                    )
+                )
+                await session.commit()
+                return result.rowcount == 1
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في إعادة مهمة الرفع {job_id} إلى الطابور: {e}")
+            return False
+    
+    async def fail_abandoned_upload_jobs(self, max_attempts: int) -> int:
+        """إفشال المهام التي انتهى عقدها بعد استنفاد المحاولات"""
+        now = datetime.utcnow()
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    update(UploadJobRecord)
+                    .where(
+                        UploadJobRecord.status.in_(UPLOAD_JOB_LEASED),
+                        UploadJobRecord.lease_expires_at < now,
+                        UploadJobRecord.attempts >= max_attempts
+                    )
+                    .values(
+                        status='failed',
+                        error_message='انتهى عقد العامل بعد استنفاد المحاولات',
+                        lease_owner=None,
+                        lease_expires_at=None,
+                        updated_at=now
+                    )
+                )
+                await session.commit()
+                return result.rowcount
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في إفشال مهام الرفع المتروكة: {e}")
+            return 0
+    
+    # ===== حصة YouTube Data API =====
+    
+    async def reserve_quota(self, client_id: str, quota_day: date, units: int,
+                            daily_limit: int) -> Optional[bool]:
+        """حجز وحدات من حصة اليوم: True عند القبول، False إذا تجاوز الحد، None عند الخطأ"""
+        if units > daily_limit:
+            return False
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(_quota_reserve(
+                    self.engine.dialect.name, client_id, quota_day, units, daily_limit
+                ))
+                reserved = result.first() is not None
+                await session.commit()
+                return reserved
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في حجز حصة YouTube: {e}")
+            return None
+    
+    async def refund_quota(self, client_id: str, quota_day: date, units: int) -> bool:
+        """إعادة وحدات محجوزة لم تُستخدم"""
+        try:
+            async with self.get_session() as session:
+                await session.execute(
+                    update(YouTubeQuotaUsage)
+                    .where(YouTubeQuotaUsage.client_id == client_id, YouTubeQuotaUsage.quota_day == quota_day)
+                    .values(
+                        units_used=case(
+                            (YouTubeQuotaUsage.units_used > units, YouTubeQuotaUsage.units_used - units),
+                            else_=0
+                        ),
+                        updated_at=datetime.utcnow()
+                    )
+                )
+                await session.commit()
+                return True
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في إعادة حصة YouTube: {e}")
+            return False
+    
+    async def exhaust_quota(self, client_id: str, quota_day: date, daily_limit: int) -> bool:
+        """ضبط استهلاك اليوم على الحد الأقصى"""
+        stmt = _dialect_insert(self.engine.dialect.name)(YouTubeQuotaUsage).values(
+            client_id=client_id, quota_day=quota_day, units_used=daily_limit, updated_at=datetime.utcnow()
+        )
+        try:
+            async with self.get_session() as session:
+                await session.execute(stmt.on_conflict_do_update(
+                    index_elements=[YouTubeQuotaUsage.client_id, YouTubeQuotaUsage.quota_day],
+                    set_={'units_used': stmt.excluded.units_used, 'updated_at': stmt.excluded.updated_at}
+                ))
+                await session.commit()
+                return True
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في تسجيل نفاد حصة YouTube: {e}")
+            return False
+    
+    async def get_quota_usage(self, client_id: str, quota_day: date) -> Optional[int]:
+        """الوحدات المستهلكة في اليوم، أو None عند الخطأ"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    select(YouTubeQuotaUsage.units_used)
+                    .where(YouTubeQuotaUsage.client_id == client_id, YouTubeQuotaUsage.quota_day == quota_day)
+                )
+                return result.scalar_one_or_none() or 0
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في جلب استهلاك حصة YouTube: {e}")
+            return None
+    
+    # ===== تحديثات تلقرام المستلمة =====
+    
+    async def mark_update_received(self, update_id: int) -> Optional[bool]:
+        """تسجيل معرف التحديث: True إذا كان جديداً، False إذا سُجل من قبل، None عند الخطأ"""
+        try:
+            async with self.get_session() as session:
+                stmt = _dialect_insert(self.engine.dialect.name)(ProcessedUpdate)\
+                    .values(update_id=update_id, received_at=datetime.utcnow())\
+                    .on_conflict_do_nothing(index_elements=[ProcessedUpdate.update_id])\
+                    .returning(ProcessedUpdate.update_id)
+                result = await session.execute(stmt)
+                inserted = result.first() is not None
+                await session.commit()
+                return inserted
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في تسجيل التحديث {update_id}: {e}")
+            return None
+    
+    async def forget_update(self, update_id: int) -> bool:
+        """حذف معرف التحديث ليُقبل عند إعادة إرساله"""
+        try:
+            async with self.get_session() as session:
+                await session.execute(
+                    delete(ProcessedUpdate).where(ProcessedUpdate.update_id == update_id)
+                )
+                await session.commit()
+                return True
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في حذف التحديث {update_id}: {e}")
+            return False
+    
+    async def delete_processed_updates_before(self, cutoff: datetime) -> int:
+        """حذف معرفات التحديثات الأقدم من cutoff"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(
+                    delete(ProcessedUpdate).where(ProcessedUpdate.received_at < cutoff)
+                )
+                await session.commit()
+                return result.rowcount
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في حذف التحديثات القديمة: {e}")
             return 0
+    
+    # ===== أقسام سجل الرفع (PostgreSQL) =====
+    
+    async def upload_logs_partitioned(self) -> bool:
+        """هل جدول upload_logs مقسّم حسب الشهر"""
+        if self.engine.dialect.name != 'postgresql':
+            return False
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(text(
+                    "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                    "WHERE c.relname = 'upload_logs'"
+                ))
+                return result.first() is not None
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في فحص تقسيم سجل الرفع: {e}")
+            return False
+    
+    async def get_upload_log_partitions(self) -> List[Tuple[str, datetime, datetime]]:
+        """الأقسام الشهرية الحالية مع حدودها، مرتبة من الأقدم"""
+        try:
+            async with self.get_session() as session:
+                result = await session.execute(text(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "JOIN pg_class p ON p.oid = i.inhparent "
+                    "WHERE p.relname = 'upload_logs'"
+                ))
+                partitions = []
+                for name in result.scalars():
+                    bounds = _upload_log_partition_bounds(name)
+                    if bounds is not None:
+                        partitions.append((name, *bounds))
+                return sorted(partitions, key=lambda partition: partition[1])
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في جلب أقسام سجل الرفع: {e}")
+            return []
+    
+    async def create_upload_log_partitions(self, months_ahead: int = 2) -> int:
+        """إنشاء أقسام الشهر الحالي والأشهر القادمة إن لم تكن موجودة"""
+        month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        created = 0
+        for _ in range(months_ahead + 1):
+            upper = _next_month(month)
+            try:
+                async with self.get_session() as session:
+                    await session.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS {UPLOAD_LOG_PARTITION_PREFIX}{month:%Y%m} "
+                        f"PARTITION OF upload_logs FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+                    ))
+                    await session.commit()
+                    created += 1
+            except SQLAlchemyError as e:
+                # مثلاً إذا احتوى القسم الافتراضي على سجلات من هذا الشهر
+                logger.error(f"خطأ في إنشاء قسم سجل الرفع {month:%Y-%m}: {e}")
+            month = upper
+        return created
+    
+    async def drop_upload_log_partition(self, name: str) -> bool:
+        """فصل قسم شهري وحذفه، وهي عملية على البيانات الوصفية دون حذف صف بصف"""
+        if _upload_log_partition_bounds(name) is None:
+            raise ValueError(f"اسم قسم غير صالح: {name}")
+        try:
+            async with self.get_session() as session:
+                await session.execute(text(f"ALTER TABLE upload_logs DETACH PARTITION {name}"))
+                await session.execute(text(f"DROP TABLE {name}"))
+                await session.commit()
+                return True
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في حذف قسم سجل الرفع {name}: {e}")
+            return False
+    
+    async def get_upload_stats(self, user_id: int) -> Dict:
+        """إحصائيات الرفع للمستخدم"""
+        try:
+            async with self.get_session() as session:
+                stats = await session.get(UserUploadStats, user_id)
+                if stats is None:
+                    # مستخدم سجله أقدم من جدول العدادات: احسبه مرة واحدة واحفظه
+                    stats = (await session.execute(_upload_stats_aggregate(user_id))).one()
+                    if stats.total_uploads:
+                        await session.execute(_upload_stats_seed(self.engine.dialect.name, user_id, stats))
+                        await session.commit()
+                
+                return _stats_to_dict(stats)
+                
+        except SQLAlchemyError as e:
+            logger.error(f"خطأ في جلب الإحصائيات: {e}")
+            return _stats_to_dict(None)
 
-# إنشاء مثيل مدير قاعدة البيانات
-def create_database_manager() -> Optional[DatabaseManager]:
-    """إنشاء مدير قاعدة البيانات"""
+def create_async_database_manager(user_cache: Optional[UserCache] = None) -> Optional[AsyncDatabaseManager]:
+    """إنشاء مدير قاعدة البيانات غير المتزامن"""
     database_url = os.getenv('DATABASE_URL')
     
     if not database_url:
         logger.error("❌ DATABASE_URL غير موجود في متغيرات البيئة")
         return None
     
-    db_manager = DatabaseManager(database_url)
+    db_manager = AsyncDatabaseManager(database_url, user_cache)
     
     if db_manager.connect():
         return db_manager
@@ -23,6 +23,7 @@ def validate_env():
         'REDIRECT_URI': 'عنوان إعادة التوجيه',
         'NORTHFLANK_API_TOKEN': 'توكن Northflank API',
         'YOUTUBE_REFRESH_TOKEN': 'توكن تحديث OAuth ليوتيوب (للتخطي بدون رابط المصادقة)',
+        'YOUTUBE_CREDENTIALS': 'مجمع بيانات مصادقة YouTube بصيغة JSON (لتوزيع الرفع على عدة مشاريع)',
         'YOUTUBE_CHANNEL_ID': 'معرف القناة الافتراضية للرفع',
         'YOUTUBE_CHANNEL_NAME': 'اسم القناة الافتراضية (اختياري)'
     }
@@ -0,0 +1,135 @@
+"""
+حذف سجلات الرفع القديمة على دفعات مع أرشفتها اختيارياً
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from database import UPLOAD_LOG_DEFAULT_PARTITION
+
+logger = logging.getLogger(__name__)
+
+
+class LogRetention:
+    """مهمة دورية تحذف سجلات upload_logs الأقدم من retention_days
+
+    يتم الحذف بنطاقات محدودة من المفتاح الأساسي (batch_size صف) في معاملات قصيرة
+    مع استراحة pause ثانية بين الدفعات، فلا تُحجز الأقفال طويلاً ولا تتولد دفعة WAL
+    ضخمة. إذا حُدد archive_path تُكتب السجلات أولاً إلى ملف JSON Lines مضغوط بـ gzip.
+
+    إذا كان الجدول مقسّماً حسب الشهر (PostgreSQL) يُحذف كل قسم انتهت مدته كاملاً بدلاً
+    من حذف صفوفه، وتُحذف السجلات القديمة في القسم الافتراضي على دفعات. إنشاء أقسام
+    الأشهر القادمة مهمة منفصلة (partitions_job) تعمل حتى مع تعطيل الحذف.
+    """
+
+    def __init__(self, adb, retention_days: int, batch_size: int = 1000,
+                 pause: float = 0.2, archive_path: Optional[str] = None,
+                 partitions_ahead: int = 2):
+        self.adb = adb
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.archive_path = archive_path
+        self.partitions_ahead = partitions_ahead
+        self._archive = None
+
+    async def run(self):
+        """تنفيذ دورة تنظيف كاملة"""
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        try:
+            if await self.adb.upload_logs_partitioned():
+                if await self._drop_partitions(cutoff):
+                    await self._delete_batches(cutoff, UPLOAD_LOG_DEFAULT_PARTITION)
+            else:
+                await self._delete_batches(cutoff)
+        except Exception as e:
+            logger.error(f"❌ خطأ في تنظيف سجلات الرفع القديمة: {e}")
+        finally:
+            if self._archive is not None:
+                await asyncio.to_thread(self._archive.close)
+                self._archive = None
+
+    async def run_job(self, context=None):
+        """نقطة الدخول من JobQueue الخاص بالبوت"""
+        await self.run()
+
+    async def create_partitions(self) -> int:
+        """إنشاء أقسام الشهر الحالي وpartitions_ahead شهراً قادماً إذا كان الجدول مقسّماً"""
+        try:
+            if await self.adb.upload_logs_partitioned():
+                return await self.adb.create_upload_log_partitions(self.partitions_ahead)
+        except Exception as e:
+            logger.error(f"❌ خطأ في إنشاء أقسام سجل الرفع: {e}")
+        return 0
+
+    async def partitions_job(self, context=None):
+        """نقطة دخول إنشاء الأقسام من JobQueue الخاص بالبوت"""
+        await self.create_partitions()
+
+    async def _delete_batches(self, cutoff: datetime, partition: Optional[str] = None):
+        deleted = 0
+        after_id = 0
+        while True:
+            rows = await self.adb.get_expired_upload_logs(cutoff, after_id, self.batch_size, partition)
+            if not rows:
+                break
+            # الأرشفة قبل الحذف؛ فشل الكتابة يوقف الدورة دون حذف
+            await self._archive_rows(rows)
+            
+            count = await self.adb.delete_upload_logs_range(
+                cutoff, rows[0]['id'], rows[-1]['id'], partition
+            )
+            if not count:
+                break
+            deleted += count
+            after_id = rows[-1]['id']
+            await asyncio.sleep(self.pause)
+        
+        if deleted:
+            logger.info(f"🧹 تم حذف {deleted} سجل رفع أقدم من {self.retention_days} يوم")
+
+    async def _drop_partitions(self, cutoff: datetime) -> bool:
+        """حذف الأقسام المنتهية، False إذا توقفت الدورة لتعذر الأرشفة"""
+        for name, start, end in await self.adb.get_upload_log_partitions():
+            # القسم يُحذف فقط عندما تنتهي مدة آخر سجل فيه
+            if end > cutoff:
+                break
+            if self.archive_path and not await self._archive_partition(name, end):
+                logger.error(f"❌ تعذرت أرشفة القسم {name}، لن يُحذف")
+                return False
+            if await self.adb.drop_upload_log_partition(name):
+                logger.info(f"🧹 تم حذف قسم سجل الرفع {name} ({start:%Y-%m})")
+        return True
+
+    async def _archive_partition(self, name: str, end: datetime) -> bool:
+        """أرشفة سجلات القسم على دفعات قبل حذفه"""
+        after_id = 0
+        while True:
+            rows = await self.adb.get_expired_upload_logs(end, after_id, self.batch_size, name)
+            if rows is None:
+                return False
+            if not rows:
+                return True
+            await self._archive_rows(rows)
+            after_id = rows[-1]['id']
+
+    async def _archive_rows(self, rows: List[Dict]):
+        if not self.archive_path:
+            return
+        if self._archive is None:
+            self._archive = await asyncio.to_thread(self._open_archive)
+        await asyncio.to_thread(self._write_archive, self._archive, rows)
+
+    def _open_archive(self):
+        os.makedirs(self.archive_path, exist_ok=True)
+        name = f"upload_logs_{datetime.utcnow():%Y%m%dT%H%M%S}.jsonl.gz"
+        return gzip.open(os.path.join(self.archive_path, name), 'wt', encoding='utf-8')
+
+    @staticmethod
+    def _write_archive(archive, rows: List[Dict]):
+        for row in rows:
+            archive.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')
+        archive.flush()
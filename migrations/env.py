@@ -0,0 +1,57 @@
+"""
+بيئة ترحيلات Alembic
+"""
+import os
+from logging.config import fileConfig
+from alembic import context
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, pool
+from database import Base
+
+# تحميل متغيرات البيئة
+load_dotenv()
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def get_database_url() -> str:
+    """رابط قاعدة البيانات من متغيرات البيئة"""
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise RuntimeError("❌ DATABASE_URL غير موجود في متغيرات البيئة")
+    return database_url
+
+
+def run_migrations_offline() -> None:
+    """توليد SQL الترحيلات دون الاتصال بقاعدة البيانات"""
+    context.configure(
+        url=get_database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """تنفيذ الترحيلات على قاعدة البيانات مباشرة"""
+    connectable = create_engine(get_database_url(), poolclass=pool.NullPool)
+
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,108 @@
+"""المخطط الأساسي للجداول
+
+ينشئ الجداول غير الموجودة فقط، لأن قواعد البيانات الحالية أنشأتها
+Base.metadata.create_all عند تشغيل البوت.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('users'):
+        op.create_table(
+            'users',
+            sa.Column('user_id', sa.Integer(), primary_key=True),
+            sa.Column('username', sa.String(255)),
+            sa.Column('first_name', sa.String(255)),
+            sa.Column('last_name', sa.String(255)),
+            sa.Column('access_token', sa.Text()),
+            sa.Column('refresh_token', sa.Text()),
+            sa.Column('token_expiry', sa.DateTime()),
+            sa.Column('selected_channel_id', sa.String(255)),
+            sa.Column('selected_channel_name', sa.String(255)),
+            sa.Column('is_active', sa.Boolean()),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('updated_at', sa.DateTime()),
+        )
+
+    if not inspector.has_table('upload_logs'):
+        op.create_table(
+            'upload_logs',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('video_title', sa.String(500)),
+            sa.Column('video_description', sa.Text()),
+            sa.Column('video_id', sa.String(255)),
+            sa.Column('video_url', sa.String(500)),
+            sa.Column('file_size', sa.Integer()),
+            sa.Column('duration', sa.Integer()),
+            sa.Column('privacy_status', sa.String(50)),
+            sa.Column('upload_status', sa.String(100)),
+            sa.Column('error_message', sa.Text()),
+            sa.Column('channel_id', sa.String(255)),
+            sa.Column('channel_name', sa.String(255)),
+            sa.Column('upload_time', sa.DateTime()),
+        )
+
+    if not inspector.has_table('upload_sessions'):
+        op.create_table(
+            'upload_sessions',
+            sa.Column('session_key', sa.String(255), primary_key=True),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('file_path', sa.String(500)),
+            sa.Column('resumable_uri', sa.Text(), nullable=False),
+            sa.Column('bytes_committed', sa.BigInteger()),
+            sa.Column('total_bytes', sa.BigInteger()),
+            sa.Column('request_body', sa.Text()),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('updated_at', sa.DateTime()),
+        )
+
+    if not inspector.has_table('user_upload_stats'):
+        op.create_table(
+            'user_upload_stats',
+            sa.Column('user_id', sa.Integer(), primary_key=True),
+            sa.Column('total_uploads', sa.Integer(), nullable=False),
+            sa.Column('successful_uploads', sa.Integer(), nullable=False),
+            sa.Column('failed_uploads', sa.Integer(), nullable=False),
+            sa.Column('bytes_uploaded', sa.BigInteger(), nullable=False),
+            sa.Column('last_upload_time', sa.DateTime()),
+        )
+
+    # تعبئة العدادات من سجل الرفع للمستخدمين الذين ليس لديهم صف بعد
+    op.execute("""
+        INSERT INTO user_upload_stats
+            (user_id, total_uploads, successful_uploads, failed_uploads, bytes_uploaded, last_upload_time)
+        SELECT user_id,
+               COUNT(*),
+               SUM(CASE WHEN upload_status = 'success' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN upload_status LIKE 'error%' THEN 1 ELSE 0 END),
+               COALESCE(SUM(CASE WHEN upload_status = 'success' THEN file_size ELSE 0 END), 0),
+               MAX(upload_time)
+        FROM upload_logs
+        WHERE user_id NOT IN (SELECT user_id FROM user_upload_stats)
+        GROUP BY user_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('user_upload_stats')
+    op.drop_table('upload_sessions')
+    op.drop_table('upload_logs')
+    op.drop_table('users')
@@ -0,0 +1,50 @@
+"""فهارس جدول upload_logs
+
+- (user_id, upload_time DESC): سجل رفع المستخدم مرتباً بالأحدث
+- (user_id, upload_status): الإحصائيات حسب حالة الرفع
+- (upload_time): تنظيف السجلات القديمة
+
+على PostgreSQL تُنشأ الفهارس بـ CONCURRENTLY حتى لا يُقفل الجدول أثناء البناء.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_upload_logs_user_id_upload_time', ['user_id', sa.text('upload_time DESC')]),
+    ('ix_upload_logs_user_id_upload_status', ['user_id', 'upload_status']),
+    ('ix_upload_logs_upload_time', ['upload_time']),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(
+                name, 'upload_logs', columns,
+                if_not_exists=True,
+                postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in INDEXES:
+            op.drop_index(
+                name, table_name='upload_logs',
+                if_exists=True,
+                postgresql_concurrently=True
+            )
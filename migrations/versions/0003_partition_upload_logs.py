@@ -0,0 +1,117 @@
+"""تقسيم upload_logs إلى أقسام شهرية على upload_time (PostgreSQL فقط)
+
+اختياري: يُنفَّذ فقط عند UPLOAD_LOGS_PARTITIONED=true أثناء تشغيل الترحيل، وإلا
+لا يفعل شيئاً. يُعاد إنشاء الجدول مقسّماً وتُنسخ السجلات إليه داخل معاملة واحدة
+مع قفل الكتابة على الجدول القديم. المفتاح الأساسي يصبح (id, upload_time) لأن
+PostgreSQL يشترط وجود مفتاح التقسيم فيه، ويبقى نموذج UploadLog كما هو.
+
+لا يُعاد تنفيذه على قاعدة تجاوزته، ولا تستخدم alembic downgrade 0002 لتفعيله لاحقاً
+لأنه يتراجع أيضاً عن الترحيلات التالية (ويحذف جداولها وأعمدتها). للتفعيل على قاعدة
+مُرحّلة نفّذ خطوات upgrade() يدوياً في نافذة صيانة.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:02
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from config import Config
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_upload_logs_user_id_upload_time', 'user_id, upload_time DESC'),
+    ('ix_upload_logs_user_id_upload_status', 'user_id, upload_status'),
+    ('ix_upload_logs_upload_time', 'upload_time'),
+]
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _is_partitioned(bind) -> bool:
+    return bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'upload_logs'"
+    )).first() is not None
+
+
+def _create_indexes() -> None:
+    for name, columns in INDEXES:
+        op.execute(f"CREATE INDEX {name} ON upload_logs ({columns})")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or not Config.UPLOAD_LOGS_PARTITIONED:
+        return
+    if _is_partitioned(bind):
+        return
+
+    # منع الكتابة أثناء النسخ حتى لا تضيع سجلات
+    op.execute("LOCK TABLE upload_logs IN EXCLUSIVE MODE")
+    op.execute("ALTER TABLE upload_logs RENAME TO upload_logs_legacy")
+    # التسلسل مملوك للجدول القديم وسيُحذف معه
+    op.execute("ALTER SEQUENCE upload_logs_id_seq OWNED BY NONE")
+
+    op.execute(
+        "CREATE TABLE upload_logs (LIKE upload_logs_legacy INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (upload_time)"
+    )
+    op.execute("ALTER TABLE upload_logs ALTER COLUMN upload_time SET NOT NULL")
+    op.execute("ALTER SEQUENCE upload_logs_id_seq OWNED BY upload_logs.id")
+    # يلتقط أي سجل خارج الأقسام الشهرية الموجودة
+    op.execute("CREATE TABLE upload_logs_default PARTITION OF upload_logs DEFAULT")
+
+    # قسم لكل شهر من أقدم سجل حتى شهرين بعد الشهر الحالي
+    oldest = bind.execute(sa.text("SELECT min(upload_time) FROM upload_logs_legacy")).scalar()
+    today = datetime.utcnow().date()
+    month = (oldest.date() if oldest else today).replace(day=1)
+    last = _next_month(_next_month(today.replace(day=1)))
+    while month <= last:
+        upper = _next_month(month)
+        op.execute(
+            f"CREATE TABLE upload_logs_p{month:%Y%m} PARTITION OF upload_logs "
+            f"FOR VALUES FROM ('{month}') TO ('{upper}')"
+        )
+        month = upper
+
+    op.execute(
+        "INSERT INTO upload_logs SELECT id, user_id, video_title, video_description, video_id, "
+        "video_url, file_size, duration, privacy_status, upload_status, error_message, "
+        "channel_id, channel_name, COALESCE(upload_time, now() AT TIME ZONE 'utc') "
+        "FROM upload_logs_legacy"
+    )
+    # الأسماء upload_logs_pkey وفهارس ix_upload_logs_* تتحرر بحذف الجدول القديم
+    op.execute("DROP TABLE upload_logs_legacy")
+    op.execute("ALTER TABLE upload_logs ADD PRIMARY KEY (id, upload_time)")
+    _create_indexes()
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or not _is_partitioned(bind):
+        return
+
+    op.execute("LOCK TABLE upload_logs IN EXCLUSIVE MODE")
+    op.execute("ALTER TABLE upload_logs RENAME TO upload_logs_partitioned")
+    op.execute("ALTER SEQUENCE upload_logs_id_seq OWNED BY NONE")
+    op.execute("CREATE TABLE upload_logs (LIKE upload_logs_partitioned INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE upload_logs ALTER COLUMN upload_time DROP NOT NULL")
+    op.execute("ALTER SEQUENCE upload_logs_id_seq OWNED BY upload_logs.id")
+    op.execute("INSERT INTO upload_logs SELECT * FROM upload_logs_partitioned")
+    # حذف الجدول المقسّم يحذف أقسامه وفهارسه
+    op.execute("DROP TABLE upload_logs_partitioned")
+    op.execute("ALTER TABLE upload_logs ADD PRIMARY KEY (id)")
+    _create_indexes()
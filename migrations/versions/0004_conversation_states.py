@@ -0,0 +1,37 @@
+"""جدول conversation_states لحالة المحادثة المشتركة بين العمليات
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:03
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('conversation_states'):
+        return
+
+    op.create_table(
+        'conversation_states',
+        sa.Column('state_key', sa.String(255), primary_key=True),
+        sa.Column('value', sa.Text(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_conversation_states_expires_at', 'conversation_states', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_conversation_states_expires_at', table_name='conversation_states')
+    op.drop_table('conversation_states')
@@ -0,0 +1,36 @@
+"""جدول processed_updates لتجاهل تحديثات تلقرام المكررة بين العمليات
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:04
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('processed_updates'):
+        return
+
+    op.create_table(
+        'processed_updates',
+        sa.Column('update_id', sa.BigInteger(), primary_key=True, autoincrement=False),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_processed_updates_received_at', 'processed_updates', ['received_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_processed_updates_received_at', table_name='processed_updates')
+    op.drop_table('processed_updates')
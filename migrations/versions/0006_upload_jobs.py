@@ -0,0 +1,48 @@
+"""جدول upload_jobs لطابور الرفع الدائم الذي تسحب منه عمليات upload_worker.py
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:05
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('upload_jobs'):
+        return
+
+    op.create_table(
+        'upload_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('lease_owner', sa.String(length=255)),
+        sa.Column('lease_expires_at', sa.DateTime()),
+        sa.Column('heartbeat_at', sa.DateTime()),
+        sa.Column('video_id', sa.String(length=255)),
+        sa.Column('error_message', sa.Text()),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime()),
+    )
+    op.create_index('ix_upload_jobs_user_id', 'upload_jobs', ['user_id'])
+    op.create_index('ix_upload_jobs_status_created_at', 'upload_jobs', ['status', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_upload_jobs_status_created_at', table_name='upload_jobs')
+    op.drop_index('ix_upload_jobs_user_id', table_name='upload_jobs')
+    op.drop_table('upload_jobs')
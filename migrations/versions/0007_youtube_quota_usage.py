@@ -0,0 +1,37 @@
+"""جدول youtube_quota_usage لتسجيل استهلاك حصة YouTube Data API اليومية
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:06
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('youtube_quota_usage'):
+        return
+
+    op.create_table(
+        'youtube_quota_usage',
+        sa.Column('client_id', sa.String(length=255), nullable=False),
+        sa.Column('quota_day', sa.Date(), nullable=False),
+        sa.Column('units_used', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime()),
+        sa.PrimaryKeyConstraint('client_id', 'quota_day'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('youtube_quota_usage')
@@ -0,0 +1,37 @@
+"""عمود attempts في upload_logs لعدد محاولات الإرسال إلى YouTube
+
+السجلات الحالية تأخذ القيمة 1. على PostgreSQL 11+ لا يُعاد كتابة الجدول لأن القيمة
+الافتراضية ثابتة، ويُضاف العمود إلى جميع الأقسام عند تقسيم الجدول.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:07
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if any(column['name'] == 'attempts' for column in inspector.get_columns('upload_logs')):
+        return
+
+    op.add_column(
+        'upload_logs',
+        sa.Column('attempts', sa.Integer(), server_default='1')
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('upload_logs') as batch_op:
+        batch_op.drop_column('attempts')
@@ -0,0 +1,158 @@
+"""
+جدولة طلبات YouTube Data API حسب الحصة اليومية
+"""
+import time
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+# تُصفّر حصة YouTube يومياً عند منتصف الليل بتوقيت المحيط الهادئ
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+
+class TokenBucket:
+    """دلو رموز يمتلئ بمعدل ثابت حتى capacity لتوزيع الاستهلاك على اليوم"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, cost: float) -> float:
+        """الثواني اللازمة حتى يتوفر cost رمزاً (0 إذا كانت متوفرة الآن)"""
+        self._refill()
+        if self._tokens >= cost:
+            return 0.0
+        return (cost - self._tokens) / self.rate
+
+    def take(self, cost: float):
+        self._refill()
+        self._tokens -= cost
+
+    def give_back(self, cost: float):
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + cost)
+
+
+class QuotaScheduler:
+    """قبول طلبات YouTube أو تأجيلها قبل إرسالها حسب الحصة المتبقية
+
+    لكل عميل OAuth رصيد يومي في جدول youtube_quota_usage يُحجز منه ذرياً فتتشارك
+    جميع العمليات والخوادم الحد نفسه، وهو وحده ما يفرض الحد اليومي.
+
+    عند ضبط burst يوزع دلو رموز (داخل العملية) الاستهلاك على اليوم بمعدل daily_limit
+    وحدة في اليوم مع دفعة أولى حتى burst وحدة، ويمتلئ من جديد عند تصفير الحصة.
+    """
+
+    def __init__(self, adb, daily_limit: int, costs: Dict[str, int], burst: Optional[int] = None):
+        self.adb = adb
+        self.daily_limit = daily_limit
+        self.costs = costs
+        # لا يقل الدلو عن تكلفة أغلى طلب وإلا لن يُقبل أبداً
+        self.burst = max(burst, max(costs.values())) if burst else None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._buckets_day: Optional[date] = None
+
+    @staticmethod
+    def quota_day(now: Optional[datetime] = None) -> date:
+        """يوم الحصة الحالي بتوقيت المحيط الهادئ"""
+        now = now or datetime.now(timezone.utc)
+        return now.astimezone(QUOTA_TIMEZONE).date()
+
+    @staticmethod
+    def reset_time(now: Optional[datetime] = None) -> datetime:
+        """وقت تصفير الحصة القادم (بتوقيت UTC)"""
+        now = now or datetime.now(timezone.utc)
+        tomorrow = now.astimezone(QUOTA_TIMEZONE).date() + timedelta(days=1)
+        # الحساب بتوقيت UTC حتى لا تُحسب ساعة تغيير التوقيت الصيفي خطأً
+        return datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=QUOTA_TIMEZONE)\
+            .astimezone(timezone.utc)
+
+    def seconds_until_reset(self) -> float:
+        now = datetime.now(timezone.utc)
+        return (self.reset_time(now) - now).total_seconds()
+
+    def cost(self, operation: str) -> int:
+        return self.costs[operation]
+
+    def _bucket(self, client_id: str) -> Optional[TokenBucket]:
+        """دلو توزيع الاستهلاك للعميل، أو None إذا لم يُضبط burst"""
+        if self.burst is None:
+            return None
+        day = self.quota_day()
+        if day != self._buckets_day:
+            # تصفير الحصة يعيد ملء جميع الدلاء
+            self._buckets.clear()
+            self._buckets_day = day
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, self.daily_limit / 86400)
+            self._buckets[client_id] = bucket
+        return bucket
+
+    async def reserve(self, client_id: str, operation: str) -> float:
+        """حجز تكلفة الطلب: 0 عند القبول، وإلا عدد الثواني قبل المحاولة مجدداً"""
+        cost = self.cost(operation)
+        bucket = self._bucket(client_id)
+        if bucket is not None:
+            wait = bucket.wait_time(cost)
+            if wait > 0:
+                # الدلو يمتلئ عند التصفير إن لم يمتلئ قبله
+                return min(wait, self.seconds_until_reset())
+            # الحجز من الدلو قبل انتظار قاعدة البيانات حتى لا يتجاوزه طلبان متزامنان
+            bucket.take(cost)
+
+        reserved = await self.adb.reserve_quota(client_id, self.quota_day(), cost, self.daily_limit)
+        if reserved is False:
+            if bucket is not None:
+                bucket.give_back(cost)
+            return self.seconds_until_reset()
+        if reserved is None:
+            # عند تعذر الوصول إلى قاعدة البيانات يُقبل الطلب ويبقى YouTube هو الحكم
+            logger.warning(f"⚠️ تعذر تسجيل استهلاك حصة YouTube ({operation})، تم قبول الطلب")
+        return 0.0
+
+    async def acquire(self, client_id: str, operation: str, max_wait: float) -> bool:
+        """انتظار قبول الطلب حتى max_wait ثانية، False إذا كان الانتظار سيتجاوزها"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = await self.reserve(client_id, operation)
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    async def refund(self, client_id: str, operation: str):
+        """إعادة تكلفة طلب محجوز لم يُرسل إلى YouTube"""
+        cost = self.cost(operation)
+        bucket = self._bucket(client_id)
+        if bucket is not None:
+            bucket.give_back(cost)
+        await self.adb.refund_quota(client_id, self.quota_day(), cost)
+
+    async def mark_exhausted(self, client_id: str):
+        """تسجيل حصة اليوم مستنفدة بعد رفض YouTube حتى تتوقف جميع العمليات عن استخدامها"""
+        await self.adb.exhaust_quota(client_id, self.quota_day(), self.daily_limit)
+
+    async def exhausted(self, client_id: str, operation: str) -> bool:
+        """هل رفض رصيد اليوم الطلب (وليس مجرد توزيع الاستهلاك على اليوم)"""
+        remaining = await self.remaining(client_id)
+        return remaining is not None and remaining < self.cost(operation)
+
+    async def remaining(self, client_id: str) -> Optional[int]:
+        """الوحدات المتبقية من حصة اليوم، أو None عند تعذر القراءة"""
+        used = await self.adb.get_quota_usage(client_id, self.quota_day())
+        if used is None:
+            return None
+        return max(self.daily_limit - used, 0)
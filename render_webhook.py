@@ -42,7 +42,7 @@ async def setup_webhook():
         
         # تعيين webhook
         webhook_url = f"{render_url}/webhook"
-        await bot.set_webhook(url=webhook_url)
+        await bot.set_webhook(url=webhook_url, secret_token=os.getenv('WEBHOOK_SECRET'))
         
         # التحقق من إعداد webhook
         webhook_info = await bot.get_webhook_info()
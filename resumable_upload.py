@@ -0,0 +1,140 @@
+"""
+الرفع المجزأ القابل للاستئناف إلى YouTube
+"""
+import json
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaUpload
+from upload_retry import RetryPolicy, RetryState
+
+logger = logging.getLogger(__name__)
+
+# أصغر وحدة يقبلها بروتوكول الرفع القابل للاستئناف
+CHUNK_ALIGNMENT = 256 * 1024
+
+
+class UploadCancelledError(Exception):
+    """أُوقف الرفع قبل إرسال الجزء التالي (مثلاً بعد فقد عامل الرفع عقد المهمة)"""
+
+
+class ChunkedUploader:
+    """رفع الفيديو على أجزاء مع حفظ رابط الجلسة وآخر بايت مؤكد في قاعدة البيانات
+
+    عند إعادة المحاولة أو إعادة تشغيل العملية يُستعلم من خادم YouTube عن الجلسة
+    المحفوظة ويُكمل الرفع من آخر بايت مؤكد بدلاً من البدء من الصفر. الأخطاء المؤقتة
+    (5xx و 429 وانقطاع الاتصال) يُعاد إرسال الجزء بعدها داخل نفس الجلسة حسب retry_policy.
+    """
+
+    def __init__(self, db, chunk_size: int, retry_policy: Optional[RetryPolicy] = None):
+        self.db = db
+        self.retry_policy = retry_policy or RetryPolicy()
+        # تقريب حجم الجزء إلى مضاعفات 256KB كما يشترط البروتوكول
+        self.chunk_size = max(CHUNK_ALIGNMENT, chunk_size - chunk_size % CHUNK_ALIGNMENT)
+
+    def upload(self, youtube, body: Dict, file_path: str, session_key: str, user_id: int,
+               progress_callback: Optional[Callable[[int, int], None]] = None,
+               retry_state: Optional[RetryState] = None,
+               cancel_event: Optional[threading.Event] = None) -> Dict:
+        """رفع ملف إلى YouTube واستئناف الجلسة المحفوظة إن وجدت"""
+        media = MediaFileUpload(
+            file_path,
+            chunksize=self.chunk_size,
+            resumable=True,
+            mimetype='video/mp4'
+        )
+        return self._run(youtube, body, media, session_key, user_id, file_path, progress_callback,
+                         retry_state or RetryState(), cancel_event)
+
+    def upload_stream(self, youtube, body: Dict, media: MediaUpload,
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      retry_state: Optional[RetryState] = None,
+                      cancel_event: Optional[threading.Event] = None) -> Dict:
+        """رفع وسيط متدفق؛ لا تُحفظ جلسته لأن بياناته لا يمكن قراءتها مرة أخرى"""
+        return self._run(youtube, body, media, None, None, None, progress_callback,
+                         retry_state or RetryState(), cancel_event)
+
+    def _run(self, youtube, body: Dict, media: MediaUpload, session_key: Optional[str],
+             user_id: Optional[int], file_path: Optional[str],
+             progress_callback: Optional[Callable[[int, int], None]],
+             retry_state: RetryState, cancel_event: Optional[threading.Event]) -> Dict:
+        """حلقة next_chunk المشتركة، مع حفظ الجلسة عند توفر مفتاح لها
+
+        ضبط cancel_event يوقف الرفع قبل الجزء التالي بـ UploadCancelledError وتبقى الجلسة
+        المحفوظة ليستأنفها من يتولى الرفع بعده.
+        """
+        request_body = json.dumps(body, sort_keys=True, ensure_ascii=False)
+        request = self._new_request(youtube, body, media)
+
+        saved = self.db.get_upload_session(session_key) if session_key else None
+        if saved and saved.request_body == request_body and saved.total_bytes == media.size():
+            logger.info(f"🔁 استئناف جلسة الرفع {session_key} من البايت {saved.bytes_committed}")
+            request.resumable_uri = saved.resumable_uri
+            request.resumable_progress = saved.bytes_committed or 0
+            # يجعل next_chunk يستعلم من الخادم عن آخر بايت مستلم قبل المتابعة
+            request._in_error_state = True
+        elif saved:
+            # تغيرت بيانات الفيديو أو الملف، لا يمكن استئناف الجلسة القديمة
+            self.db.delete_upload_session(session_key)
+
+        committed = request.resumable_progress
+        # الأخطاء المتتالية منذ آخر جزء مؤكد
+        failures = 0
+        response = None
+        while response is None:
+            if cancel_event is not None and cancel_event.is_set():
+                raise UploadCancelledError(f"أُوقف الرفع عند البايت {committed}")
+            try:
+                status, response = request.next_chunk()
+            except Exception as e:
+                if saved and isinstance(e, HttpError) and e.resp.status in (404, 410):
+                    # انتهت صلاحية الجلسة المحفوظة على الخادم، ابدأ جلسة جديدة
+                    logger.warning(f"⚠️ انتهت جلسة الرفع {session_key}، سيبدأ الرفع من جديد")
+                    self.db.delete_upload_session(session_key)
+                    saved = None
+                    request = self._new_request(youtube, body, media)
+                    committed = 0
+                    continue
+                failures += 1
+                if not self.retry_policy.should_retry(e, failures):
+                    raise
+                # next_chunk يستعلم من الخادم عن آخر بايت مستلم ثم يكمل نفس الجلسة
+                delay = self.retry_policy.delay(failures)
+                logger.warning(
+                    f"⚠️ خطأ مؤقت في الرفع ({e!r})، "
+                    f"إعادة المحاولة {failures} بعد {delay:.1f} ثانية"
+                )
+                retry_state.attempts += 1
+                time.sleep(delay)
+                continue
+
+            if response is None and request.resumable_progress != committed:
+                committed = request.resumable_progress
+                failures = 0
+                if session_key:
+                    self.db.save_upload_session({
+                        'session_key': session_key,
+                        'user_id': user_id,
+                        'file_path': file_path,
+                        'resumable_uri': request.resumable_uri,
+                        'bytes_committed': committed,
+                        'total_bytes': media.size(),
+                        'request_body': request_body
+                    })
+                if progress_callback:
+                    progress_callback(committed, media.size())
+
+        if session_key:
+            self.db.delete_upload_session(session_key)
+        return response
+
+    @staticmethod
+    def _new_request(youtube, body: Dict, media: MediaUpload):
+        """إنشاء طلب videos.insert جديد"""
+        return youtube.videos().insert(
+            part=','.join(body.keys()),
+            body=body,
+            media_body=media
+        )
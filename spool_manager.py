@@ -0,0 +1,113 @@
+"""
+إدارة مساحة مجلد التحميل المؤقت للفيديوهات
+"""
+import logging
+import os
+import shutil
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SpoolFullError(Exception):
+    """لا توجد مساحة كافية لتحميل الفيديو"""
+
+
+class SpoolManager:
+    """حجز المساحة قبل تحميل أي فيديو إلى مجلد التحميل
+
+    - حجم الفيديو لا يتجاوز max_file_size.
+    - مجموع الحجوزات لا يتجاوز budget بايت، ولكل مستخدم user_quota بايت.
+    - تبقى على القرص مساحة حرة لا تقل عن min_free بعد التحميل.
+
+    الحجز مرتبط بمسار الملف ويُحرر عند حذفه. جميع الاستدعاءات من حلقة الأحداث.
+    """
+
+    def __init__(self, path: str, budget: int, user_quota: int,
+                 max_file_size: int, min_free: int = 0):
+        self.path = path
+        self.budget = budget
+        self.user_quota = user_quota
+        self.max_file_size = max_file_size
+        self.min_free = min_free
+        # file_path -> (user_id, bytes)
+        self._reservations: Dict[str, tuple] = {}
+        self._reserved = 0
+        self._user_reserved: Dict[int, int] = {}
+
+    def check_size(self, size: Optional[int]):
+        """رفض الفيديو الأكبر من الحد المسموح قبل أي تحميل"""
+        if size and size > self.max_file_size:
+            raise SpoolFullError(
+                f"حجم الفيديو ({size / 1024 / 1024:.0f}MB) يتجاوز الحد المسموح "
+                f"({self.max_file_size / 1024 / 1024:.0f}MB)"
+            )
+
+    def reserve(self, user_id: int, file_path: str, size: Optional[int]):
+        """حجز مساحة الملف أو رفعه SpoolFullError مع سبب الرفض"""
+        # الحجم غير المعروف يُحجز بأقصى حجم مسموح
+        size = size or self.max_file_size
+        self.check_size(size)
+        if file_path in self._reservations:
+            self.release(file_path)
+        
+        if self._user_reserved.get(user_id, 0) + size > self.user_quota:
+            raise SpoolFullError("لديك فيديوهات أخرى قيد المعالجة، انتظر اكتمال رفعها ثم أعد المحاولة")
+        if self._reserved + size > self.budget:
+            raise SpoolFullError("مساحة التحميل المؤقتة ممتلئة حالياً، أعد المحاولة بعد قليل")
+        if self._disk_free() - size < self.min_free:
+            raise SpoolFullError("المساحة المتبقية على الخادم غير كافية، أعد المحاولة لاحقاً")
+        
+        self._add(user_id, file_path, size)
+
+    def adopt(self, user_id: int, file_path: str, size: int):
+        """احتساب ملف موجود مسبقاً (من تشغيل سابق) دون فحص الحدود"""
+        if file_path not in self._reservations:
+            self._add(user_id, file_path, size)
+
+    def release(self, file_path: str):
+        """تحرير حجز الملف بعد حذفه"""
+        reservation = self._reservations.pop(file_path, None)
+        if reservation is None:
+            return
+        user_id, size = reservation
+        self._reserved -= size
+        remaining = self._user_reserved[user_id] - size
+        if remaining > 0:
+            self._user_reserved[user_id] = remaining
+        else:
+            del self._user_reserved[user_id]
+
+    def scan(self) -> int:
+        """احتساب الملفات الموجودة في المجلد عند بدء التشغيل"""
+        if not os.path.isdir(self.path):
+            return 0
+        adopted = 0
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                # اسم الملف يبدأ بمعرف المستخدم: <user_id>_<file_id>.mp4
+                owner = entry.name.split('_', 1)[0]
+                self.adopt(int(owner) if owner.isdigit() else 0, entry.path, entry.stat().st_size)
+                adopted += 1
+        return adopted
+
+    def _add(self, user_id: int, file_path: str, size: int):
+        self._reservations[file_path] = (user_id, size)
+        self._reserved += size
+        self._user_reserved[user_id] = self._user_reserved.get(user_id, 0) + size
+
+    def _disk_free(self) -> int:
+        os.makedirs(self.path, exist_ok=True)
+        return shutil.disk_usage(self.path).free
+
+    def usage(self) -> Dict:
+        """الاستخدام الحالي لمجلد التحميل"""
+        return {
+            'files': len(self._reservations),
+            'reserved_bytes': self._reserved,
+            'budget_bytes': self.budget,
+            'users': len(self._user_reserved),
+            'disk_free_bytes': self._disk_free()
+        }
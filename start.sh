@@ -3,5 +3,13 @@
 
 echo "🚀 بدء تشغيل البوت..."
 
+# تطبيق ترحيلات قاعدة البيانات
+echo "🗄️ تطبيق ترحيلات قاعدة البيانات..."
+# لا يعمل البوت على مخطط قديم (create_all لا يضيف الأعمدة الجديدة إلى الجداول الموجودة)
+if ! alembic upgrade head; then
+    echo "❌ فشل تطبيق ترحيلات قاعدة البيانات"
+    exit 1
+fi
+
 # تشغيل البوت
-python run.py
+exec python run.py
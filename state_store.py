@@ -0,0 +1,109 @@
+"""
+مخزن حالة المحادثة المشترك بين عمليات البوت
+"""
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(value: Dict) -> str:
+    """تسلسل مضغوط للحالة"""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+class StateStore(ABC):
+    """واجهة تخزين حالة المحادثة لكل مستخدم مع مدة صلاحية
+
+    القيم قواميس قابلة للتحويل إلى JSON، وتُعاد نسخة جديدة في كل قراءة لذلك يجب
+    حفظ أي تعديل عليها عبر set().
+    """
+
+    def __init__(self, default_ttl: float = 86400):
+        self.default_ttl = default_ttl
+
+    @abstractmethod
+    async def get(self, key: Hashable) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: Hashable, value: Dict, ttl: Optional[float] = None) -> bool:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: Hashable) -> bool:
+        ...
+
+    @abstractmethod
+    async def purge_expired(self) -> int:
+        """حذف الحالات المنتهية وإرجاع عددها"""
+
+
+class MemoryStateStore(StateStore):
+    """تخزين في ذاكرة العملية؛ مناسب لعملية واحدة (polling أو webhook بعامل واحد)"""
+
+    def __init__(self, default_ttl: float = 86400):
+        super().__init__(default_ttl)
+        self._entries: Dict[str, Tuple[float, str]] = {}
+
+    async def get(self, key: Hashable) -> Optional[Dict]:
+        entry = self._entries.get(str(key))
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(str(key), None)
+            return None
+        return json.loads(payload)
+
+    async def set(self, key: Hashable, value: Dict, ttl: Optional[float] = None) -> bool:
+        ttl = self.default_ttl if ttl is None else ttl
+        self._entries[str(key)] = (time.monotonic() + ttl, _dumps(value))
+        return True
+
+    async def delete(self, key: Hashable) -> bool:
+        self._entries.pop(str(key), None)
+        return True
+
+    async def purge_expired(self) -> int:
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        return len(expired)
+
+
+class DatabaseStateStore(StateStore):
+    """تخزين في جدول conversation_states لتشارك الحالة بين العمليات والنسخ"""
+
+    def __init__(self, adb, default_ttl: float = 86400):
+        super().__init__(default_ttl)
+        self.adb = adb
+
+    async def get(self, key: Hashable) -> Optional[Dict]:
+        payload = await self.adb.get_conversation_state(str(key))
+        return json.loads(payload) if payload is not None else None
+
+    async def set(self, key: Hashable, value: Dict, ttl: Optional[float] = None) -> bool:
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        return await self.adb.set_conversation_state(str(key), _dumps(value), expires_at)
+
+    async def delete(self, key: Hashable) -> bool:
+        return await self.adb.delete_conversation_state(str(key))
+
+    async def purge_expired(self) -> int:
+        return await self.adb.delete_expired_conversation_states()
+
+
+def create_state_store(backend: str, adb, default_ttl: float = 86400) -> StateStore:
+    """إنشاء مخزن الحالة حسب الإعداد STATE_STORE (memory أو database)"""
+    if backend == 'database':
+        return DatabaseStateStore(adb, default_ttl)
+    if backend != 'memory':
+        logger.warning(f"⚠️ نوع مخزن الحالة غير معروف ({backend})، سيتم استخدام الذاكرة")
+    return MemoryStateStore(default_ttl)
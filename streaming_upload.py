@@ -0,0 +1,129 @@
+"""
+بث الفيديو من تلقرام إلى YouTube مباشرة دون حفظه على القرص
+"""
+import asyncio
+import logging
+import threading
+from typing import Optional
+import aiohttp
+from googleapiclient.http import MediaUpload
+
+logger = logging.getLogger(__name__)
+
+# حجم الدفعة التي تُنقل من اتصال التحميل إلى المخزن المؤقت
+TRANSFER_BLOCK_SIZE = 1024 * 1024
+
+
+class StreamAbortedError(Exception):
+    """توقف أحد طرفي البث"""
+
+
+class RingBuffer:
+    """مخزن مؤقت محدود السعة بين منتج (التحميل) ومستهلك (الرفع)
+
+    يحتفظ بنافذة متحركة من البايتات تبدأ من آخر موضع طلبه المستهلك، حتى يمكن
+    إعادة إرسال جزء لم يؤكده الخادم. يتوقف المنتج عند امتلاء السعة (الضغط العكسي).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = bytearray()
+        self._start = 0
+        self._closed = False
+        self._error: Optional[Exception] = None
+        self._condition = threading.Condition()
+
+    def write(self, data: bytes):
+        """كتابة البايتات مع الانتظار حتى يتوفر مكان في المخزن"""
+        view = memoryview(data)
+        with self._condition:
+            while view:
+                while len(self._data) >= self.capacity and self._error is None:
+                    self._condition.wait()
+                if self._error is not None:
+                    raise StreamAbortedError(str(self._error))
+                room = self.capacity - len(self._data)
+                self._data += view[:room]
+                view = view[room:]
+                self._condition.notify_all()
+
+    def close(self, error: Optional[Exception] = None):
+        """إنهاء الكتابة، مع تمرير خطأ المنتج إن وجد"""
+        with self._condition:
+            self._closed = True
+            if error is not None and self._error is None:
+                self._error = error
+            self._condition.notify_all()
+
+    def abort(self, error: Exception):
+        """إيقاف المنتج عند فشل المستهلك"""
+        self.close(error)
+
+    def read_at(self, begin: int, length: int) -> bytes:
+        """قراءة جزء يبدأ من موضع مطلق، وتحرير ما قبله من المخزن"""
+        with self._condition:
+            if begin < self._start:
+                raise StreamAbortedError(f"لا يمكن الرجوع إلى البايت {begin} بعد تحريره من المخزن")
+            # تحرير البايتات التي أكدها الخادم
+            released = min(begin - self._start, len(self._data))
+            if released:
+                del self._data[:released]
+                self._start += released
+                self._condition.notify_all()
+            offset = begin - self._start
+            while len(self._data) < offset + length and not self._closed:
+                self._condition.wait()
+            if self._error is not None:
+                raise StreamAbortedError(str(self._error))
+            return bytes(self._data[offset:offset + length])
+
+
+class StreamingMediaUpload(MediaUpload):
+    """وسيط رفع يقرأ من RingBuffer بدلاً من ملف على القرص"""
+
+    def __init__(self, buffer: RingBuffer, size: int, chunksize: int, mimetype: str = 'video/mp4'):
+        super().__init__()
+        self._buffer = buffer
+        self._size = size
+        self._chunksize = chunksize
+        self._mimetype = mimetype
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        return self._size
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        return self._buffer.read_at(begin, length)
+
+    def has_stream(self):
+        return False
+
+
+async def pump_telegram_file(file_url: str, buffer: RingBuffer):
+    """تحميل ملف من خادم ملفات تلقرام وتغذية المخزن المؤقت به"""
+    pending = bytearray()
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(file_url) as response:
+                response.raise_for_status()
+                async for data in response.content.iter_chunked(TRANSFER_BLOCK_SIZE):
+                    pending += data
+                    if len(pending) >= TRANSFER_BLOCK_SIZE:
+                        # الكتابة قد تنتظر المستهلك، لذلك تتم خارج حلقة الأحداث
+                        await asyncio.to_thread(buffer.write, bytes(pending))
+                        pending.clear()
+        if pending:
+            await asyncio.to_thread(buffer.write, bytes(pending))
+    except Exception as e:
+        logger.error(f"خطأ في تحميل الفيديو من تلقرام: {e}")
+        buffer.close(e)
+        raise
+    buffer.close()
@@ -1,20 +1,37 @@
 import os
+import io
+import csv
 import json
 import asyncio
 import logging
-from datetime import datetime
-from typing import Dict, Optional
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
 import aiohttp
 import aiofiles
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
-from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 # استبدال استيراد sqlite3 بـ database manager
-from database import create_database_manager, User, UploadLog
+from database import create_database_manager, create_async_database_manager, UserCache, UserSnapshot, UploadLog, UPLOAD_EXPORT_COLUMNS
+from config import Config
+from credential_cache import CredentialCache
+from youtube_client import YouTubeClientPool
+from upload_executor import UploadExecutor, UploadQueueFullError
+from upload_log_sink import UploadLogSink
+from log_retention import LogRetention
+from state_store import create_state_store
+from update_dedup import UpdateDeduplicator
+from update_processor import PerUserUpdateProcessor
+from upload_reaper import OrphanReaper
+from quota_scheduler import QuotaScheduler
+from credential_pool import CredentialPool, PooledCredential, load_credentials
+from spool_manager import SpoolManager, SpoolFullError
+from resumable_upload import ChunkedUploader, UploadCancelledError
+from upload_retry import RetryPolicy, RetryState, classify_error, QUOTA, RETRYABLE
+from streaming_upload import RingBuffer, StreamingMediaUpload, pump_telegram_file
 from urllib.parse import urlencode
 
 # إعداد التسجيل
@@ -24,6 +41,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# اسم توكن البيئة المشترك في مجمع بيانات المصادقة وبادئة مفاتيح ذاكرتها
+ENV_CREDENTIALS_KEY = 'env'
+
+# عدد عمليات الرفع في كل صفحة من السجل
+HISTORY_PAGE_SIZE = 10
+# مرجع ترميز وقت الرفع في مؤشرات صفحات السجل
+HISTORY_EPOCH = datetime(1970, 1, 1)
+
+# مهلة توقف الرفع الجاري عند الجزء التالي بعد طلب إيقافه عند إيقاف البوت
+UPLOAD_CANCEL_GRACE = 5
+
 class YouTubeTelegramBot:
     # في بداية الكلاس __init__
     def __init__(self):
@@ -39,13 +67,114 @@ class YouTubeTelegramBot:
         self.youtube_channel_name = os.getenv('YOUTUBE_CHANNEL_NAME')
         
         # إعداد قاعدة البيانات PostgreSQL
-        self.db = create_database_manager()
+        # ذاكرة المستخدمين المؤقتة مشتركة بين الاتصالين المتزامن وغير المتزامن
+        user_cache = UserCache(max_size=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+        self.db = create_database_manager(user_cache)
         if not self.db:
             raise Exception("❌ فشل في الاتصال بقاعدة البيانات")
         
-        # متغيرات مؤقتة لحفظ حالة المستخدمين
-        self.user_states = {}
-        self.pending_uploads = {}
+        # الاتصال غير المتزامن تستخدمه معالجات البوت حتى لا تتوقف حلقة الأحداث
+        self.adb = create_async_database_manager(user_cache)
+        if not self.adb:
+            raise Exception("❌ فشل في الاتصال غير المتزامن بقاعدة البيانات")
+        
+        # حالة المستخدمين (خطوة الإعداد والفيديو المنتظر)، مشتركة بين العمليات في وضع database
+        self.state_store = create_state_store(Config.STATE_STORE, self.adb, Config.STATE_TTL)
+        
+        # تجاهل التحديثات التي يعيد تلقرام إرسالها في وضع webhook
+        self.update_dedup = UpdateDeduplicator(
+            window=Config.UPDATE_DEDUP_WINDOW,
+            adb=self.adb,
+            shared=Config.UPDATE_DEDUP_SHARED
+        )
+        
+        # ملفات الفيديو في طابور الرفع أو قيد الرفع (لا يحذفها OrphanReaper)
+        self.active_upload_files = set()
+        
+        # حجز مساحة مجلد التحميل قبل تحميل أي فيديو
+        self.spool = SpoolManager(
+            Config.DOWNLOAD_PATH,
+            budget=Config.SPOOL_BUDGET,
+            user_quota=Config.SPOOL_USER_QUOTA,
+            max_file_size=Config.MAX_FILE_SIZE,
+            min_free=Config.SPOOL_MIN_FREE
+        )
+        self.spool.scan()
+        self.orphan_reaper = OrphanReaper(
+            Config.DOWNLOAD_PATH,
+            is_owned=self._spool_file_owned,
+            grace=Config.ORPHAN_FILE_GRACE,
+            on_removed=self.spool.release
+        )
+        
+        # ذاكرة مؤقتة لبيانات المصادقة لتجنب تحديث التوكن مع كل طلب
+        self.credential_cache = CredentialCache(
+            refresh_margin=Config.CREDENTIAL_REFRESH_MARGIN,
+            on_refresh=self._on_credentials_refreshed
+        )
+        
+        # منفذ الرفع في الخلفية حتى لا يتوقف البوت أثناء رفع الفيديوهات
+        self.upload_executor = UploadExecutor(
+            max_workers=Config.UPLOAD_WORKERS,
+            max_queue_size=Config.UPLOAD_QUEUE_SIZE
+        )
+        # يوقف عمليات الرفع الجارية عند الجزء التالي إذا لم تنتهِ قبل مهلة الإيقاف
+        self.upload_cancel = threading.Event()
+        self.chunked_uploader = ChunkedUploader(
+            self.db,
+            Config.UPLOAD_CHUNK_SIZE,
+            retry_policy=RetryPolicy(
+                max_attempts=Config.UPLOAD_RETRY_MAX_ATTEMPTS,
+                base_delay=Config.UPLOAD_RETRY_BASE_DELAY,
+                max_delay=Config.UPLOAD_RETRY_MAX_DELAY
+            )
+        )
+        
+        # سجلات الرفع تُكتب على دفعات خارج مسار رسالة النجاح
+        self.upload_log_sink = UploadLogSink(
+            self.adb,
+            batch_size=Config.UPLOAD_LOG_BATCH_SIZE,
+            flush_interval=Config.UPLOAD_LOG_FLUSH_INTERVAL,
+            durable=Config.UPLOAD_LOG_DURABLE
+        )
+        
+        # حذف السجلات القديمة دورياً على دفعات صغيرة
+        self.log_retention = LogRetention(
+            self.adb,
+            retention_days=Config.LOG_RETENTION_DAYS,
+            batch_size=Config.LOG_RETENTION_BATCH_SIZE,
+            pause=Config.LOG_RETENTION_PAUSE,
+            archive_path=Config.LOG_ARCHIVE_PATH,
+            partitions_ahead=Config.UPLOAD_LOG_PARTITIONS_AHEAD
+        )
+        
+        # حصة YouTube Data API اليومية المشتركة بين العمليات
+        self.quota = QuotaScheduler(
+            self.adb,
+            daily_limit=Config.YOUTUBE_QUOTA_DAILY_LIMIT,
+            costs=Config.YOUTUBE_QUOTA_COSTS,
+            burst=Config.YOUTUBE_QUOTA_BURST
+        )
+        
+        # بيانات المصادقة المشتركة (أو عميل OAuth الخاص بحسابات المستخدمين) موزعة حسب الحمل والحصة
+        self.credential_pool = CredentialPool(
+            load_credentials(
+                Config.YOUTUBE_CREDENTIALS,
+                Config.YOUTUBE_CREDENTIALS_FILE,
+                PooledCredential(
+                    ENV_CREDENTIALS_KEY,
+                    self.youtube_client_id,
+                    self.youtube_client_secret,
+                    self.youtube_refresh_token
+                )
+            ),
+            self.quota,
+            error_threshold=Config.YOUTUBE_CREDENTIAL_ERROR_THRESHOLD,
+            cooldown=Config.YOUTUBE_CREDENTIAL_COOLDOWN
+        )
+        
+        # عملاء YouTube جاهزة باتصالات مستمرة بدلاً من build() مع كل طلب
+        self.youtube_clients = YouTubeClientPool(max_idle_per_key=Config.UPLOAD_WORKERS)
         
         # نطاقات YouTube المطلوبة
         self.youtube_scopes = [
@@ -56,25 +185,49 @@ class YouTubeTelegramBot:
     # استبدال دالة init_database
     # حذف هذه الدالة لأن قاعدة البيانات تُدار الآن بواسطة DatabaseManager
     # استبدال دالة get_user_credentials
-    def get_user_credentials(self, user_id: int) -> Optional[Credentials]:
-        """جلب بيانات المصادقة للمستخدم"""
-        # إذا تم توفير توكن التحديث من متغيرات البيئة، استخدمه للجميع
-        if self.youtube_refresh_token:
-            creds = Credentials(
-                token=None,
-                refresh_token=self.youtube_refresh_token,
-                token_uri='https://oauth2.googleapis.com/token',
-                client_id=self.youtube_client_id,
-                client_secret=self.youtube_client_secret
-            )
-            try:
-                creds.refresh(Request())
-            except Exception as e:
-                logger.error(f"خطأ في تحديث التوكن من البيئة: {e}")
+    async def get_user_credentials(self, user_id: int,
+                                   credential: Optional[PooledCredential] = None) -> Optional[Credentials]:
+        """جلب بيانات المصادقة للمستخدم من الذاكرة المؤقتة
+
+        credential: عنصر المجمع المختار للطلب عند استخدام بيانات المصادقة المشتركة
+        """
+        if self.credential_pool.shared:
+            credential = credential or self.credential_pool.default
+        key = self._credentials_key(user_id, credential)
+        
+        # توكن صالح في الذاكرة: لا حاجة لقاعدة البيانات ولا للشبكة
+        creds = self.credential_cache.peek(key)
+        if creds:
             return creds
         
-        user = self.db.get_user(user_id)
+        # إذا تم توفير توكن التحديث من متغيرات البيئة، استخدمه للجميع
+        if self.credential_pool.shared:
+            loader = lambda: self._load_env_credentials(credential)
+        else:
+            user = await self.adb.get_user(user_id)
+            loader = lambda: self._build_user_credentials(user)
         
+        # التحديث عبر الشبكة متزامن، لذلك يتم خارج حلقة الأحداث
+        return await asyncio.to_thread(self.credential_cache.get, key, loader)
+
+    def _credentials_key(self, user_id: int, credential: Optional[PooledCredential] = None):
+        """مفتاح بيانات المصادقة المستخدم في الذاكرة المؤقتة ومجمع العملاء"""
+        if self.credential_pool.shared:
+            return (ENV_CREDENTIALS_KEY, (credential or self.credential_pool.default).name)
+        return user_id
+
+    def _load_env_credentials(self, credential: PooledCredential) -> Credentials:
+        """إنشاء بيانات المصادقة من توكن التحديث المشترك"""
+        return Credentials(
+            token=None,
+            refresh_token=credential.refresh_token,
+            token_uri='https://oauth2.googleapis.com/token',
+            client_id=credential.client_id,
+            client_secret=credential.client_secret
+        )
+
+    def _build_user_credentials(self, user: Optional[UserSnapshot]) -> Optional[Credentials]:
+        """إنشاء بيانات المصادقة من سجل المستخدم في قاعدة البيانات"""
         if user and user.access_token:
             creds = Credentials(
                 token=user.access_token,
@@ -87,6 +240,11 @@ class YouTubeTelegramBot:
             return creds
         return None
 
+    def _on_credentials_refreshed(self, key, credentials: Credentials):
+        """حفظ التوكن المحدث في قاعدة البيانات (توكن البيئة لا يُحفظ)"""
+        if isinstance(key, int):
+            self.save_user_credentials(key, credentials)
+
     # استبدال دالة save_user_credentials
     def save_user_credentials(self, user_id: int, credentials: Credentials):
         """حفظ بيانات المصادقة للمستخدم"""
@@ -125,7 +283,7 @@ class YouTubeTelegramBot:
         user_id = update.effective_user.id
         
         # إذا تم توفير توكن التحديث من البيئة، اعتبر الحساب مربوطًا
-        if self.youtube_refresh_token:
+        if self.credential_pool.shared:
             await update.callback_query.edit_message_text(
                 "✅ تم ربط حساب YouTube مسبقاً عبر متغيرات البيئة."
             )
@@ -168,7 +326,7 @@ class YouTubeTelegramBot:
         """
         
         # حفظ حالة المستخدم
-        self.user_states[user_id] = 'waiting_auth_code'
+        await self.state_store.set(user_id, {'state': 'waiting_auth_code'})
         
         await update.callback_query.edit_message_text(message)
 
@@ -198,11 +356,16 @@ class YouTubeTelegramBot:
             credentials = flow.credentials
             
             # حفظ بيانات المصادقة
-            self.save_user_credentials(user_id, credentials)
+            await self.adb.save_user_credentials(
+                user_id=user_id,
+                access_token=credentials.token,
+                refresh_token=credentials.refresh_token,
+                token_expiry=credentials.expiry
+            )
+            self.credential_cache.invalidate(user_id)
             
             # إزالة حالة المستخدم
-            if user_id in self.user_states:
-                del self.user_states[user_id]
+            await self.state_store.delete(user_id)
             
             await update.message.reply_text(
                 "✅ تم ربط حساب YouTube بنجاح!\n\n"
@@ -221,7 +384,7 @@ class YouTubeTelegramBot:
         user_id = update.effective_user.id
         
         # التحقق من ربط الحساب
-        credentials = self.get_user_credentials(user_id)
+        credentials = await self.get_user_credentials(user_id)
         is_connected = credentials is not None
         
         # جلب معلومات المستخدم/القناة
@@ -229,11 +392,11 @@ class YouTubeTelegramBot:
         if self.youtube_channel_id:
             selected_channel = self.youtube_channel_name or self.youtube_channel_id
         else:
-            user = self.db.get_user(user_id)
+            user = await self.adb.get_user(user_id)
             selected_channel = user.selected_channel_name if user and user.selected_channel_name else None
         
         # جلب الإحصائيات
-        stats = self.db.get_upload_stats(user_id)
+        stats = await self.adb.get_upload_stats(user_id)
         
         status_message = f"""
 📊 حالة الحساب:
@@ -261,6 +424,117 @@ class YouTubeTelegramBot:
         
         await update.callback_query.edit_message_text(status_message, reply_markup=reply_markup)
 
+    async def show_upload_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                  before: Optional[Tuple[datetime, int]] = None,
+                                  after: Optional[Tuple[datetime, int]] = None):
+        """عرض سجل الرفع صفحةً صفحة بترقيم المفتاح"""
+        user_id = update.effective_user.id
+        
+        # صف إضافي لمعرفة وجود صفحة تالية دون استعلام COUNT
+        uploads = await self.adb.get_user_uploads(user_id, HISTORY_PAGE_SIZE + 1, before, after)
+        has_more = len(uploads) > HISTORY_PAGE_SIZE
+        if has_more:
+            # الصف الزائد يقع في طرف الاتجاه المطلوب
+            uploads = uploads[1:] if after is not None else uploads[:-1]
+        
+        if not uploads:
+            keyboard = [[InlineKeyboardButton("🔙 رجوع", callback_data='show_status')]]
+            await update.callback_query.edit_message_text(
+                "📋 لا يوجد سجل رفع بعد.",
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+            return
+        
+        lines = ["📋 سجل الرفع:\n"]
+        for upload in uploads:
+            icon = '✅' if upload.upload_status == 'success' else '❌'
+            title = upload.video_title or '-'
+            if len(title) > 40:
+                title = title[:40] + '…'
+            lines.append(f"{icon} {title}\n   🕒 {upload.upload_time:%Y-%m-%d %H:%M}")
+        lines.append("\n📥 لتصدير السجل كاملاً: /export أو /export json")
+        
+        # الصفحة الأحدث موجودة إذا جئنا من صفحة أحدث أو إذا زاد الناتج عند الرجوع للأحدث
+        has_newer = before is not None or (after is not None and has_more)
+        has_older = after is not None or has_more
+        
+        navigation = []
+        if has_newer:
+            navigation.append(InlineKeyboardButton(
+                "⬅️ الأحدث", callback_data=f"history_newer_{self._history_cursor(uploads[0])}"
+            ))
+        if has_older:
+            navigation.append(InlineKeyboardButton(
+                "الأقدم ➡️", callback_data=f"history_older_{self._history_cursor(uploads[-1])}"
+            ))
+        
+        keyboard = []
+        if navigation:
+            keyboard.append(navigation)
+        keyboard.append([InlineKeyboardButton("🔙 رجوع", callback_data='show_status')])
+        
+        await update.callback_query.edit_message_text(
+            "\n".join(lines),
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+    @staticmethod
+    def _history_cursor(upload: UploadLog) -> str:
+        """ترميز مؤشر الصفحة (وقت الرفع بالميكروثانية ومعرّف السجل) ضمن حد 64 بايت"""
+        return f"{(upload.upload_time - HISTORY_EPOCH) // timedelta(microseconds=1)}_{upload.id}"
+
+    @staticmethod
+    def _parse_history_cursor(cursor: str) -> Tuple[datetime, int]:
+        micros, upload_id = cursor.split('_')
+        return HISTORY_EPOCH + timedelta(microseconds=int(micros)), int(upload_id)
+
+    async def export_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """تصدير سجل الرفع كاملاً كملف CSV أو JSON Lines"""
+        user_id = update.effective_user.id
+        export_format = context.args[0].lower() if context.args else 'csv'
+        if export_format not in ('csv', 'json'):
+            await update.message.reply_text("❌ الصيغة غير مدعومة. استخدم: /export أو /export json")
+            return
+        
+        # الكتابة إلى ملف مؤقت صفاً بصف حتى لا يُحمّل السجل كاملاً في الذاكرة
+        with tempfile.TemporaryFile() as export_file:
+            # utf-8-sig ليعرض Excel العناوين العربية بشكل صحيح
+            writer_file = io.TextIOWrapper(
+                export_file, encoding='utf-8-sig' if export_format == 'csv' else 'utf-8', newline=''
+            )
+            rows = 0
+            try:
+                if export_format == 'csv':
+                    writer = csv.writer(writer_file)
+                    writer.writerow(UPLOAD_EXPORT_COLUMNS)
+                    async for row in self.adb.stream_user_uploads(user_id):
+                        writer.writerow(row)
+                        rows += 1
+                else:
+                    async for row in self.adb.stream_user_uploads(user_id):
+                        writer_file.write(json.dumps(dict(row._mapping), default=str, ensure_ascii=False) + '\n')
+                        rows += 1
+                writer_file.flush()
+            except Exception as e:
+                logger.error(f"خطأ في تصدير سجل الرفع: {e}")
+                await update.message.reply_text("❌ حدث خطأ أثناء تصدير السجل.")
+                return
+            finally:
+                # فصل الغلاف النصي دون إغلاق الملف المؤقت
+                writer_file.detach()
+            
+            if not rows:
+                await update.message.reply_text("📋 لا يوجد سجل رفع لتصديره.")
+                return
+            
+            export_file.seek(0)
+            extension = 'csv' if export_format == 'csv' else 'jsonl'
+            await update.message.reply_document(
+                document=export_file,
+                filename=f"uploads_{user_id}.{extension}",
+                caption=f"📥 سجل الرفع ({rows} عملية)"
+            )
+
     async def select_channel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """اختيار قناة YouTube"""
         user_id = update.effective_user.id
@@ -272,20 +546,30 @@ class YouTubeTelegramBot:
             )
             return
         
-        credentials = self.get_user_credentials(user_id)
+        credentials = await self.get_user_credentials(user_id)
         if not credentials:
             await update.callback_query.answer("❌ يجب ربط حساب YouTube أولاً!")
             return
         
+        credential = await self.credential_pool.acquire('channels.list', Config.YOUTUBE_QUOTA_MAX_WAIT)
+        if credential is None:
+            reason, retry = await self._quota_wait_text('channels.list')
+            await update.callback_query.edit_message_text(f"⏳ {reason}، حاول مرة أخرى بعد {retry}.")
+            return
+        
         try:
-            # بناء خدمة YouTube
-            youtube = build('youtube', 'v3', credentials=credentials)
-            
-            # جلب قنوات المستخدم
-            channels_response = youtube.channels().list(
-                part='snippet',
-                mine=True
-            ).execute()
+            # جلب قنوات المستخدم عبر عميل YouTube من المجمع
+            credentials = await self.get_user_credentials(user_id, credential)
+            try:
+                with self.youtube_clients.client(self._credentials_key(user_id, credential), credentials) as youtube:
+                    channels_response = youtube.channels().list(
+                        part='snippet',
+                        mine=True
+                    ).execute()
+            except Exception as e:
+                await self.credential_pool.release(credential, e)
+                raise
+            await self.credential_pool.release(credential)
             
             channels = channels_response.get('items', [])
             
@@ -332,7 +616,7 @@ class YouTubeTelegramBot:
             channel_name = parts[2]
             
             # حفظ القناة المختارة
-            success = self.db.update_user_channel(user_id, channel_id, channel_name)
+            success = await self.adb.update_user_channel(user_id, channel_id, channel_name)
             
             if success:
                 await update.callback_query.edit_message_text(
@@ -351,7 +635,7 @@ class YouTubeTelegramBot:
         user_id = update.effective_user.id
         
         # التحقق من ربط الحساب
-        credentials = self.get_user_credentials(user_id)
+        credentials = await self.get_user_credentials(user_id)
         if not credentials:
             await update.message.reply_text(
                 "❌ يجب ربط حساب YouTube أولاً!\nاستخدم /start للبدء."
@@ -363,7 +647,7 @@ class YouTubeTelegramBot:
         if self.youtube_channel_id:
             channel_is_set = True
         else:
-            user = self.db.get_user(user_id)
+            user = await self.adb.get_user(user_id)
             channel_is_set = bool(user and user.selected_channel_id)
         
         if not channel_is_set:
@@ -376,39 +660,70 @@ class YouTubeTelegramBot:
             )
             return
         
+        file_size = update.message.video.file_size
+        try:
+            self.spool.check_size(file_size)
+        except SpoolFullError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+        
+        # فيديو سابق لم يكتمل إدخال بياناته يُستبدل بالجديد
+        previous = await self.state_store.get(user_id)
+        if previous and previous.get('video', {}).get('file_path'):
+            self._discard_spool_file(previous['video']['file_path'])
+        
+        file_path = None
         try:
             # إرسال رسالة تحضير
             status_message = await update.message.reply_text("📤 جاري تحضير الفيديو للرفع...")
             
             # تحميل الفيديو
             video_file = await update.message.video.get_file()
-            file_path = f"downloads/{user_id}_{video_file.file_id}.mp4"
             
-            # إنشاء مجلد التحميل إذا لم يكن موجوداً
-            os.makedirs("downloads", exist_ok=True)
-            
-            # تحميل الفيديو
-            await video_file.download_to_drive(file_path)
+            # في وضع البث يُحمّل الفيديو أثناء رفعه، وفي الطابور الدائم يحمّله عامل الرفع،
+            # ومع الحالة المشتركة تحمّله النسخة التي تنفذ الرفع لأن القرص غير مشترك،
+            # لذلك يُحفظ معرف الملف فقط
+            if not Config.UPLOAD_STREAMING and Config.UPLOAD_QUEUE != 'database' \
+                    and Config.STATE_STORE != 'database':
+                file_path = os.path.join(Config.DOWNLOAD_PATH, f"{user_id}_{video_file.file_id}.mp4")
+                try:
+                    self.spool.reserve(user_id, file_path, file_size)
+                except SpoolFullError as e:
+                    file_path = None
+                    await status_message.edit_text(f"❌ {e}")
+                    return
+                
+                # إنشاء مجلد التحميل إذا لم يكن موجوداً
+                os.makedirs(Config.DOWNLOAD_PATH, exist_ok=True)
+                
+                # تحميل الفيديو
+                await video_file.download_to_drive(file_path)
             
             # حفظ معلومات الفيديو
             video_info = {
                 'file_path': file_path,
-                'file_size': update.message.video.file_size,
+                'file_id': video_file.file_id,
+                'file_size': file_size,
+                'file_unique_id': video_file.file_unique_id,
                 'duration': update.message.video.duration,
                 'user_id': user_id,
                 'step': 'waiting_title'
             }
             
-            self.pending_uploads[user_id] = video_info
-            self.user_states[user_id] = 'uploading_video'
+            # مهلة أقصر للفيديو المنتظر؛ كل خطوة يكملها المستخدم تجددها
+            await self.state_store.set(
+                user_id, {'state': 'uploading_video', 'video': video_info}, ttl=Config.PENDING_UPLOAD_TTL
+            )
             
             await status_message.edit_text(
-                "📝 تم تحميل الفيديو بنجاح!\n\n"
+                "📝 تم استلام الفيديو بنجاح!\n\n"
                 "الآن أرسل عنوان الفيديو:"
             )
             
         except Exception as e:
             logger.error(f"خطأ في معالجة الفيديو: {e}")
+            # حذف التحميل الجزئي وتحرير مساحته
+            self._discard_spool_file(file_path)
             await update.message.reply_text(
                 "❌ حدث خطأ في معالجة الفيديو. حاول مرة أخرى."
             )
@@ -422,18 +737,23 @@ class YouTubeTelegramBot:
         if text.startswith('/'):
             return
         
+        state = await self.state_store.get(user_id)
+        if state is None:
+            return
+        
         # معالجة رمز المصادقة
-        if user_id in self.user_states and self.user_states[user_id] == 'waiting_auth_code':
+        if state['state'] == 'waiting_auth_code':
             await self.handle_auth_code(update, context)
             return
         
         # معالجة تفاصيل الفيديو
-        if user_id in self.pending_uploads and user_id in self.user_states:
-            video_info = self.pending_uploads[user_id]
+        if 'video' in state:
+            video_info = state['video']
             
             if video_info['step'] == 'waiting_title':
                 video_info['title'] = text
                 video_info['step'] = 'waiting_description'
+                await self.state_store.set(user_id, state, ttl=Config.PENDING_UPLOAD_TTL)
                 await update.message.reply_text(
                     "📄 أرسل وصف الفيديو (أو اكتب 'تخطي' للتخطي):"
                 )
@@ -441,6 +761,7 @@ class YouTubeTelegramBot:
             elif video_info['step'] == 'waiting_description':
                 video_info['description'] = '' if text == 'تخطي' else text
                 video_info['step'] = 'waiting_privacy'
+                await self.state_store.set(user_id, state, ttl=Config.PENDING_UPLOAD_TTL)
                 
                 keyboard = [
                     [InlineKeyboardButton("🌍 عام", callback_data=f'privacy_public_{user_id}')],
@@ -456,123 +777,379 @@ class YouTubeTelegramBot:
 
     # تحديث دالة upload_to_youtube لحفظ السجل
     async def upload_to_youtube(self, update: Update, context: ContextTypes.DEFAULT_TYPE, privacy: str):
-        """رفع الفيديو إلى YouTube"""
+        """إضافة الفيديو إلى طابور الرفع إلى YouTube"""
         user_id = update.effective_user.id
         
-        if user_id not in self.pending_uploads:
+        state = await self.state_store.get(user_id)
+        if state is None or 'video' not in state:
             await update.callback_query.answer("❌ لم يتم العثور على فيديو للرفع")
             return
         
-        video_info = self.pending_uploads[user_id]
+        video_info = state['video']
         
-        # جلب بيانات المصادقة وتحديد القناة قبل البدء
-        credentials = self.get_user_credentials(user_id)
+        # تحديد القناة قبل البدء
         if self.youtube_channel_id:
             channel_id = self.youtube_channel_id
             channel_name = self.youtube_channel_name or 'YouTube Channel'
         else:
-            user = self.db.get_user(user_id)
+            user = await self.adb.get_user(user_id)
             channel_id = user.selected_channel_id if user else None
             channel_name = user.selected_channel_name if user else None
         
-        try:
-            # إرسال رسالة بدء الرفع
-            await update.callback_query.edit_message_text("📤 جاري رفع الفيديو إلى YouTube...")
-            
-            # بناء خدمة YouTube
-            youtube = build('youtube', 'v3', credentials=credentials)
-            
-            # إعداد بيانات الفيديو
-            body = {
-                'snippet': {
-                    'title': video_info['title'],
-                    'description': video_info['description'],
-                    'channelId': channel_id,
-                    'categoryId': '22'  # People & Blogs
-                },
-                'status': {
-                    'privacyStatus': privacy
-                }
+        # إعداد بيانات الفيديو
+        body = {
+            'snippet': {
+                'title': video_info['title'],
+                'description': video_info['description'],
+                'channelId': channel_id,
+                'categoryId': '22'  # People & Blogs
+            },
+            'status': {
+                'privacyStatus': privacy
             }
-            
-            # رفع الفيديو
-            media = MediaFileUpload(
+        }
+        
+        if Config.UPLOAD_QUEUE == 'database':
+            await self._enqueue_durable_upload(update, user_id, {
+                'body': body,
+                'video_info': video_info,
+                'privacy': privacy,
+                'channel_id': channel_id,
+                'channel_name': channel_name
+            })
+            return
+        
+        # اختيار أقل بيانات مصادقة انشغالاً وحجز حصة الرفع قبل إضافته إلى الطابور،
+        # مع انتظار قصير إذا كان الاستهلاك مرتفعاً
+        credential, wait = await self.credential_pool.reserve('videos.insert')
+        if credential is None and wait <= Config.YOUTUBE_QUOTA_MAX_WAIT:
+            await update.callback_query.edit_message_text(
+                f"⏳ في انتظار حصة YouTube، سيبدأ الرفع خلال {int(wait) + 1} ثانية تقريباً..."
+            )
+        if credential is None:
+            credential = await self.credential_pool.acquire('videos.insert', Config.YOUTUBE_QUOTA_MAX_WAIT)
+        if credential is None:
+            # إبقاء أزرار الخصوصية ليتمكن المستخدم من إعادة المحاولة لاحقاً
+            reason, retry = await self._quota_wait_text('videos.insert')
+            await update.callback_query.edit_message_text(
+                f"⏳ {reason}، اختر مستوى الخصوصية مرة أخرى بعد {retry}.",
+                reply_markup=update.callback_query.message.reply_markup
+            )
+            return
+        # الفيديو المحفوظ بمعرفه فقط (الحالة المشتركة) يُحمّل في هذه النسخة قبل رفعه
+        downloaded = False
+        if not video_info['file_path'] and not Config.UPLOAD_STREAMING:
+            video_info['file_path'] = await self._download_for_upload(update, context, video_info)
+            if video_info['file_path'] is None:
+                await self.credential_pool.refund(credential, 'videos.insert')
+                return
+            downloaded = True
+        
+        credentials = await self.get_user_credentials(user_id, credential)
+        credentials_key = self._credentials_key(user_id, credential)
+        
+        upload_context = {
+            'user_id': user_id,
+            'video_info': video_info,
+            'privacy': privacy,
+            'channel_id': channel_id,
+            'channel_name': channel_name,
+            'credential': credential,
+            'retry': RetryState(),
+            'edit_message': update.callback_query.edit_message_text
+        }
+        
+        # مفتاح الجلسة ثابت لنفس الفيديو حتى يُستأنف الرفع عند إعادة إرساله
+        session_key = self._upload_session_key(user_id, video_info)
+        progress_callback = self._make_progress_callback(
+            update.callback_query.edit_message_text, asyncio.get_running_loop()
+        )
+        
+        if video_info['file_path']:
+            job = (
+                self._perform_upload, credentials_key, credentials, body,
                 video_info['file_path'],
-                chunksize=-1,
-                resumable=True,
-                mimetype='video/mp4'
+                session_key, user_id, progress_callback, upload_context['retry'],
+                self.upload_cancel
             )
-            
-            insert_request = youtube.videos().insert(
-                part=','.join(body.keys()),
-                body=body,
-                media_body=media
+        else:
+            # يُجلب رابط الملف الآن لأن روابط تحميل تلقرام مؤقتة
+            telegram_file = await context.bot.get_file(video_info['file_id'])
+            job = (
+                self._perform_stream_upload, credentials_key, credentials, body,
+                telegram_file.file_path,
+                video_info.get('file_size'), asyncio.get_running_loop(), progress_callback,
+                upload_context['retry'], self.upload_cancel
             )
-            
-            response = insert_request.execute()
-            video_id = response['id']
-            video_url = f"https://youtube.com/watch?v={video_id}"
-            
-            # حفظ سجل الرفع الناجح
-            upload_data = {
-                'user_id': user_id,
-                'video_title': video_info['title'],
-                'video_description': video_info['description'],
-                'video_id': video_id,
-                'video_url': video_url,
-                'file_size': video_info.get('file_size'),
-                'duration': video_info.get('duration'),
-                'privacy_status': privacy,
-                'upload_status': 'success',
-                'channel_id': channel_id,
-                'channel_name': channel_name
-            }
-            
-            self.db.log_upload(upload_data)
         
-            # رسالة النجاح
-            success_message = f"""
+        if video_info['file_path']:
+            self.active_upload_files.add(video_info['file_path'])
+        try:
+            position = await self.upload_executor.submit(
+                *job,
+                on_complete=lambda response: self._on_upload_success(upload_context, response),
+                on_error=lambda error: self._on_upload_error(upload_context, error)
+            )
+        except UploadQueueFullError:
+            if downloaded:
+                # الحالة لا تحمل مسار الملف، فيُعاد تحميله عند إعادة المحاولة
+                self._discard_spool_file(video_info['file_path'])
+            else:
+                self.active_upload_files.discard(video_info['file_path'])
+            await self.credential_pool.refund(credential, 'videos.insert')
+            # إبقاء أزرار الخصوصية ليتمكن المستخدم من إعادة المحاولة
+            await update.callback_query.edit_message_text(
+                "⏳ طابور الرفع ممتلئ حالياً، اختر مستوى الخصوصية مرة أخرى بعد قليل.",
+                reply_markup=update.callback_query.message.reply_markup
+            )
+            return
+        
+        # إزالة البيانات المؤقتة حتى لا يُرفع الفيديو مرتين
+        await self.state_store.delete(user_id)
+        
+        await update.callback_query.edit_message_text(
+            f"📤 تمت إضافة الفيديو إلى طابور الرفع (الترتيب: {position})..."
+        )
+
+    async def _download_for_upload(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                   video_info: Dict) -> Optional[str]:
+        """تحميل فيديو الحالة المشتركة إلى قرص هذه النسخة، None عند التعذر"""
+        user_id = video_info['user_id']
+        reply_markup = update.callback_query.message.reply_markup
+        file_path = os.path.join(Config.DOWNLOAD_PATH, f"{user_id}_{video_info['file_id']}.mp4")
+        try:
+            self.spool.reserve(user_id, file_path, video_info.get('file_size'))
+        except SpoolFullError as e:
+            await update.callback_query.edit_message_text(f"❌ {e}", reply_markup=reply_markup)
+            return None
+        
+        # حمايته من تنظيف الملفات اليتيمة أثناء التحميل
+        self.active_upload_files.add(file_path)
+        try:
+            await update.callback_query.edit_message_text("📥 جاري تحميل الفيديو...")
+            os.makedirs(Config.DOWNLOAD_PATH, exist_ok=True)
+            telegram_file = await context.bot.get_file(video_info['file_id'])
+            await telegram_file.download_to_drive(file_path)
+            return file_path
+        except Exception as e:
+            logger.error(f"خطأ في تحميل الفيديو: {e}")
+            self._discard_spool_file(file_path)
+            await update.callback_query.edit_message_text(
+                "❌ تعذر تحميل الفيديو، اختر مستوى الخصوصية مرة أخرى.",
+                reply_markup=reply_markup
+            )
+            return None
+
+    async def _enqueue_durable_upload(self, update: Update, user_id: int, job_data: Dict):
+        """إضافة الرفع إلى جدول upload_jobs لينفذه أحد عمال upload_worker.py"""
+        message = update.callback_query.message
+        payload = json.dumps(
+            dict(job_data, chat_id=message.chat_id, message_id=message.message_id),
+            ensure_ascii=False
+        )
+        job_id = await self.adb.enqueue_upload_job(user_id, payload)
+        if job_id is None:
+            await update.callback_query.edit_message_text(
+                "❌ تعذرت إضافة الفيديو إلى طابور الرفع، اختر مستوى الخصوصية مرة أخرى.",
+                reply_markup=message.reply_markup
+            )
+            return
+        
+        # إزالة البيانات المؤقتة حتى لا يُرفع الفيديو مرتين
+        await self.state_store.delete(user_id)
+        
+        position = await self.adb.count_upload_jobs_ahead(job_id) + 1
+        await update.callback_query.edit_message_text(
+            f"📤 تمت إضافة الفيديو إلى طابور الرفع (الترتيب: {position})..."
+        )
+
+    def _quota_reset_text(self) -> str:
+        """وقت تصفير حصة YouTube القادم للعرض على المستخدم"""
+        return f"{self.quota.reset_time():%H:%M} UTC"
+
+    async def _quota_wait_text(self, operation: str) -> Tuple[str, str]:
+        """سبب تأجيل الطلب ووقت المحاولة التالية؛ نفاد الحصة فقط عند رفض رصيد اليوم"""
+        if await self.credential_pool.exhausted(operation):
+            return "تم استهلاك حصة YouTube اليومية", self._quota_reset_text()
+        return "طلبات YouTube كثيرة حالياً", "قليل"
+
+    @staticmethod
+    def _upload_session_key(user_id: int, video_info: Dict) -> str:
+        return f"{user_id}_{video_info['file_unique_id']}"
+
+    def _perform_upload(self, credentials_key, credentials: Credentials, body: Dict, file_path: str,
+                        session_key: str, user_id: int, progress_callback,
+                        retry_state: Optional[RetryState] = None,
+                        cancel_event: Optional[threading.Event] = None) -> Dict:
+        """تنفيذ الرفع الفعلي إلى YouTube (يعمل داخل خيط منفصل)"""
+        # رفع الفيديو على أجزاء مع إمكانية الاستئناف
+        with self.youtube_clients.client(credentials_key, credentials) as youtube:
+            return self.chunked_uploader.upload(
+                youtube, body, file_path, session_key, user_id, progress_callback, retry_state,
+                cancel_event
+            )
+
+    def _perform_stream_upload(self, credentials_key, credentials: Credentials, body: Dict, file_url: str,
+                               file_size: Optional[int], loop: asyncio.AbstractEventLoop,
+                               progress_callback, retry_state: Optional[RetryState] = None,
+                               cancel_event: Optional[threading.Event] = None) -> Dict:
+        """بث الفيديو من تلقرام إلى YouTube دون حفظه على القرص (يعمل داخل خيط منفصل)"""
+        chunk_size = self.chunked_uploader.chunk_size
+        
+        # مخزن يتسع لجزأين: الجزء الجاري رفعه والجزء التالي أثناء تحميله
+        buffer = RingBuffer(capacity=2 * chunk_size)
+        media = StreamingMediaUpload(buffer, file_size, chunk_size)
+        
+        # التحميل يجري في حلقة الأحداث بالتوازي مع الرفع في هذا الخيط
+        producer = asyncio.run_coroutine_threadsafe(pump_telegram_file(file_url, buffer), loop)
+        
+        try:
+            with self.youtube_clients.client(credentials_key, credentials) as youtube:
+                response = self.chunked_uploader.upload_stream(
+                    youtube, body, media, progress_callback, retry_state, cancel_event
+                )
+        except Exception as e:
+            buffer.abort(e)
+            raise
+        
+        producer.result()
+        return response
+
+    def _make_progress_callback(self, edit_message, loop: asyncio.AbstractEventLoop):
+        """إنشاء دالة تقدم تحدّث رسالة الحالة من خيط الرفع كل 10%"""
+        last_step = {'value': -1}
+        
+        def progress_callback(uploaded: int, total: int):
+            if not total:
+                return
+            step = int(uploaded * 100 / total) // 10
+            if step == last_step['value']:
+                return
+            last_step['value'] = step
+            asyncio.run_coroutine_threadsafe(
+                edit_message(f"📤 جاري رفع الفيديو إلى YouTube... {step * 10}%"),
+                loop
+            )
+        
+        return progress_callback
+
+    async def _on_upload_success(self, upload_context: Dict, response: Dict):
+        """حفظ السجل وتحديث رسالة الحالة بعد نجاح الرفع"""
+        await self.credential_pool.release(upload_context['credential'])
+        video_info = upload_context['video_info']
+        video_id = response['id']
+        video_url = f"https://youtube.com/watch?v={video_id}"
+        
+        # حفظ سجل الرفع الناجح
+        upload_data = {
+            'user_id': upload_context['user_id'],
+            'video_title': video_info['title'],
+            'video_description': video_info['description'],
+            'video_id': video_id,
+            'video_url': video_url,
+            'file_size': video_info.get('file_size'),
+            'duration': video_info.get('duration'),
+            'privacy_status': upload_context['privacy'],
+            'upload_status': 'success',
+            'channel_id': upload_context['channel_id'],
+            'channel_name': upload_context['channel_name'],
+            'attempts': upload_context['retry'].attempts
+        }
+        
+        await self.upload_log_sink.add(upload_data)
+        self._discard_spool_file(video_info['file_path'])
+        
+        # رسالة النجاح
+        success_message = f"""
 ✅ تم رفع الفيديو بنجاح!
 
 📹 العنوان: {video_info['title']}
 🔗 رابط الفيديو: {video_url}
-🔒 الخصوصية: {privacy}
-📺 القناة: {channel_name}
-            """
-            
-            await update.callback_query.edit_message_text(success_message)
-            
-            # تنظيف الملفات
-            if os.path.exists(video_info['file_path']):
-                os.remove(video_info['file_path'])
-            
-            # إزالة البيانات المؤقتة
-            del self.pending_uploads[user_id]
-            if user_id in self.user_states:
-                del self.user_states[user_id]
-                
-        except Exception as e:
-            logger.error(f"خطأ في رفع الفيديو: {e}")
-            
-            # حفظ سجل الخطأ
-            upload_data = {
-                'user_id': user_id,
-                'video_title': video_info.get('title', 'Unknown'),
-                'video_description': video_info.get('description', ''),
-                'file_size': video_info.get('file_size'),
-                'duration': video_info.get('duration'),
-                'privacy_status': privacy,
-                'upload_status': f'error',
-                'error_message': str(e),
-                'channel_id': channel_id,
-                'channel_name': channel_name
-            }
-            
-            self.db.log_upload(upload_data)
+🔒 الخصوصية: {upload_context['privacy']}
+📺 القناة: {upload_context['channel_name']}
+        """
         
-            await update.callback_query.edit_message_text(
-                "❌ حدث خطأ في رفع الفيديو إلى YouTube. حاول مرة أخرى."
+        await upload_context['edit_message'](success_message)
+
+    async def _on_upload_error(self, upload_context: Dict, error: Exception):
+        """حفظ سجل الخطأ وإبلاغ المستخدم بعد فشل الرفع"""
+        video_info = upload_context['video_info']
+        if isinstance(error, UploadCancelledError):
+            # أُوقف الرفع لإيقاف البوت: ليس فشلاً لبيانات المصادقة ولا نتيجة تُسجل
+            logger.warning(f"⚠️ {error}")
+            await self.credential_pool.release(upload_context['credential'])
+            self._discard_spool_file(video_info['file_path'])
+            await upload_context['edit_message'](
+                f"⏸️ توقف الرفع بسبب إعادة تشغيل البوت. {await self._resend_hint(upload_context)}"
             )
+            return
+        
+        logger.error(f"خطأ في رفع الفيديو: {error}")
+        await self.credential_pool.release(upload_context['credential'], error)
+        
+        # نوع الخطأ يحدد حالة السجل: error (دائم)، error_retryable (بعد استنفاد
+        # إعادة المحاولات) أو error_quota (نفاد الحصة)
+        kind = classify_error(error)
+        
+        # حفظ سجل الخطأ
+        upload_data = {
+            'user_id': upload_context['user_id'],
+            'video_title': video_info.get('title', 'Unknown'),
+            'video_description': video_info.get('description', ''),
+            'file_size': video_info.get('file_size'),
+            'duration': video_info.get('duration'),
+            'privacy_status': upload_context['privacy'],
+            'upload_status': 'error' if kind not in (QUOTA, RETRYABLE) else f'error_{kind}',
+            'error_message': str(error),
+            'channel_id': upload_context['channel_id'],
+            'channel_name': upload_context['channel_name'],
+            'attempts': upload_context['retry'].attempts
+        }
+        
+        await self.upload_log_sink.add(upload_data)
+        self._discard_spool_file(video_info['file_path'])
+        
+        if kind == QUOTA:
+            message = f"⏳ تم استهلاك حصة YouTube اليومية، أعد إرسال الفيديو بعد {self._quota_reset_text()}."
+        elif kind == RETRYABLE:
+            message = (
+                f"❌ تعذر الوصول إلى YouTube بعد {upload_context['retry'].attempts} محاولات. "
+                f"{await self._resend_hint(upload_context)}"
+            )
+        else:
+            message = "❌ حدث خطأ في رفع الفيديو إلى YouTube. حاول مرة أخرى."
+        await upload_context['edit_message'](message)
+
+    async def _resend_hint(self, upload_context: Dict) -> str:
+        """طلب إعادة إرسال الفيديو، مع الاستئناف فقط إذا حُفظت جلسة رفعه (لا تُحفظ في البث)"""
+        session_key = self._upload_session_key(upload_context['user_id'], upload_context['video_info'])
+        if await self.adb.has_upload_session(session_key):
+            return "أعد إرسال الفيديو لاستئناف الرفع من حيث توقف."
+        return "أعد إرسال الفيديو لبدء رفعه من جديد."
+
+    def _discard_spool_file(self, file_path: Optional[str]):
+        """حذف ملف الفيديو المحمّل بعد انتهاء رفعه بنجاح أو بفشل"""
+        if not file_path:
+            return
+        self.active_upload_files.discard(file_path)
+        self.spool.release(file_path)
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"خطأ في حذف الملف {file_path}: {e}")
+
+    async def _spool_file_owned(self, file_path: str) -> bool:
+        """هل الملف في طابور الرفع أو ينتظر إكمال المستخدم لبيانات الفيديو"""
+        if file_path in self.active_upload_files:
+            return True
+        # اسم الملف يبدأ بمعرف المستخدم: <user_id>_<file_id>.mp4
+        owner = os.path.basename(file_path).split('_', 1)[0]
+        if not owner.isdigit():
+            return False
+        state = await self.state_store.get(int(owner))
+        return bool(state and state.get('video', {}).get('file_path') == file_path)
 
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """معالج الأزرار"""
@@ -587,22 +1164,135 @@ class YouTubeTelegramBot:
             await self.show_status(update, context)
         elif data == 'select_channel':
             await self.select_channel(update, context)
+        elif data == 'upload_history':
+            await self.show_upload_history(update, context)
+        elif data.startswith('history_older_'):
+            await self.show_upload_history(update, context, before=self._parse_history_cursor(data[len('history_older_'):]))
+        elif data.startswith('history_newer_'):
+            await self.show_upload_history(update, context, after=self._parse_history_cursor(data[len('history_newer_'):]))
         elif data.startswith('channel_'):
             await self.handle_channel_selection(update, context, data)
         elif data.startswith('privacy_'):
             privacy = data.split('_')[1]
             await self.upload_to_youtube(update, context, privacy)
 
+    async def stop_uploads(self, application: Optional[Application] = None):
+        """إيقاف قبول الرفع وإنهاء الجاري منه قبل إغلاق اتصال تلقرام
+
+        يُنتظر الرفع حتى UPLOAD_SHUTDOWN_TIMEOUT ثانية، ثم يتوقف كل رفع عند الجزء التالي
+        (والمنتظر قبل بدئه) مع بقاء جلسته ليستأنفها المستخدم بإعادة إرسال الفيديو.
+        """
+        if await self.upload_executor.drain(Config.UPLOAD_SHUTDOWN_TIMEOUT):
+            return
+        logger.warning("⚠️ لم تنتهِ عمليات الرفع قبل مهلة الإيقاف، سيتم إيقافها عند الجزء التالي")
+        self.upload_cancel.set()
+        if not await self.upload_executor.drain(UPLOAD_CANCEL_GRACE):
+            logger.warning("⚠️ بقيت عمليات رفع لم تتوقف عند إيقاف البوت")
+
+    async def shutdown(self, application: Optional[Application] = None):
+        """إغلاق الموارد بعد إيقاف التطبيق؛ الرفع أُوقف قبله عبر stop_uploads()"""
+        await self.upload_executor.shutdown(wait=False)
+        await self.upload_log_sink.close()
+        await self.adb.close()
+
+    def register_handlers(self, application: Application):
+        """إضافة معالجات البوت إلى التطبيق (وضع polling ووضع webhook)"""
+        application.add_handler(CommandHandler("start", self.start_command))
+        application.add_handler(CommandHandler("export", self.export_command))
+        application.add_handler(CallbackQueryHandler(self.button_handler))
+        application.add_handler(MessageHandler(filters.VIDEO, self.handle_video))
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text_input))
+
+    def register_jobs(self, application: Application, maintenance: bool = True):
+        """جدولة المهام الدورية على JobQueue الخاص بالتطبيق
+
+        maintenance=False يستثني مهام قاعدة البيانات المشتركة (مثل حذف السجلات القديمة)
+        عند تشغيل عدة عمليات حتى تتولاها عملية واحدة فقط.
+        """
+        if application.job_queue is None:
+            logger.warning("⚠️ JobQueue غير متاح، ثبّت python-telegram-bot[job-queue] لتفعيل المهام الدورية")
+            return
+        # أول فحص عند بدء التشغيل لحذف ملفات التشغيل السابق المتروكة
+        application.job_queue.run_repeating(
+            self.orphan_reaper.run_job,
+            interval=Config.ORPHAN_REAPER_INTERVAL,
+            first=5,
+            name='orphan_reaper'
+        )
+        application.job_queue.run_repeating(
+            self._purge_expired_states,
+            interval=3600,
+            first=60,
+            name='state_purge'
+        )
+        if maintenance:
+            application.job_queue.run_repeating(
+                self._purge_stale_upload_sessions,
+                interval=3600,
+                first=120,
+                name='upload_session_purge'
+            )
+            # أقسام الأشهر القادمة مستقلة عن حذف السجلات حتى لا تتراكم السجلات في القسم
+            # الافتراضي (لا تفعل شيئاً إذا لم يكن upload_logs مقسّماً)
+            application.job_queue.run_repeating(
+                self.log_retention.partitions_job,
+                interval=86400,
+                first=30,
+                name='upload_log_partitions'
+            )
+        if maintenance and Config.LOG_RETENTION_DAYS > 0:
+            application.job_queue.run_repeating(
+                self.log_retention.run_job,
+                interval=Config.LOG_RETENTION_INTERVAL,
+                first=60,
+                name='log_retention'
+            )
+
+    async def _purge_expired_states(self, context: ContextTypes.DEFAULT_TYPE):
+        """حذف حالات المحادثة المنتهية"""
+        purged = await self.state_store.purge_expired()
+        if purged:
+            logger.info(f"🧹 تم حذف {purged} حالة محادثة منتهية")
+        await self.update_dedup.purge_expired()
+
+    async def _purge_stale_upload_sessions(self, context: ContextTypes.DEFAULT_TYPE):
+        """حذف جلسات الرفع القابلة للاستئناف التي لم تكتمل خلال UPLOAD_SESSION_MAX_AGE"""
+        cutoff = datetime.utcnow() - timedelta(seconds=Config.UPLOAD_SESSION_MAX_AGE)
+        purged = await self.adb.delete_stale_upload_sessions(cutoff)
+        if purged:
+            logger.info(f"🧹 تم حذف {purged} جلسة رفع متروكة")
+
+    def build_webhook_application(self, maintenance: bool = True) -> Application:
+        """إنشاء التطبيق لوضع webhook: التحديثات تُعالج في الخلفية
+
+        يقبل application.update_processor.admit() حتى WEBHOOK_QUEUE_SIZE تحديثاً قيد
+        الانتظار أو المعالجة، ويُرفض ما بعدها حتى يعيد تلقرام إرساله.
+        """
+        application = Application.builder()\
+            .token(self.telegram_token)\
+            .concurrent_updates(PerUserUpdateProcessor(
+                Config.WEBHOOK_CONCURRENCY, max_admitted=Config.WEBHOOK_QUEUE_SIZE
+            ))\
+            .build()
+        self.register_handlers(application)
+        self.register_jobs(application, maintenance)
+        return application
+
     def run(self):
         """تشغيل البوت"""
         # إنشاء التطبيق
-        application = Application.builder().token(self.telegram_token).build()
+        # الرفع يُوقف بعد إيقاف التطبيق وقبل إغلاق اتصاله ليتمكن من إبلاغ المستخدمين
+        builder = Application.builder().token(self.telegram_token)\
+            .post_stop(self.stop_uploads)\
+            .post_shutdown(self.shutdown)
+        if Config.POLLING_CONCURRENCY > 1:
+            # مستخدمون مختلفون بالتوازي، وتحديثات كل مستخدم بالترتيب
+            builder = builder.concurrent_updates(PerUserUpdateProcessor(Config.POLLING_CONCURRENCY))
+        application = builder.build()
         
         # إضافة المعالجات
-        application.add_handler(CommandHandler("start", self.start_command))
-        application.add_handler(CallbackQueryHandler(self.button_handler))
-        application.add_handler(MessageHandler(filters.VIDEO, self.handle_video))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text_input))
+        self.register_handlers(application)
+        self.register_jobs(application)
         
         # بدء التشغيل
         print("🤖 بدء تشغيل بوت رفع الفيديوهات إلى YouTube...")
@@ -0,0 +1,70 @@
+"""
+تجاهل تحديثات تلقرام المكررة حسب update_id
+"""
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDeduplicator:
+    """نافذة متحركة لآخر معرفات التحديثات المستلمة
+
+    يعيد تلقرام إرسال التحديث إذا تأخر الرد أو فشل، فيُتجاهل أي update_id ورد ضمن
+    آخر window تحديث. عند تفعيل shared تُسجل المعرفات أيضاً في جدول processed_updates
+    حتى تتشارك النافذة جميع عمليات webhook.
+    """
+
+    def __init__(self, window: int = 10000, adb=None, shared: bool = False, ttl: int = 86400):
+        self.window = window
+        self.adb = adb
+        self.shared = shared and adb is not None
+        self.ttl = timedelta(seconds=ttl)
+        self._seen: 'OrderedDict[int, None]' = OrderedDict()
+        self._received = 0
+        self._duplicates = 0
+
+    async def accept(self, update_id: int) -> bool:
+        """True إذا كان التحديث جديداً ويجب معالجته"""
+        self._received += 1
+        if update_id in self._seen:
+            self._duplicates += 1
+            return False
+        
+        if self.shared:
+            # عند تعذر الوصول إلى قاعدة البيانات يُقبل التحديث بدلاً من إسقاطه
+            if await self.adb.mark_update_received(update_id) is False:
+                self._remember(update_id)
+                self._duplicates += 1
+                return False
+        
+        self._remember(update_id)
+        return True
+
+    async def forget(self, update_id: int):
+        """إلغاء تسجيل تحديث لم تتم معالجته (مثلاً عند رفضه لامتلاء الطابور)"""
+        self._seen.pop(update_id, None)
+        if self.shared:
+            await self.adb.forget_update(update_id)
+
+    def _remember(self, update_id: int):
+        self._seen[update_id] = None
+        while len(self._seen) > self.window:
+            self._seen.popitem(last=False)
+
+    async def purge_expired(self) -> int:
+        """حذف المعرفات المشتركة الأقدم من مدة إعادة الإرسال"""
+        if not self.shared:
+            return 0
+        return await self.adb.delete_processed_updates_before(datetime.utcnow() - self.ttl)
+
+    def stats(self) -> Dict:
+        """عدادات التحديثات المستلمة والمكررة"""
+        return {
+            'received': self._received,
+            'duplicates': self._duplicates,
+            'window': len(self._seen),
+            'shared': self.shared
+        }
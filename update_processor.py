@@ -0,0 +1,116 @@
+"""
+معالجة تحديثات المستخدمين المختلفين بالتوازي مع الحفاظ على ترتيب تحديثات كل مستخدم
+"""
+import asyncio
+import logging
+from typing import Awaitable, Dict, Hashable, Optional, Set
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """مسار تسلسلي لكل مستخدم وحد أعلى مشترك للمعالجات الجارية
+
+    تحديثات المستخدم الواحد تُنفذ بترتيب وصولها (خطوات العنوان والوصف والخصوصية
+    في handle_text_input تعتمد على ذلك)، بينما تُعالج تحديثات المستخدمين الآخرين
+    بالتوازي حتى concurrency معالجاً.
+
+    الحد المشترك يشمل المعالجات الجارية فقط: التحديثات المنتظرة في مسار مستخدمها لا
+    تحجز منه شيئاً، فلا يمنع مستخدم لديه تحديثات كثيرة منتظرة خلف معالج طويل (مثل
+    تحميل فيديو) بقية المستخدمين. لذلك لا يُستخدم حد الفئة الأساسية.
+
+    max_admitted يحد التحديثات المستلمة عبر webhook من لحظة قبولها (admit) حتى انتهاء
+    معالجتها؛ فالتطبيق يسحب كل تحديث من update_queue فوراً عند تفعيل المعالجة
+    المتوازية ولا يمتلئ الطابور أبداً.
+
+    أدوات التزامن تُنشأ في initialize() داخل حلقة أحداث التطبيق، لا عند إنشاء المعالج.
+    """
+
+    def __init__(self, concurrency: int, max_admitted: Optional[int] = None):
+        super().__init__(concurrency)
+        self.concurrency = concurrency
+        self.max_admitted = max_admitted
+        self._running: Optional[asyncio.BoundedSemaphore] = None
+        self._lanes: Dict[Hashable, asyncio.Lock] = {}
+        self._lane_users: Dict[Hashable, int] = {}
+        self._admitted: Set[int] = set()
+        self._slot_freed: Optional[asyncio.Event] = None
+
+    @property
+    def admitted(self) -> int:
+        """التحديثات المقبولة التي لم تنتهِ معالجتها"""
+        return len(self._admitted)
+
+    def has_capacity(self) -> bool:
+        return self.max_admitted is None or len(self._admitted) < self.max_admitted
+
+    def admit(self, update: Update) -> bool:
+        """حجز مكان للتحديث قبل إضافته إلى update_queue، False إذا اكتمل الحد"""
+        if not self.has_capacity():
+            return False
+        self._admitted.add(update.update_id)
+        return True
+
+    async def wait_for_capacity(self):
+        """انتظار انتهاء معالجة تحديث مقبول إذا اكتمل الحد"""
+        while not self.has_capacity():
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+
+    def _release(self, update: object):
+        if isinstance(update, Update) and update.update_id in self._admitted:
+            self._admitted.discard(update.update_id)
+            if self._slot_freed is not None:
+                self._slot_freed.set()
+
+    @staticmethod
+    def _lane_key(update: object) -> Optional[Hashable]:
+        """المستخدم صاحب التحديث، أو المحادثة إن لم يوجد مستخدم"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return ('chat', update.effective_chat.id)
+        return None
+
+    async def process_update(self, update: object, coroutine: Awaitable) -> None:
+        # دون حد الفئة الأساسية، فهو يُحجز قبل انتظار مسار المستخدم
+        await self.do_process_update(update, coroutine)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        try:
+            await self._process_in_lane(update, coroutine)
+        finally:
+            self._release(update)
+
+    async def _process_in_lane(self, update: object, coroutine: Awaitable) -> None:
+        key = self._lane_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+        
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = asyncio.Lock()
+        self._lane_users[key] = self._lane_users.get(key, 0) + 1
+        try:
+            # انتظار دور المستخدم أولاً ثم مكان معالجة عام
+            async with lane:
+                async with self._running:
+                    await coroutine
+        finally:
+            self._lane_users[key] -= 1
+            if not self._lane_users[key]:
+                del self._lane_users[key]
+                del self._lanes[key]
+
+    async def initialize(self) -> None:
+        self._running = asyncio.BoundedSemaphore(self.concurrency)
+        self._slot_freed = asyncio.Event()
+
+    async def shutdown(self) -> None:
+        pass
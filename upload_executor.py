@@ -0,0 +1,129 @@
+"""
+منفذ عمليات الرفع في الخلفية
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UploadQueueFullError(Exception):
+    """طابور الرفع ممتلئ"""
+
+
+class UploadJob:
+    """مهمة رفع في الطابور"""
+
+    def __init__(self, func: Callable[..., Any], args: tuple,
+                 on_complete: Optional[Callable[[Any], Awaitable[None]]] = None,
+                 on_error: Optional[Callable[[Exception], Awaitable[None]]] = None):
+        self.func = func
+        self.args = args
+        self.on_complete = on_complete
+        self.on_error = on_error
+
+
+class UploadExecutor:
+    """مجمع عمال محدود يغذيه طابور مهام داخل العملية
+
+    تُنفذ الدوال المتزامنة (مثل ``execute()`` الخاص بـ httplib2) داخل خيوط منفصلة
+    حتى لا تتوقف حلقة الأحداث، ثم تُستدعى دوال الإكمال داخل حلقة الأحداث.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue_size: int = 20):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._active = 0
+        # لا تُقبل مهام جديدة بعد بدء الإيقاف
+        self._closed = False
+        self._completed = 0
+        self._failed = 0
+
+    def _ensure_started(self):
+        """تشغيل العمال عند أول مهمة داخل حلقة الأحداث الحالية"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        for index in range(self.max_workers):
+            self._workers.append(asyncio.create_task(self._worker(index)))
+        logger.info(f"🚀 تم تشغيل {self.max_workers} عامل رفع")
+
+    async def submit(self, func: Callable[..., Any], *args,
+                     on_complete: Optional[Callable[[Any], Awaitable[None]]] = None,
+                     on_error: Optional[Callable[[Exception], Awaitable[None]]] = None) -> int:
+        """إضافة مهمة رفع إلى الطابور وإرجاع ترتيبها فوراً"""
+        if self._closed:
+            raise UploadQueueFullError("طابور الرفع متوقف لإيقاف البوت")
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(UploadJob(func, args, on_complete, on_error))
+        except asyncio.QueueFull:
+            raise UploadQueueFullError(f"طابور الرفع ممتلئ ({self.max_queue_size})")
+        return self._queue.qsize()
+
+    async def _worker(self, index: int):
+        """حلقة العامل: سحب المهام وتنفيذها في الخيوط"""
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            self._active += 1
+            try:
+                result = await loop.run_in_executor(self._pool, job.func, *job.args)
+            except Exception as e:
+                self._failed += 1
+                logger.error(f"خطأ في مهمة الرفع (العامل {index}): {e}")
+                if job.on_error:
+                    await self._run_callback(job.on_error, e)
+            else:
+                self._completed += 1
+                if job.on_complete:
+                    await self._run_callback(job.on_complete, result)
+            finally:
+                self._active -= 1
+                self._queue.task_done()
+
+    @staticmethod
+    async def _run_callback(callback: Callable[[Any], Awaitable[None]], value: Any):
+        """تنفيذ دالة الإكمال دون إيقاف العامل عند فشلها"""
+        try:
+            await callback(value)
+        except Exception as e:
+            logger.error(f"خطأ في دالة إكمال الرفع: {e}")
+
+    def stats(self) -> Dict:
+        """حالة المنفذ الحالية"""
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'active': self._active,
+            'completed': self._completed,
+            'failed': self._failed,
+            'max_workers': self.max_workers,
+            'max_queue_size': self.max_queue_size
+        }
+
+    async def drain(self, timeout: float) -> bool:
+        """إيقاف قبول المهام وانتظار انتهاء المهام الحالية حتى timeout ثانية"""
+        self._closed = True
+        if self._queue is None:
+            return True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def shutdown(self, wait: bool = True):
+        """إيقاف العمال بعد إنهاء المهام المتبقية"""
+        if self._queue is not None and wait:
+            await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._pool.shutdown(wait=wait)
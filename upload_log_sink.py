@@ -0,0 +1,110 @@
+"""
+كتابة سجلات الرفع المؤجلة على دفعات
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class UploadLogSink:
+    """تخزين سجلات الرفع في الذاكرة وكتابتها بعبارة INSERT واحدة متعددة الصفوف
+
+    تُكتب الدفعة عند بلوغ batch_size سجلاً أو بعد flush_interval ثانية، وعند إيقاف
+    البوت عبر close(). في الوضع durable تُكتب كل عملية فوراً كما في السابق.
+
+    إذا تعذر الاتصال بقاعدة البيانات تبقى الدفعة في الذاكرة (حتى max_buffer سجل)، وإذا
+    فشلت مع توفر الاتصال تُكتب سجلاتها فرادى ويُسقط السجل غير الصالح وحده.
+    """
+
+    def __init__(self, adb, batch_size: int = 50, flush_interval: float = 5.0,
+                 durable: bool = False, max_buffer: int = 5000):
+        self.adb = adb
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durable = durable
+        self.max_buffer = max_buffer
+        self._buffer: List[Dict] = []
+        self._flush_event: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        """تشغيل مهمة الكتابة الدورية داخل حلقة الأحداث الحالية"""
+        if self._task is None:
+            self._flush_event = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, upload_data: Dict) -> bool:
+        """إضافة سجل رفع دون انتظار قاعدة البيانات"""
+        if self.durable:
+            return await self.adb.log_upload(upload_data)
+
+        self._ensure_started()
+        # وقت الرفع هو وقت الحدث وليس وقت الكتابة
+        if upload_data.get('upload_time') is None:
+            upload_data = dict(upload_data, upload_time=datetime.utcnow())
+        self._buffer.append(upload_data)
+        if len(self._buffer) >= self.batch_size:
+            self._flush_event.set()
+        return True
+
+    async def _run(self):
+        """حلقة الكتابة حسب الحجم أو الوقت"""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    async def flush(self) -> bool:
+        """كتابة جميع السجلات المخزنة"""
+        if not self._buffer:
+            return True
+
+        async with self._flush_lock:
+            records, self._buffer = self._buffer, []
+            if await self.adb.log_uploads(records):
+                return True
+
+            if not await self.adb.test_connection():
+                # إعادة السجلات إلى المخزن لمحاولة لاحقة مع عدم تجاوز الحد الأقصى
+                self._buffer = records + self._buffer
+                dropped = len(self._buffer) - self.max_buffer
+                if dropped > 0:
+                    logger.error(f"❌ تم إسقاط {dropped} سجل رفع بعد فشل الكتابة المتكرر")
+                    self._buffer = self._buffer[dropped:]
+                return False
+
+            # قاعدة البيانات متاحة، فسجل غير صالح أفشل الدفعة: الكتابة فرادى تعزله
+            # حتى لا يوقف بقية السجلات
+            written = True
+            for record in records:
+                if not await self.adb.log_upload(record):
+                    written = False
+                    logger.error(
+                        f"❌ تم إسقاط سجل رفع تعذرت كتابته للمستخدم {record.get('user_id')} "
+                        f"({record.get('video_title')!r:.80})"
+                    )
+            return written
+
+    def pending(self) -> int:
+        """عدد السجلات التي لم تُكتب بعد"""
+        return len(self._buffer)
+
+    async def close(self):
+        """إيقاف الكتابة الدورية وكتابة ما تبقى"""
+        if self._task is None:
+            return
+        # الإلغاء بعد انتهاء أي كتابة جارية حتى لا تضيع دفعة أثناء إرسالها
+        async with self._flush_lock:
+            self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
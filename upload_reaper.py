@@ -0,0 +1,62 @@
+"""
+حذف ملفات الفيديو المتروكة في مجلد التحميل
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class OrphanReaper:
+    """فحص دوري لمجلد التحميل وحذف الملفات التي لا يملكها رفع منتظر أو جارٍ
+
+    تُعد الملفات متروكة عندما تنتهي صلاحية حالة المستخدم (لم يكمل إدخال العنوان أو
+    الوصف أو الخصوصية) أو عند إعادة تشغيل البوت. الملفات المعدلة خلال grace ثانية
+    تُتجاهل لأنها قد تكون قيد التحميل ولم تُسجَّل حالتها بعد.
+    """
+
+    def __init__(self, download_path: str, is_owned: Callable[[str], Awaitable[bool]],
+                 grace: float = 600, on_removed: Optional[Callable[[str], None]] = None):
+        self.download_path = download_path
+        self.is_owned = is_owned
+        self.grace = grace
+        self.on_removed = on_removed
+
+    def _candidates(self) -> List[str]:
+        """ملفات المجلد الأقدم من فترة السماح"""
+        if not os.path.isdir(self.download_path):
+            return []
+        threshold = time.time() - self.grace
+        with os.scandir(self.download_path) as entries:
+            return [
+                entry.path for entry in entries
+                if entry.is_file() and entry.stat().st_mtime < threshold
+            ]
+
+    async def reap(self) -> int:
+        """حذف الملفات المتروكة وإرجاع عددها"""
+        removed = 0
+        for file_path in await asyncio.to_thread(self._candidates):
+            try:
+                if await self.is_owned(file_path):
+                    continue
+                await asyncio.to_thread(os.remove, file_path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"خطأ في حذف الملف المتروك {file_path}: {e}")
+                continue
+            if self.on_removed:
+                self.on_removed(file_path)
+        
+        if removed:
+            logger.info(f"🧹 تم حذف {removed} ملف فيديو متروك من {self.download_path}")
+        return removed
+
+    async def run_job(self, context=None):
+        """نقطة الدخول من JobQueue الخاص بالبوت"""
+        await self.reap()
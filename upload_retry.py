@@ -0,0 +1,80 @@
+"""
+تصنيف أخطاء الرفع إلى YouTube وإعادة المحاولة بتأخير أسي عشوائي
+"""
+import ssl
+import socket
+import random
+import logging
+import httplib2
+from google.auth.exceptions import TransportError
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+# أنواع أخطاء الرفع
+RETRYABLE = 'retryable'
+QUOTA = 'quota'
+PERMANENT = 'permanent'
+
+# أسباب أخطاء YouTube التي تعني نفاد حصة المشروع حتى التصفير اليومي
+QUOTA_ERROR_REASONS = ('quotaExceeded', 'dailyLimitExceeded')
+# أسباب 403 المؤقتة (تجاوز معدل الطلبات وليس الحصة اليومية)
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+RETRYABLE_EXCEPTIONS = (
+    httplib2.HttpLib2Error, TransportError, ConnectionError, TimeoutError, socket.timeout, ssl.SSLError
+)
+
+
+def _error_content(error: HttpError) -> str:
+    content = error.content
+    return content.decode('utf-8', 'replace') if isinstance(content, bytes) else str(content)
+
+
+def _has_reason(error: HttpError, reasons) -> bool:
+    content = _error_content(error)
+    return any(f'"{reason}"' in content for reason in reasons)
+
+
+def is_quota_error(error: Exception) -> bool:
+    """هل الخطأ رفض من YouTube بسبب نفاد الحصة اليومية"""
+    return isinstance(error, HttpError) and error.resp.status == 403 \
+        and _has_reason(error, QUOTA_ERROR_REASONS)
+
+
+def classify_error(error: Exception) -> str:
+    """retryable للأخطاء المؤقتة (5xx و 429 وانقطاع الاتصال)، quota لنفاد الحصة، وإلا permanent"""
+    if isinstance(error, HttpError):
+        if is_quota_error(error):
+            return QUOTA
+        if error.resp.status in RETRYABLE_STATUSES:
+            return RETRYABLE
+        if error.resp.status == 403 and _has_reason(error, RATE_LIMIT_REASONS):
+            return RETRYABLE
+        return PERMANENT
+    if isinstance(error, RETRYABLE_EXCEPTIONS):
+        return RETRYABLE
+    return PERMANENT
+
+
+class RetryPolicy:
+    """تأخير أسي مع عشوائية كاملة: عشوائي بين 0 و min(max_delay, base_delay * 2^(n-1))"""
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, failures: int) -> float:
+        """مدة الانتظار بعد الفشل رقم failures المتتالي"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (failures - 1)))
+
+    def should_retry(self, error: Exception, failures: int) -> bool:
+        return failures < self.max_attempts and classify_error(error) == RETRYABLE
+
+
+class RetryState:
+    """عدد محاولات إرسال عملية رفع واحدة (يُحفظ في سجل الرفع)"""
+
+    def __init__(self, attempts: int = 1):
+        self.attempts = attempts
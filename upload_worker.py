@@ -0,0 +1,339 @@
+"""
+عامل رفع مستقل يسحب المهام من جدول upload_jobs وينفذ التحميل والرفع
+
+يمكن تشغيل أي عدد من العمال على خادم واحد أو أكثر بجانب البوت عند ضبط
+UPLOAD_QUEUE=database:
+
+    python upload_worker.py
+"""
+import os
+import re
+import json
+import socket
+import time
+import asyncio
+import logging
+import functools
+import threading
+from typing import Dict, Optional, Set
+from telegram import Bot
+from dotenv import load_dotenv
+from config import Config
+from credential_pool import PooledCredential
+from database import UPLOAD_JOB_LEASED
+from resumable_upload import UploadCancelledError
+from upload_reaper import OrphanReaper
+from upload_retry import RetryState, classify_error, QUOTA, RETRYABLE
+from telegram_youtube_bot import YouTubeTelegramBot
+
+logger = logging.getLogger(__name__)
+
+# ملف كل سحب للمهمة: job-<id>-<attempt>.mp4، فلا يتشارك عاملان على نفس الخادم ملفاً واحداً
+JOB_FILE_PATTERN = re.compile(r'job-(\d+)-(\d+)\.mp4')
+
+
+class LeaseLostError(Exception):
+    """لم يعد العامل مالك المهمة (انتهى عقدها وقد يسحبها عامل آخر)"""
+
+
+class UploadWorker:
+    """تنفيذ مهام الرفع الدائمة حتى concurrency مهمة في الوقت نفسه
+
+    يجدد العامل عقد كل مهمة كل ثلث مدة العقد، وإذا فقده يوقف التحميل أو الرفع قبل
+    الجزء التالي ولا يبلغ المستخدم بشيء حتى لا يُرفع الفيديو مرتين. عند فشل الرفع بخطأ
+    مؤقت تعود المهمة إلى الطابور حتى UPLOAD_JOB_MAX_ATTEMPTS محاولة، وتُستأنف من آخر
+    جزء مؤكد لأن جلسات الرفع محفوظة في قاعدة البيانات؛ الأخطاء الدائمة تُفشلها فوراً.
+    """
+
+    def __init__(self, bot: YouTubeTelegramBot, worker_id: str, concurrency: int,
+                 lease_seconds: int, max_attempts: int, poll_interval: float):
+        self.bot = bot
+        self.adb = bot.adb
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.telegram = Bot(bot.telegram_token)
+        self._tasks: Set[asyncio.Task] = set()
+        # لا تُسحب مهام جديدة قبل هذا الوقت عند نفاد حصة YouTube
+        self._quota_wait_until = 0.0
+        # المهام التي بدأ رفعها إلى YouTube (احتُسبت تكلفتها)
+        self._sent: Set[int] = set()
+        self._stopping = asyncio.Event()
+        # ملفات المهام التي انتهى سحبها دون حذفها (مثلاً بعد توقف عامل فجأة)
+        self.orphan_reaper = OrphanReaper(
+            Config.DOWNLOAD_PATH,
+            is_owned=self._job_file_owned,
+            grace=Config.ORPHAN_FILE_GRACE,
+            on_removed=bot.spool.release
+        )
+
+    async def run(self):
+        """سحب المهام وتنفيذها حتى استدعاء stop()"""
+        await self.telegram.initialize()
+        logger.info(f"🚀 عامل الرفع {self.worker_id} يعمل ({self.concurrency} مهام متزامنة)")
+        reaper_task = asyncio.create_task(self._reap_orphans())
+        try:
+            while not self._stopping.is_set():
+                if len(self._tasks) >= self.concurrency:
+                    await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                quota_wait = self._quota_wait_until - time.monotonic()
+                if quota_wait > 0:
+                    await self._sleep(min(quota_wait, self.lease_seconds))
+                    continue
+
+                job = await self.adb.claim_upload_job(self.worker_id, self.lease_seconds, self.max_attempts)
+                if job is None:
+                    abandoned = await self.adb.fail_abandoned_upload_jobs(self.max_attempts)
+                    if abandoned:
+                        logger.warning(f"⚠️ تم إفشال {abandoned} مهمة رفع متروكة")
+                    await self._sleep(self.poll_interval)
+                    continue
+
+                # اختيار بيانات المصادقة وحجز حصتها قبل التحميل؛ عند نفاد حصة جميعها
+                # تعود المهمة إلى الطابور كما هي
+                credential, wait = await self.bot.credential_pool.reserve('videos.insert')
+                if credential is None:
+                    await self.adb.release_upload_job(job['id'], self.worker_id)
+                    self._quota_wait_until = time.monotonic() + wait
+                    logger.info(f"⏳ حصة YouTube غير متاحة، تأجيل سحب المهام {int(wait)} ثانية")
+                    continue
+
+                task = asyncio.create_task(self._process(job, credential))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            reaper_task.cancel()
+            # إنهاء المهام الجارية قبل الإيقاف
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            await self.telegram.shutdown()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def _sleep(self, seconds: float):
+        """انتظار يقطعه stop()"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _reap_orphans(self):
+        """حذف ملفات المهام المتروكة دورياً، أولها عند البدء لملفات التشغيل السابق"""
+        while True:
+            await self.orphan_reaper.reap()
+            await asyncio.sleep(Config.ORPHAN_REAPER_INTERVAL)
+
+    async def _job_file_owned(self, file_path: str) -> bool:
+        """هل الملف يخص سحباً جارياً لمهمته (لهذا العامل أو لعامل آخر على نفس الخادم)"""
+        if file_path in self.bot.active_upload_files:
+            return True
+        match = JOB_FILE_PATTERN.fullmatch(os.path.basename(file_path))
+        if match is None:
+            return False
+        job = await self.adb.get_upload_job(int(match[1]))
+        if job is None:
+            # لا يُحذف الملف إذا تعذر التحقق من مهمته
+            return True
+        return job['status'] in UPLOAD_JOB_LEASED and job['attempts'] == int(match[2])
+
+    async def _keep_lease(self, job_id: int, lease_lost: threading.Event, upload_task: asyncio.Task):
+        """تجديد عقد المهمة طوال تنفيذها، وإيقاف التنفيذ إذا فُقد العقد"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await self.adb.renew_upload_job_lease(job_id, self.worker_id, self.lease_seconds):
+                logger.error(f"❌ فقد العامل {self.worker_id} عقد مهمة الرفع {job_id}، إيقاف تنفيذها")
+                # يوقف خيط الرفع قبل الجزء التالي، وإلغاء المهمة يوقف التحميل
+                lease_lost.set()
+                upload_task.cancel()
+                return
+
+    async def _process(self, job: Dict, credential: PooledCredential):
+        job_id = job['id']
+        payload = json.loads(job['payload'])
+        user_id = job['user_id']
+        video_info = payload['video_info']
+        edit_message = functools.partial(
+            self.telegram.edit_message_text,
+            chat_id=payload['chat_id'],
+            message_id=payload['message_id']
+        )
+        upload_context = {
+            'user_id': user_id,
+            'video_info': video_info,
+            'privacy': payload['privacy'],
+            'channel_id': payload['channel_id'],
+            'channel_name': payload['channel_name'],
+            'credential': credential,
+            # كل سحب للمهمة محاولة، وتضاف إليها إعادات إرسال الأجزاء
+            'retry': RetryState(job['attempts']),
+            'edit_message': edit_message
+        }
+        video_info['file_path'] = None
+
+        lease_lost = threading.Event()
+        upload_task = asyncio.create_task(self._upload(
+            job, credential, payload['body'], video_info, edit_message, upload_context['retry'], lease_lost
+        ))
+        lease_task = asyncio.create_task(self._keep_lease(job_id, lease_lost, upload_task))
+        try:
+            try:
+                response = await upload_task
+            except asyncio.CancelledError:
+                if not lease_lost.is_set():
+                    raise
+                raise LeaseLostError()
+        except (LeaseLostError, UploadCancelledError):
+            await self._abandon(job_id, credential, video_info)
+            return
+        except Exception as e:
+            await self._on_failure(job, credential, upload_context, e)
+            return
+        finally:
+            lease_task.cancel()
+            self._sent.discard(job_id)
+
+        if not await self.adb.finish_upload_job(job_id, self.worker_id, 'done', video_id=response['id']):
+            # اكتمل الرفع بعد أن سحب المهمة عامل آخر؛ هو من يبلغ المستخدم بنتيجتها
+            logger.error(f"❌ رُفع الفيديو {response['id']} لمهمة الرفع {job_id} بعد فقد عقدها")
+            await self.bot.credential_pool.release(credential)
+            self.bot._discard_spool_file(video_info.get('file_path'))
+            return
+        await self._notify(self.bot._on_upload_success(upload_context, response))
+
+    async def _abandon(self, job_id: int, credential: PooledCredential, video_info: Dict):
+        """ترك المهمة لمن سحبها بعد فقد عقدها دون تسجيل نتيجة أو إبلاغ المستخدم"""
+        logger.warning(f"⚠️ تم إيقاف مهمة الرفع {job_id} بعد فقد عقدها")
+        if job_id in self._sent:
+            await self.bot.credential_pool.release(credential)
+        else:
+            await self.bot.credential_pool.refund(credential, 'videos.insert')
+        self.bot._discard_spool_file(video_info.get('file_path'))
+
+    async def _on_failure(self, job: Dict, credential: PooledCredential, upload_context: Dict,
+                          error: Exception):
+        """إعادة المهمة إلى الطابور أو إفشالها حسب نوع الخطأ"""
+        job_id = job['id']
+        video_info = upload_context['video_info']
+        sent = job_id in self._sent
+        kind = classify_error(error)
+        if kind == QUOTA:
+            # تُستبعد بيانات المصادقة حتى التصفير وتنتظر المهمة غيرها دون احتساب محاولة
+            logger.warning(f"⚠️ نفدت حصة YouTube أثناء مهمة الرفع {job_id}، إعادتها إلى الطابور")
+            await self.bot.credential_pool.release(credential, error)
+            self.bot._discard_spool_file(video_info.get('file_path'))
+            if not await self.adb.release_upload_job(job_id, self.worker_id):
+                logger.warning(f"⚠️ مهمة الرفع {job_id} لم تعد لهذا العامل عند إعادتها إلى الطابور")
+        elif (kind == RETRYABLE or not sent) and job['attempts'] < self.max_attempts:
+            logger.warning(f"⚠️ فشلت المحاولة {job['attempts']} لمهمة الرفع {job_id}: {error}")
+            if sent:
+                await self.bot.credential_pool.release(credential, error)
+            else:
+                # لم يصل طلب الرفع إلى YouTube فلا تُحتسب تكلفته
+                await self.bot.credential_pool.refund(credential, 'videos.insert')
+            # قد تُسحب المهمة على خادم آخر فلا يُبقى الملف؛ الرفع نفسه يُستأنف من
+            # جلسة YouTube المحفوظة
+            self.bot._discard_spool_file(video_info.get('file_path'))
+            if not await self.adb.finish_upload_job(job_id, self.worker_id, 'queued', error_message=str(error)):
+                logger.warning(f"⚠️ مهمة الرفع {job_id} لم تعد لهذا العامل عند إعادتها إلى الطابور")
+        else:
+            if not sent:
+                await self.bot.quota.refund(credential.client_id, 'videos.insert')
+            if not await self.adb.finish_upload_job(job_id, self.worker_id, 'failed', error_message=str(error)):
+                # مالك المهمة الجديد هو من يسجل نتيجتها ويبلغ المستخدم
+                logger.warning(f"⚠️ فشلت مهمة الرفع {job_id} بعد فقد عقدها: {error}")
+                await self.bot.credential_pool.release(credential, error)
+                self.bot._discard_spool_file(video_info.get('file_path'))
+                return
+            await self._notify(self.bot._on_upload_error(upload_context, error))
+
+    async def _set_uploading(self, job_id: int):
+        """تحديث حالة المهمة قبل إرسالها إلى YouTube، وإيقافها إذا لم تعد لهذا العامل"""
+        if not await self.adb.renew_upload_job_lease(job_id, self.worker_id, self.lease_seconds, 'uploading'):
+            raise LeaseLostError()
+        self._sent.add(job_id)
+
+    async def _upload(self, job: Dict, credential: PooledCredential, body: Dict, video_info: Dict,
+                      edit_message, retry_state: RetryState,
+                      lease_lost: Optional[threading.Event] = None) -> Dict:
+        """تحميل الفيديو من تلقرام (أو بثه) ثم رفعه إلى YouTube"""
+        job_id = job['id']
+        user_id = job['user_id']
+        credentials = await self.bot.get_user_credentials(user_id, credential)
+        if credentials is None:
+            raise RuntimeError("لا توجد بيانات مصادقة YouTube للمستخدم")
+        credentials_key = self.bot._credentials_key(user_id, credential)
+
+        loop = asyncio.get_running_loop()
+        progress_callback = self.bot._make_progress_callback(edit_message, loop)
+        telegram_file = await self.telegram.get_file(video_info['file_id'])
+
+        if Config.UPLOAD_STREAMING:
+            await self._set_uploading(job_id)
+            return await asyncio.to_thread(
+                self.bot._perform_stream_upload, credentials_key, credentials, body,
+                telegram_file.file_path, video_info.get('file_size'), loop, progress_callback, retry_state,
+                lease_lost
+            )
+
+        file_path = os.path.join(Config.DOWNLOAD_PATH, f"job-{job_id}-{job['attempts']}.mp4")
+        self.bot.spool.reserve(user_id, file_path, video_info.get('file_size'))
+        # يحذفه _on_upload_success أو معالج الخطأ، أو OrphanReaper إذا توقف العامل
+        video_info['file_path'] = file_path
+        self.bot.active_upload_files.add(file_path)
+        os.makedirs(Config.DOWNLOAD_PATH, exist_ok=True)
+        await telegram_file.download_to_drive(file_path)
+
+        await self._set_uploading(job_id)
+        return await asyncio.to_thread(
+            self.bot._perform_upload, credentials_key, credentials, body, file_path,
+            self.bot._upload_session_key(user_id, video_info), user_id, progress_callback, retry_state,
+            lease_lost
+        )
+
+    @staticmethod
+    async def _notify(coroutine):
+        """تسجيل نتيجة الرفع وإبلاغ المستخدم دون أن يوقف خطأ الرسالة العامل"""
+        try:
+            await coroutine
+        except Exception as e:
+            logger.error(f"خطأ في إبلاغ المستخدم بنتيجة الرفع: {e}")
+
+
+async def main():
+    # مجلد منفصل لا يراه منظف الملفات اليتيمة في عملية البوت؛ يحذف العامل ملف المهمة
+    # بعد كل سحب (وينظف ما تركه عامل متوقف) ويُحمّل من جديد عند إعادة المحاولة
+    Config.DOWNLOAD_PATH = os.path.join(Config.DOWNLOAD_PATH, "upload-jobs")
+    bot = YouTubeTelegramBot()
+    worker = UploadWorker(
+        bot,
+        worker_id=f"{socket.gethostname()}:{os.getpid()}",
+        concurrency=Config.UPLOAD_WORKERS,
+        lease_seconds=Config.UPLOAD_JOB_LEASE,
+        max_attempts=Config.UPLOAD_JOB_MAX_ATTEMPTS,
+        poll_interval=Config.UPLOAD_JOB_POLL_INTERVAL
+    )
+    try:
+        await worker.run()
+    finally:
+        await bot.shutdown()
+
+
+if __name__ == "__main__":
+    # تحميل متغيرات البيئة
+    load_dotenv()
+
+    # إعداد التسجيل
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("⏹️ تم إيقاف عامل الرفع")
@@ -3,12 +3,13 @@
 """
 import os
 import logging
+from typing import Optional
 from fastapi import FastAPI, Request, Response
 from fastapi.responses import JSONResponse
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 from dotenv import load_dotenv
 from telegram_youtube_bot import YouTubeTelegramBot
+from config import Config
 
 # تحميل متغيرات البيئة
 load_dotenv()
@@ -23,31 +24,59 @@ logger = logging.getLogger(__name__)
 # إنشاء تطبيق FastAPI
 app = FastAPI(title="YouTube Telegram Bot Webhook")
 
-# إنشاء البوت
-bot_instance = YouTubeTelegramBot()
-application = Application.builder().token(bot_instance.telegram_token).build()
+# يُنشأ البوت والتطبيق داخل startup لترتبط طوابيرهما بحلقة أحداث الخادم لا بحلقة الاستيراد
+bot_instance: Optional[YouTubeTelegramBot] = None
+application = None
 
-# إضافة المعالجات
-application.add_handler(CommandHandler("start", bot_instance.start_command))
-application.add_handler(CallbackQueryHandler(bot_instance.button_handler))
-application.add_handler(MessageHandler(filters.VIDEO, bot_instance.handle_video))
-application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot_instance.handle_text_input))
+@app.on_event("startup")
+async def startup():
+    """إنشاء البوت وتشغيل معالجة طابور التحديثات والمهام الدورية"""
+    global bot_instance, application
+    bot_instance = YouTubeTelegramBot()
+    # التحديثات تُضاف إلى طابور التطبيق ويعالجها في الخلفية، بحد أقصى للتحديثات الجارية
+    application = bot_instance.build_webhook_application()
+    await application.initialize()
+    await application.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """إنهاء عمليات الرفع الجارية عند إيقاف الخادم"""
+    # قبل إغلاق اتصال البوت حتى تصل رسائل التقدم والنتيجة
+    await bot_instance.stop_uploads()
+    # stop() يعالج التحديثات المتبقية في الطابور قبل التوقف
+    await application.stop()
+    await application.shutdown()
+    await bot_instance.shutdown()
 
 @app.post("/webhook")
 async def webhook(request: Request):
-    """معالج webhook لتلقي تحديثات التلقرام"""
+    """استلام تحديثات التلقرام وإضافتها إلى طابور المعالجة دون انتظار معالجتها"""
+    # التحقق من أن الطلب مرسل من تلقرام (secret_token المحدد عند تعيين webhook)
+    if Config.WEBHOOK_SECRET and \
+            request.headers.get('X-Telegram-Bot-Api-Secret-Token') != Config.WEBHOOK_SECRET:
+        return Response(status_code=403)
+    
     try:
         # قراءة البيانات من الطلب
         data = await request.json()
-        
-        # معالجة التحديث
         update = Update.de_json(data, application.bot)
-        await application.process_update(update)
-        
-        return Response(status_code=200)
     except Exception as e:
-        logger.error(f"❌ خطأ في معالجة التحديث: {e}")
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        logger.error(f"❌ تحديث غير صالح: {e}")
+        return JSONResponse(status_code=400, content={"error": "invalid update"})
+    
+    # تحديث أُعيد إرساله بعد استلامه من قبل
+    if not await bot_instance.update_dedup.accept(update.update_id):
+        return Response(status_code=200)
+    
+    # المكان يُحرر عند انتهاء معالجة التحديث لا عند سحبه من الطابور
+    if not application.update_processor.admit(update):
+        # تلقرام يعيد إرسال التحديث لاحقاً، فيجب ألا يُعد مكرراً حينها
+        await bot_instance.update_dedup.forget(update.update_id)
+        logger.warning("⚠️ الحد الأقصى للتحديثات الجارية مكتمل، تم رفض التحديث مؤقتاً")
+        return Response(status_code=503)
+    
+    application.update_queue.put_nowait(update)
+    return Response(status_code=200)
 
 @app.get("/")
 async def root():
@@ -66,12 +95,20 @@ async def health():
         me = await application.bot.get_me()
         
         # التحقق من اتصال قاعدة البيانات
-        db_status = bot_instance.db.test_connection()
+        db_status = await bot_instance.adb.test_connection()
         
         return {
             "status": "healthy",
             "bot_username": f"@{me.username}",
-            "database": "connected" if db_status else "disconnected"
+            "database": "connected" if db_status else "disconnected",
+            "user_cache": bot_instance.db.user_cache.stats(),
+            "spool": bot_instance.spool.usage(),
+            "update_queue": {
+                "pending": application.update_processor.admitted,
+                "max_size": Config.WEBHOOK_QUEUE_SIZE
+            },
+            "update_dedup": bot_instance.update_dedup.stats(),
+            "youtube_credentials": bot_instance.credential_pool.stats()
         }
     except Exception as e:
         logger.error(f"❌ خطأ في فحص الصحة: {e}")
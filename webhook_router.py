@@ -0,0 +1,349 @@
+"""
+واجهة webhook متعددة العمليات: توجيه تحديثات كل مستخدم إلى نفس العملية
+"""
+import os
+import json
+import time
+import queue
+import bisect
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from typing import Dict, Hashable, List, Optional
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+from config import Config
+
+# تحميل متغيرات البيئة
+load_dotenv()
+
+# إعداد التسجيل
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# عمليات spawn بدلاً من fork لأن العملية الرئيسية تشغل حلقة أحداث وخيوطاً
+mp = multiprocessing.get_context('spawn')
+
+
+class NoWorkerAvailableError(Exception):
+    """لا توجد عملية سليمة لاستقبال التحديث"""
+
+
+class HashRing:
+    """حلقة تجزئة متسقة: إضافة عملية أو إزالتها تنقل مستخدميها فقط"""
+
+    def __init__(self, replicas: int = 100):
+        self.replicas = replicas
+        self._hashes: List[int] = []
+        self._nodes: Dict[int, int] = {}
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def add(self, node: int):
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}:{replica}")
+            if point not in self._nodes:
+                bisect.insort(self._hashes, point)
+                self._nodes[point] = node
+
+    def remove(self, node: int):
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}:{replica}")
+            if self._nodes.get(point) == node:
+                del self._nodes[point]
+                self._hashes.remove(point)
+
+    def get(self, key: Hashable) -> Optional[int]:
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(str(key))) % len(self._hashes)
+        return self._nodes[self._hashes[index]]
+
+    def __contains__(self, node: int) -> bool:
+        return any(owner == node for owner in self._nodes.values())
+
+
+def routing_key(data: Dict) -> Hashable:
+    """معرف المستخدم (أو المحادثة) صاحب التحديث"""
+    for field, value in data.items():
+        if field == 'update_id' or not isinstance(value, dict):
+            continue
+        user = value.get('from') or value.get('user')
+        if user:
+            return user['id']
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+    return data.get('update_id')
+
+
+def run_worker(worker_id: int, workers: int, inbox, heartbeat):
+    """نقطة دخول عملية العامل: بوت كامل يعالج التحديثات الموجهة إليه"""
+    # مجلد تحميل وميزانية مساحة خاصة بكل عامل حتى لا يحذف أحدها ملفات الآخر
+    Config.DOWNLOAD_PATH = os.path.join(Config.DOWNLOAD_PATH, f"worker-{worker_id}")
+    Config.SPOOL_BUDGET = Config.SPOOL_BUDGET // workers
+    asyncio.run(_worker_main(worker_id, inbox, heartbeat))
+
+
+async def _worker_main(worker_id: int, inbox, heartbeat):
+    from telegram import Update
+    from telegram_youtube_bot import YouTubeTelegramBot
+
+    bot = YouTubeTelegramBot()
+    # مهام الصيانة المشتركة (حذف السجلات القديمة) في العامل الأول فقط
+    application = bot.build_webhook_application(maintenance=worker_id == 0)
+    await application.initialize()
+    await application.start()
+
+    async def beat():
+        while True:
+            heartbeat.value = time.time()
+            await asyncio.sleep(Config.WORKER_HEARTBEAT_INTERVAL)
+
+    beat_task = asyncio.create_task(beat())
+    logger.info(f"✅ العامل {worker_id} جاهز (PID {os.getpid()})")
+    processor = application.update_processor
+    try:
+        while True:
+            # لا يُقرأ تحديث جديد حتى تنتهي معالجة أحد التحديثات الجارية، فتبقى التحديثات
+            # في طابور العامل وعند امتلائه يرد الموجه بـ 503
+            await processor.wait_for_capacity()
+            payload = await asyncio.to_thread(inbox.get)
+            if payload is None:
+                break
+            try:
+                update = Update.de_json(json.loads(payload), application.bot)
+            except Exception as e:
+                logger.error(f"❌ تحديث غير صالح في العامل {worker_id}: {e}")
+                continue
+            if await bot.update_dedup.accept(update.update_id):
+                processor.admit(update)
+                application.update_queue.put_nowait(update)
+    finally:
+        beat_task.cancel()
+        await bot.stop_uploads()
+        await application.stop()
+        await application.shutdown()
+        await bot.shutdown()
+
+
+class WorkerSupervisor:
+    """تشغيل عمليات العمال ومراقبتها وإعادة تشغيل المتعطل منها
+
+    العامل الذي توقف أو انقطع نبضه يُزال من حلقة التجزئة فوراً فينتقل مستخدموه
+    إلى بقية العمال، ثم يُعاد إلى الحلقة عند عودته سليماً.
+    """
+
+    def __init__(self, workers: int, queue_size: int, heartbeat_timeout: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.heartbeat_timeout = heartbeat_timeout
+        self.ring = HashRing()
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._inboxes: Dict[int, object] = {}
+        self._heartbeats: Dict[int, object] = {}
+        self._restarts: Dict[int, int] = {}
+        self._started_at: Dict[int, float] = {}
+
+    def start(self):
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+
+    def _spawn(self, worker_id: int):
+        inbox = mp.Queue(maxsize=self.queue_size)
+        heartbeat = mp.Value('d', 0.0)
+        process = mp.Process(
+            target=run_worker,
+            args=(worker_id, self.workers, inbox, heartbeat),
+            name=f"bot-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self._processes[worker_id] = process
+        self._inboxes[worker_id] = inbox
+        self._heartbeats[worker_id] = heartbeat
+        self._started_at[worker_id] = time.time()
+
+    def _healthy(self, worker_id: int) -> bool:
+        process = self._processes[worker_id]
+        if not process.is_alive():
+            return False
+        beat = self._heartbeats[worker_id].value
+        if not beat:
+            # مهلة أطول لبدء التشغيل (الاتصال بقاعدة البيانات وتهيئة البوت)
+            return time.time() - self._started_at[worker_id] < self.heartbeat_timeout * 4
+        return time.time() - beat < self.heartbeat_timeout
+
+    def dispatch(self, key: Hashable, payload: bytes):
+        """إرسال التحديث إلى عامل المستخدم (queue.Full عند امتلاء طابوره)"""
+        worker_id = self.ring.get(key)
+        if worker_id is None:
+            raise NoWorkerAvailableError()
+        self._inboxes[worker_id].put_nowait(payload)
+
+    async def check(self):
+        """فحص صحة العمال وإعادة توزيع المستخدمين"""
+        for worker_id, process in list(self._processes.items()):
+            healthy = self._healthy(worker_id)
+            ready = self._heartbeats[worker_id].value > 0
+
+            if healthy and ready and worker_id not in self.ring:
+                self.ring.add(worker_id)
+                logger.info(f"✅ العامل {worker_id} أُضيف إلى حلقة التوجيه")
+            elif not healthy:
+                if worker_id in self.ring:
+                    self.ring.remove(worker_id)
+                logger.warning(f"⚠️ العامل {worker_id} متوقف أو لا يستجيب، إعادة تشغيله")
+                await self._restart(worker_id)
+
+    async def _restart(self, worker_id: int):
+        process = self._processes[worker_id]
+        if process.is_alive():
+            process.terminate()
+            # انتظار انتهاء العملية خارج حلقة الأحداث حتى لا يتوقف استقبال التحديثات
+            await asyncio.to_thread(process.join, 5)
+        # إعادة توجيه التحديثات التي لم يستلمها العامل المتوقف
+        old_inbox = self._inboxes[worker_id]
+        pending = []
+        while True:
+            try:
+                pending.append(old_inbox.get_nowait())
+            except (queue.Empty, OSError, ValueError):
+                break
+        self._restarts[worker_id] = self._restarts.get(worker_id, 0) + 1
+        self._spawn(worker_id)
+
+        for payload in pending:
+            try:
+                self.dispatch(routing_key(json.loads(payload)), payload)
+            except (queue.Full, NoWorkerAvailableError):
+                logger.error(f"❌ تعذر إعادة توجيه تحديث من العامل {worker_id}")
+
+    async def monitor(self):
+        while True:
+            await asyncio.sleep(Config.WORKER_HEARTBEAT_INTERVAL)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"❌ خطأ في مراقبة العمال: {e}")
+
+    def stop(self, timeout: float = 30):
+        """إيقاف العمال بعد معالجة ما في طوابيرهم"""
+        for worker_id, inbox in self._inboxes.items():
+            try:
+                inbox.put(None, timeout=timeout)
+            except queue.Full:
+                self._processes[worker_id].terminate()
+        for process in self._processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def stats(self) -> Dict:
+        workers = {}
+        for worker_id, process in self._processes.items():
+            try:
+                pending = self._inboxes[worker_id].qsize()
+            except NotImplementedError:
+                pending = None
+            workers[worker_id] = {
+                "pid": process.pid,
+                "healthy": self._healthy(worker_id),
+                "routing": worker_id in self.ring,
+                "pending": pending,
+                "restarts": self._restarts.get(worker_id, 0)
+            }
+        return workers
+
+
+# إنشاء تطبيق FastAPI
+app = FastAPI(title="YouTube Telegram Bot Webhook Router")
+supervisor = WorkerSupervisor(
+    workers=Config.WEBHOOK_WORKERS,
+    queue_size=Config.WEBHOOK_QUEUE_SIZE,
+    heartbeat_timeout=Config.WORKER_HEARTBEAT_TIMEOUT
+)
+monitor_task: Optional[asyncio.Task] = None
+
+
+@app.on_event("startup")
+async def startup():
+    """تشغيل العمال ومراقبتهم"""
+    global monitor_task
+    supervisor.start()
+    monitor_task = asyncio.create_task(supervisor.monitor())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """إيقاف العمال بعد إنهاء أعمالهم"""
+    if monitor_task:
+        monitor_task.cancel()
+    await asyncio.to_thread(supervisor.stop)
+
+
+@app.post("/webhook")
+async def webhook(request: Request):
+    """توجيه تحديث التلقرام إلى عامل المستخدم دون انتظار معالجته"""
+    if Config.WEBHOOK_SECRET and \
+            request.headers.get('X-Telegram-Bot-Api-Secret-Token') != Config.WEBHOOK_SECRET:
+        return Response(status_code=403)
+
+    payload = await request.body()
+    try:
+        key = routing_key(json.loads(payload))
+    except Exception as e:
+        logger.error(f"❌ تحديث غير صالح: {e}")
+        return JSONResponse(status_code=400, content={"error": "invalid update"})
+
+    try:
+        supervisor.dispatch(key, payload)
+    except (queue.Full, NoWorkerAvailableError):
+        # تلقرام يعيد إرسال التحديث لاحقاً
+        logger.warning("⚠️ لا يوجد عامل متاح لاستقبال التحديث حالياً")
+        return Response(status_code=503)
+
+    return Response(status_code=200)
+
+
+@app.get("/")
+async def root():
+    """صفحة الترحيب"""
+    return {
+        "status": "online",
+        "bot": "YouTube Telegram Bot",
+        "webhook_endpoint": "/webhook",
+        "workers": Config.WEBHOOK_WORKERS
+    }
+
+
+@app.get("/health")
+async def health():
+    """حالة العمال"""
+    workers = supervisor.stats()
+    healthy = sum(1 for worker in workers.values() if worker["routing"])
+    return JSONResponse(
+        status_code=200 if healthy else 503,
+        content={
+            "status": "healthy" if healthy else "unhealthy",
+            "healthy_workers": healthy,
+            "workers": workers
+        }
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # الحصول على منفذ من متغيرات البيئة أو استخدام 8000 كقيمة افتراضية
+    port = int(os.getenv("PORT", 8000))
+
+    # تشغيل الموجه
+    uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,74 @@
+"""
+مجمع عملاء YouTube API قابلة لإعادة الاستخدام
+"""
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Hashable, List, Tuple
+import httplib2
+import google_auth_httplib2
+from google.oauth2.credentials import Credentials
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+logger = logging.getLogger(__name__)
+
+
+class YouTubeClientPool:
+    """مصنع عملاء YouTube v3 يعيد استخدام اتصالات HTTP المفتوحة
+
+    يُحمّل مستند الاكتشاف مرة واحدة من النسخة الثابتة المرفقة مع مكتبة
+    google-api-python-client، ويحتفظ لكل بيانات مصادقة بعملاء جاهزين يملك كل منهم
+    اتصال httplib2 مستمراً (keep-alive). كائن httplib2 غير آمن للخيوط، لذلك يُعار
+    العميل لخيط واحد في كل مرة.
+    """
+
+    def __init__(self, max_idle_per_key: int = 4, max_keys: int = 256, timeout: int = 120):
+        self.max_idle_per_key = max_idle_per_key
+        self.max_keys = max_keys
+        self.timeout = timeout
+        self._document = json.loads(discovery_cache.get_static_doc('youtube', 'v3'))
+        self._idle: 'OrderedDict[Hashable, List[Tuple[Credentials, object]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        # build_from_document يعدّل وصف الدوال داخل المستند المشترك
+        self._build_lock = threading.Lock()
+
+    def _build(self, credentials: Credentials):
+        """إنشاء عميل جديد باتصال HTTP خاص به"""
+        http = google_auth_httplib2.AuthorizedHttp(
+            credentials,
+            http=httplib2.Http(timeout=self.timeout)
+        )
+        with self._build_lock:
+            return build_from_document(self._document, http=http)
+
+    def _checkout(self, key: Hashable, credentials: Credentials):
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                pooled_credentials, youtube = idle.pop()
+                # بيانات مصادقة جديدة للمفتاح نفسه (مثلاً بعد إعادة الربط)
+                if pooled_credentials is credentials:
+                    return youtube
+        return self._build(credentials)
+
+    def _checkin(self, key: Hashable, credentials: Credentials, youtube):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self.max_idle_per_key:
+                idle.append((credentials, youtube))
+            # إغلاق عملاء المفاتيح الأقل استخداماً عند تجاوز الحد
+            while len(self._idle) > self.max_keys:
+                self._idle.popitem(last=False)
+
+    @contextmanager
+    def client(self, key: Hashable, credentials: Credentials):
+        """استعارة عميل جاهز لبيانات المصادقة وإعادته إلى المجمع بعد الاستخدام"""
+        youtube = self._checkout(key, credentials)
+        try:
+            yield youtube
+        finally:
+            self._checkin(key, credentials, youtube)